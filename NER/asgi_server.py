@@ -0,0 +1,170 @@
+# ASGI version of the KYC document processing API (see server.py)
+#
+#   gunicorn asgi_server:app -k uvicorn.workers.UvicornWorker
+#
+# /uploadDetails keeps the combined JSON contract the Java backend uses;
+# /uploadDetails/stream returns one NDJSON line per document as soon as
+# that document is done. Both add a per-document stage trace with
+# ?trace=1; /metrics serves Prometheus metrics for this worker. /jobs
+# queues documents for job_worker.py and returns immediately; poll
+# /jobs/<id> or /jobs/batch/<batch_id>.
+
+import json
+import asyncio
+import contextlib
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from extraction import new_traces, submit_documents, validate_upload
+from result_cache import result_cache
+from page_hash import page_index
+from job_queue import job_queue
+from job_worker import start_local_workers
+import models
+import metrics
+
+
+async def read_upload(request):
+    form = await request.form()
+    files = form.getlist("file")
+    document_types = form.getlist("document_type")
+
+    error = validate_upload(files, document_types)
+    if error:
+        return None, error
+
+    uploads = [
+        (await file.read(), file.filename, document_types[idx])
+        for idx, file in enumerate(files)
+    ]
+    return uploads, None
+
+
+def request_traces(request, uploads):
+    if request.query_params.get("trace") == "1":
+        return new_traces(uploads)
+    return None
+
+
+async def test(request):
+    return JSONResponse({"message": "ASGI server is running"})
+
+
+async def ready(request):
+    status = models.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+async def cache_stats(request):
+    return JSONResponse(dict(result_cache.stats(), page_index=page_index.stats()))
+
+
+async def prometheus_metrics(request):
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+async def upload_details(request):
+    try:
+        uploads, error = await read_upload(request)
+        if error:
+            return JSONResponse({"error": error}, status_code=400)
+
+        traces = request_traces(request, uploads)
+        futures = [
+            asyncio.wrap_future(f) for f in submit_documents(uploads, traces)
+        ]
+        extracted_entities_list = await asyncio.gather(*futures)
+
+        response = {"extracted_entities": extracted_entities_list}
+        if traces:
+            response["trace"] = [trace.to_dict() for trace in traces]
+
+        return JSONResponse(response)
+
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def upload_details_stream(request):
+    uploads, error = await read_upload(request)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+
+    traces = request_traces(request, uploads)
+
+    async def run(index, future):
+        filename = uploads[index][1]
+        try:
+            entities = await asyncio.wrap_future(future)
+            line = {"index": index, "filename": filename,
+                    "extracted_entities": entities}
+        except Exception as e:
+            line = {"index": index, "filename": filename, "error": str(e)}
+        if traces:
+            line["trace"] = traces[index].to_dict()
+        return line
+
+    tasks = [
+        run(i, f) for i, f in enumerate(submit_documents(uploads, traces))
+    ]
+
+    async def lines():
+        for finished in asyncio.as_completed(tasks):
+            yield json.dumps(await finished) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def submit_jobs(request):
+    uploads, error = await read_upload(request)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+
+    batch_id, job_ids = await asyncio.to_thread(job_queue.submit, uploads)
+    return JSONResponse({"batch_id": batch_id, "job_ids": job_ids},
+                        status_code=202)
+
+
+async def job_status(request):
+    job = await asyncio.to_thread(job_queue.get, request.path_params["job_id"])
+    if job is None:
+        return JSONResponse({"error": "Unknown job id"}, status_code=404)
+    return JSONResponse(job)
+
+
+async def batch_status(request):
+    batch = await asyncio.to_thread(
+        job_queue.batch, request.path_params["batch_id"]
+    )
+    if batch is None:
+        return JSONResponse({"error": "Unknown batch id"}, status_code=404)
+    return JSONResponse(batch)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    start_local_workers()
+    models.start_warmup()
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/", test, methods=["GET"]),
+        Route("/ready", ready, methods=["GET"]),
+        Route("/cacheStats", cache_stats, methods=["GET"]),
+        Route("/metrics", prometheus_metrics, methods=["GET"]),
+        Route("/uploadDetails", upload_details, methods=["POST"]),
+        Route("/uploadDetails/stream", upload_details_stream, methods=["POST"]),
+        Route("/jobs", submit_jobs, methods=["POST"]),
+        Route("/jobs/batch/{batch_id}", batch_status, methods=["GET"]),
+        Route("/jobs/{job_id}", job_status, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"],
+                           allow_methods=["*"], allow_headers=["*"])],
+)
@@ -0,0 +1,118 @@
+# Latency / accuracy trade-off of adaptive-DPI OCR against fixed 300 DPI.
+#
+#   python benchmarks/bench_adaptive_dpi.py path/to/corpus [--out report.json]
+#
+# The corpus is a directory of PDFs. A sibling <name>.json holding
+# {"expected": ["ABCDE1234F", "01/01/1990", ...]} is used as ground truth
+# (share of expected strings found in the OCR text). Without one, the
+# adaptive text is scored by its similarity to the 300 DPI text.
+
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import difflib
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr import (  # noqa: E402
+    process_pdf_with_easyocr, compute_document_confidence, ADAPTIVE_HIGH_DPI
+)
+
+
+def _normalize(text):
+    return "".join(text.upper().split())
+
+
+def _page_text(pages):
+    return "\n".join(line["text"] for page in pages for line in page["content"])
+
+
+def _run(data, adaptive):
+    start = time.perf_counter()
+    pages, _ = process_pdf_with_easyocr(
+        BytesIO(data), keep_images=False, adaptive_dpi=adaptive
+    )
+    return pages, time.perf_counter() - start
+
+
+def _score(text, expected, reference):
+    if expected:
+        found = sum(_normalize(e) in _normalize(text) for e in expected)
+        return found / len(expected)
+    return difflib.SequenceMatcher(None, _normalize(text), _normalize(reference)).ratio()
+
+
+def bench_document(path):
+    with open(path, "rb") as f:
+        data = f.read()
+
+    expected = []
+    truth_path = os.path.splitext(path)[0] + ".json"
+    if os.path.exists(truth_path):
+        with open(truth_path) as f:
+            expected = json.load(f).get("expected", [])
+
+    fixed_pages, fixed_time = _run(data, adaptive=False)
+    adaptive_pages, adaptive_time = _run(data, adaptive=True)
+    fixed_text = _page_text(fixed_pages)
+
+    return {
+        "document": os.path.basename(path),
+        "pages": len(fixed_pages),
+        "fixed_seconds": round(fixed_time, 3),
+        "adaptive_seconds": round(adaptive_time, 3),
+        "fixed_confidence": compute_document_confidence(fixed_pages),
+        "adaptive_confidence": compute_document_confidence(adaptive_pages),
+        "fixed_accuracy": round(_score(fixed_text, expected, fixed_text), 3),
+        "adaptive_accuracy": round(
+            _score(_page_text(adaptive_pages), expected, fixed_text), 3
+        ),
+        "adaptive_page_dpi": [p["dpi"] for p in adaptive_pages],
+    }
+
+
+def summarize(rows):
+    def mean(key):
+        return round(sum(r[key] for r in rows) / len(rows), 3) if rows else 0.0
+
+    fixed_total = sum(r["fixed_seconds"] for r in rows)
+    adaptive_total = sum(r["adaptive_seconds"] for r in rows)
+    pages = sum(r["pages"] for r in rows)
+    rerendered = sum(
+        1 for r in rows for dpi in r["adaptive_page_dpi"] if dpi == ADAPTIVE_HIGH_DPI
+    )
+
+    return {
+        "documents": len(rows),
+        "pages": pages,
+        "fixed_seconds": round(fixed_total, 3),
+        "adaptive_seconds": round(adaptive_total, 3),
+        "speedup": round(fixed_total / adaptive_total, 2) if adaptive_total else None,
+        "fixed_accuracy": mean("fixed_accuracy"),
+        "adaptive_accuracy": mean("adaptive_accuracy"),
+        "pages_rerendered": rerendered,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Adaptive-DPI OCR benchmark")
+    parser.add_argument("corpus", help="directory of PDFs")
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    rows = []
+    for path in sorted(glob.glob(os.path.join(args.corpus, "*.pdf"))):
+        row = bench_document(path)
+        rows.append(row)
+        print(json.dumps(row))
+
+    report = {"summary": summarize(rows), "documents": rows}
+    print(json.dumps(report["summary"], indent=2))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
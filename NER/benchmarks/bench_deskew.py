@@ -0,0 +1,121 @@
+# Micro-benchmark: deskew.py against the original full-resolution deskew.
+#
+#   python benchmarks/bench_deskew.py [--pages 10] [--out report.json]
+#
+# Synthetic 300 DPI A4 pages with text-like blocks are rotated by known
+# angles; both implementations estimate the angle and deskew the page.
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deskew import estimate_skew_angle, deskew_gray  # noqa: E402
+
+
+def legacy_deskew(gray):
+    """
+    The pre-deskew.py implementation (np.where over the full page, then a
+    cubic warp), on a grayscale page. Returns (angle, image).
+    """
+    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    coords = np.column_stack(np.where(thresh > 0))
+    if len(coords) < 100:
+        return None, gray
+
+    angle = cv2.minAreaRect(coords)[-1]
+    if angle < -45:
+        angle = 90 + angle
+
+    if abs(angle) > 10 or abs(angle) < 0.5:
+        return angle, gray
+
+    h, w = gray.shape[:2]
+    M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
+    return angle, cv2.warpAffine(
+        gray, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE
+    )
+
+
+def synthetic_page(rng, angle, size=(3508, 2480)):
+    h, w = size
+    page = np.full((h, w), 255, dtype=np.uint8)
+
+    # A card-sized dark frame plus lines of "words".
+    cv2.rectangle(page, (200, 200), (w - 200, h - 200), 0, 6)
+    for y in range(320, h - 320, 70):
+        x = 260
+        while x < w - 400:
+            word = int(rng.integers(60, 260))
+            cv2.rectangle(page, (x, y), (x + word, y + 36), 0, -1)
+            x += word + int(rng.integers(30, 60))
+
+    M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
+    page = cv2.warpAffine(page, M, (w, h), borderValue=255)
+
+    noise = rng.normal(0, 8, page.shape)
+    return np.clip(page + noise, 0, 255).astype(np.uint8)
+
+
+def time_call(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="deskew micro-benchmark")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    rows = []
+
+    for i in range(args.pages):
+        true_angle = float(rng.uniform(-8, 8))
+        page = synthetic_page(rng, true_angle)
+
+        (legacy_angle, _), legacy_s = time_call(legacy_deskew, page)
+        new_angle, estimate_s = time_call(estimate_skew_angle, page)
+        _, deskew_s = time_call(deskew_gray, page)
+
+        rows.append({
+            "page": i,
+            "rotation": round(true_angle, 3),
+            "legacy_angle": legacy_angle,
+            "new_angle": new_angle,
+            "angle_diff": (
+                round(abs(legacy_angle - new_angle), 3)
+                if legacy_angle is not None and new_angle is not None else None
+            ),
+            "legacy_ms": round(legacy_s * 1000, 1),
+            "estimate_ms": round(estimate_s * 1000, 1),
+            "deskew_ms": round(deskew_s * 1000, 1),
+        })
+        print(json.dumps(rows[-1]))
+
+    diffs = [r["angle_diff"] for r in rows if r["angle_diff"] is not None]
+    legacy_total = sum(r["legacy_ms"] for r in rows)
+    new_total = sum(r["deskew_ms"] for r in rows)
+
+    summary = {
+        "pages": len(rows),
+        "legacy_ms_per_page": round(legacy_total / len(rows), 1),
+        "deskew_ms_per_page": round(new_total / len(rows), 1),
+        "speedup": round(legacy_total / new_total, 2) if new_total else None,
+        "max_angle_diff": max(diffs) if diffs else None,
+    }
+    print(json.dumps(summary, indent=2))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"summary": summary, "pages": rows}, f, indent=2)
@@ -0,0 +1,199 @@
+# Gemini vision payload size and extraction quality per image setting, on
+# the synthetic documents from synthetic.py.
+#
+#   python benchmarks/bench_image_payload.py [--per-type 3] \
+#       [--configs png:0 jpeg:2048:85 webp:1600:80 jpeg:1600:75:gray] \
+#       [--quality ocr|live] [--mbps 20] [--out report.json]
+#
+# A config is format:max_side[:quality][:gray]; "baseline" is the old
+# path (300 DPI PNG, decoded and re-encoded as PNG). For every document
+# and config: bytes sent, encode time, estimated upload time at --mbps,
+# and - with --quality - field accuracy against the ground truth:
+#   ocr   EasyOCR + rule_extract on the decoded payload (offline proxy)
+#   live  extract_entities_from_images against the real Gemini API
+# The local stub answers with placeholders, so it cannot judge quality;
+# confirm the chosen setting with a --quality live run.
+
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fitz  # noqa: E402
+from synthetic import LAYOUTS, make_document  # noqa: E402
+import image_payload  # noqa: E402
+
+DEFAULT_CONFIGS = ["baseline", "png:0", "jpeg:2048:85", "webp:2048:80",
+                   "jpeg:1600:75", "jpeg:1600:75:gray"]
+
+
+def parse_config(spec):
+    if spec == "baseline":
+        return None
+    parts = spec.split(":")
+    options = {
+        "fmt": "jpeg" if parts[0] == "jpg" else parts[0],
+        "max_side": int(parts[1]) if len(parts) > 1 else image_payload.LLM_IMAGE_MAX_SIDE,
+        "quality": image_payload.LLM_IMAGE_QUALITY,
+        "grayscale": "gray" in parts[2:],
+    }
+    numbers = [p for p in parts[2:] if p.isdigit()]
+    if numbers:
+        options["quality"] = int(numbers[0])
+    return options
+
+
+def baseline_payloads(data, fmt):
+    # What text_ext sent before: 300 DPI PNG, reopened and saved as PNG.
+    if fmt != "pdf":
+        img = Image.open(BytesIO(data)).convert("RGB")
+        pages = [img]
+    else:
+        with fitz.open(stream=data, filetype="pdf") as pdf:
+            pages = [Image.open(BytesIO(page.get_pixmap(dpi=300).tobytes("png")))
+                     for page in pdf]
+    payloads = []
+    for img in pages:
+        buffer = BytesIO()
+        img.save(buffer, format="PNG")
+        payloads.append(image_payload.Payload(buffer.getvalue(), "image/png",
+                                              img.width, img.height,
+                                              img.width * img.height * 3))
+    return payloads
+
+
+def encode(data, fmt, options):
+    if options is None:
+        return baseline_payloads(data, fmt)
+    if fmt == "pdf":
+        return list(image_payload.iter_pdf_payloads(data, 300, **options))
+    return [image_payload.encode_upload(BytesIO(data), **options)]
+
+# ============================================================
+# QUALITY
+# ============================================================
+
+def _same(a, b):
+    return str(a or "").upper().replace(" ", "") == str(b or "").upper().replace(" ", "")
+
+
+def accuracy(entities, truth):
+    fields = truth["fields"]
+    return round(sum(_same(entities.get(k), v) for k, v in fields.items()) / len(fields), 3)
+
+
+def ocr_entities(payloads, document_type):
+    from ocr import run_easyocr
+    from rule_extract import extract_fields
+
+    lines = []
+    for payload in payloads:
+        img = np.asarray(Image.open(BytesIO(payload.data)).convert("L"))
+        lines.extend(run_easyocr(img))
+    found = extract_fields(lines, document_type, [f[0] for f in LAYOUTS[document_type]["fields"]], 0.0)
+    return {k: v for k, (v, _) in found.items()}
+
+
+def live_entities(payloads, document_type):
+    from ocr import extract_entities_from_images
+    entities = extract_entities_from_images(payloads, document_type)
+    return entities if isinstance(entities, dict) else {}
+
+# ============================================================
+# RUN
+# ============================================================
+
+def bench_document(document_type, seed, fmt, configs, args):
+    data, truth = make_document(document_type, seed=seed, skew=args.skew,
+                                noise=args.noise, fmt=fmt)
+    rows = []
+    for spec in configs:
+        start = time.perf_counter()
+        payloads = encode(data, fmt, parse_config(spec))
+        encode_s = time.perf_counter() - start
+
+        sent = sum(len(p.data) for p in payloads)
+        # Bytes on the wire are base64 inside the JSON body.
+        wire = sum(len(base64.b64encode(p.data)) for p in payloads)
+        row = {
+            "document_type": document_type,
+            "seed": seed,
+            "format": fmt,
+            "config": spec,
+            "pages": len(payloads),
+            "size": [payloads[0].width, payloads[0].height],
+            "bytes": sent,
+            "encode_seconds": round(encode_s, 3),
+            "upload_seconds": round(wire * 8 / (args.mbps * 1e6), 3),
+        }
+        if args.quality == "ocr":
+            row["field_accuracy"] = accuracy(ocr_entities(payloads, document_type), truth)
+        elif args.quality == "live":
+            row["field_accuracy"] = accuracy(live_entities(payloads, document_type), truth)
+        rows.append(row)
+    return rows
+
+
+def summarize(rows, configs):
+    baseline = {}
+    for r in rows:
+        if r["config"] == configs[0]:
+            baseline[(r["document_type"], r["seed"], r["format"])] = r["bytes"]
+
+    summary = {}
+    for spec in configs:
+        subset = [r for r in rows if r["config"] == spec]
+        total = sum(r["bytes"] for r in subset)
+        base = sum(baseline[(r["document_type"], r["seed"], r["format"])] for r in subset)
+        entry = {
+            "documents": len(subset),
+            "mean_kb": round(total / len(subset) / 1024, 1),
+            f"saved_vs_{configs[0]}": round(1 - total / base, 3) if base else None,
+            "encode_seconds": round(sum(r["encode_seconds"] for r in subset), 3),
+            "upload_seconds": round(sum(r["upload_seconds"] for r in subset), 3),
+        }
+        if "field_accuracy" in subset[0]:
+            entry["field_accuracy"] = round(
+                sum(r["field_accuracy"] for r in subset) / len(subset), 3
+            )
+        summary[spec] = entry
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gemini image payload benchmark")
+    parser.add_argument("--per-type", type=int, default=3)
+    parser.add_argument("--formats", nargs="+", default=["pdf", "jpg"])
+    parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS,
+                        help="the first one is the baseline for bytes saved")
+    parser.add_argument("--skew", type=float, default=2.0)
+    parser.add_argument("--noise", type=float, default=8.0)
+    parser.add_argument("--mbps", type=float, default=20.0,
+                        help="uplink bandwidth for the upload time estimate")
+    parser.add_argument("--quality", choices=["ocr", "live"])
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    rows = []
+    for document_type in LAYOUTS:
+        for seed in range(args.per_type):
+            for fmt in args.formats:
+                for row in bench_document(document_type, seed, fmt, args.configs, args):
+                    rows.append(row)
+                    print(json.dumps(row))
+
+    summary = summarize(rows, args.configs)
+    print(json.dumps(summary, indent=2))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"summary": summary, "documents": rows}, f, indent=2)
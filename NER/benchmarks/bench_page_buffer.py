@@ -0,0 +1,127 @@
+# Memory allocated per page between the rasterizer and OCR: the old
+# pixmap -> PIL -> RGB array -> grayscale path against page_buffer.py's
+# grayscale render viewed in place.
+#
+#   python benchmarks/bench_page_buffer.py [--per-type 2] [--pages 2] \
+#       [--dpi 300] [--skew 0 3] [--out report.json]
+#
+# Per page and path: bytes allocated on the Python heap (NumPy and PIL
+# buffers included, traced with tracemalloc) from the pixmap up to the
+# deskewed grayscale array OCR reads, the peak of it, and the time taken;
+# plus the bytes that cross to an OCR worker (pickled pages vs shared
+# memory). MuPDF's own pixmap memory is not traced; it is the same
+# (RGB) or a third of it (grayscale) on the new path.
+
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fitz  # noqa: E402
+from synthetic import LAYOUTS, make_document  # noqa: E402
+from deskew import deskew_to_gray  # noqa: E402
+import page_buffer  # noqa: E402
+
+
+def old_path(page, dpi):
+    # What ocr.render_page + preprocess_image did before page_buffer.py.
+    pix = page.get_pixmap(dpi=dpi)
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    return deskew_to_gray(img), img
+
+
+def new_path(page, dpi):
+    buffer = page_buffer.render(page, dpi)
+    return deskew_to_gray(buffer), buffer
+
+
+def measure(fn, page, dpi):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    gray, handoff = fn(page, dpi)
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return gray, handoff, {
+        "allocated_bytes": current - before,
+        "peak_bytes": peak - before,
+        "seconds": round(seconds, 4),
+    }
+
+
+def bench_page(page, dpi):
+    old_gray, old_img, old = measure(old_path, page, dpi)
+    new_gray, new_buffer, new = measure(new_path, page, dpi)
+
+    # What the OCR pool sends a worker per page: the pickled PIL image
+    # before, the handle of a shared block now (the pixels are copied
+    # once, into the block).
+    old["worker_bytes"] = len(pickle.dumps(old_img))
+    handle, shm = page_buffer.share(new_buffer)
+    new["worker_bytes"] = len(pickle.dumps(handle))
+    new["shared_bytes"] = new_buffer.nbytes
+    page_buffer.release([shm])
+
+    # MuPDF's grayscale conversion weights differ slightly from OpenCV's.
+    diff = np.abs(old_gray.astype(np.int16) - new_gray.astype(np.int16))
+    return {
+        "size": list(new_buffer.size),
+        "old": old,
+        "new": new,
+        "mean_abs_diff": round(float(diff.mean()), 3),
+    }
+
+
+def summarize(rows):
+    summary = {"pages": len(rows)}
+    for path in ("old", "new"):
+        summary[path] = {
+            key: round(sum(r[path][key] for r in rows) / len(rows))
+            for key in ("allocated_bytes", "peak_bytes", "worker_bytes")
+        }
+        summary[path]["seconds"] = round(sum(r[path]["seconds"] for r in rows) / len(rows), 4)
+    summary["peak_reduction"] = round(1 - summary["new"]["peak_bytes"] / summary["old"]["peak_bytes"], 3)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Page buffer allocation benchmark")
+    parser.add_argument("--per-type", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=2)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--skew", type=float, nargs="+", default=[0.0, 3.0])
+    parser.add_argument("--noise", type=float, default=8.0)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    rows = []
+    for document_type in LAYOUTS:
+        for seed in range(args.per_type):
+            for skew in args.skew:
+                data, _ = make_document(document_type, seed=seed, skew=skew,
+                                        noise=args.noise, pages=args.pages)
+                with fitz.open(stream=data, filetype="pdf") as pdf:
+                    for page in pdf:
+                        row = bench_page(page, args.dpi)
+                        row.update({"document_type": document_type, "seed": seed,
+                                    "skew": skew, "page": page.number + 1})
+                        rows.append(row)
+                        print(json.dumps(row))
+
+    summary = summarize(rows)
+    print(json.dumps(summary, indent=2))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"summary": summary, "pages": rows}, f, indent=2)
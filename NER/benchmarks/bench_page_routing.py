@@ -0,0 +1,148 @@
+# Per-page routing (ocr.PAGE_ROUTING) against whole-document routing, on
+# synthetic multi-page PDFs where only some pages are badly scanned.
+#
+#   python benchmarks/bench_page_routing.py [--per-type 2] [--pages 4] \
+#       [--bad-pages 2] [--noise 4 60] [--threshold 0.65] \
+#       [--stub-latency 0.5] [--mbps 20] [--live] [--out report.json]
+#
+# Every document is OCR'd with EasyOCR and extracted twice by
+# process_pdf, page_routing on and off. Reported per run: the route of
+# every page, page images and image bytes sent to Gemini, estimated
+# upload time at --mbps, and the time spent in Gemini vision / mixed
+# calls. Gemini is the local stub (llm_stub.py) unless --live; the stub
+# answers in a fixed --stub-latency, so judge the latency gain of the
+# smaller requests with a --live run.
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from io import BytesIO
+
+NER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, NER_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fitz  # noqa: E402
+from synthetic import LAYOUTS, make_document  # noqa: E402
+
+GEMINI_STAGES = ("gemini_vision", "gemini_mixed", "gemini_text")
+
+
+def configure_environment(args):
+    # Before ocr is imported: it reads its settings at import time.
+    if not args.live:
+        from llm_stub import start_stub_server
+        _, url = start_stub_server(latency=args.stub_latency)
+        os.environ["GEMINI_API_URL"] = url
+        os.environ.setdefault("LLM_RATE_PER_SEC", "0")
+    os.environ.setdefault("NER_WARMUP", "lazy")
+    # Whole-page cards would otherwise skip OCR through the template pass.
+    os.environ.setdefault("TEMPLATE_OCR", "0")
+
+
+def mixed_document(document_type, seed, pages, bad_pages, noise):
+    """
+    PDF of pages pages whose last bad_pages pages are scanned at the high
+    noise level and the others at the low one.
+    """
+    low, high = noise
+    clean, truth = make_document(document_type, seed=seed, noise=low, pages=pages)
+    noisy, _ = make_document(document_type, seed=seed, noise=high, pages=pages)
+
+    out = fitz.open()
+    with fitz.open(stream=clean, filetype="pdf") as a, fitz.open(stream=noisy, filetype="pdf") as b:
+        for index in range(pages):
+            source = b if index >= pages - bad_pages else a
+            out.insert_pdf(source, from_page=index, to_page=index)
+    data = out.tobytes()
+    out.close()
+    return data, truth
+
+
+def run(data, document_type, page_routing, args):
+    import metrics
+    from ocr import process_pdf
+
+    trace = metrics.Trace()
+    start = time.perf_counter()
+    with metrics.tracing(trace):
+        result = process_pdf(BytesIO(data), document_type,
+                             confidence_threshold=args.threshold,
+                             page_routing=page_routing)
+    elapsed = time.perf_counter() - start
+
+    report = trace.to_dict()
+    gemini = report["gemini"]
+    image_bytes = gemini.get("image_bytes", 0)
+    return {
+        "page_routing": page_routing,
+        "source": result["source"],
+        "page_routes": result.get("page_routes"),
+        "images": gemini.get("images", 0),
+        "image_bytes": image_bytes,
+        # Images go base64-encoded inside the JSON body.
+        "upload_seconds": round(4 * math.ceil(image_bytes / 3) * 8 / (args.mbps * 1e6), 3),
+        "gemini_seconds": round(sum(report["stages"].get(stage, {}).get("seconds", 0.0)
+                                    for stage in GEMINI_STAGES), 3),
+        "seconds": round(elapsed, 3),
+    }
+
+
+def summarize(rows):
+    summary = {}
+    for page_routing in (False, True):
+        subset = [r for r in rows if r["page_routing"] is page_routing]
+        summary["per_page" if page_routing else "whole_document"] = {
+            "documents": len(subset),
+            "images": sum(r["images"] for r in subset),
+            "image_kb": round(sum(r["image_bytes"] for r in subset) / 1024, 1),
+            "upload_seconds": round(sum(r["upload_seconds"] for r in subset), 3),
+            "gemini_seconds": round(sum(r["gemini_seconds"] for r in subset), 3),
+            "seconds": round(sum(r["seconds"] for r in subset), 3),
+        }
+    before, after = summary["whole_document"], summary["per_page"]
+    summary["image_bytes_saved"] = (
+        round(1 - after["image_kb"] / before["image_kb"], 3) if before["image_kb"] else None
+    )
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-page routing benchmark")
+    parser.add_argument("--per-type", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--bad-pages", type=int, default=2,
+                        help="trailing pages scanned at the high noise level")
+    parser.add_argument("--noise", type=float, nargs=2, default=[4.0, 60.0],
+                        metavar=("LOW", "HIGH"))
+    parser.add_argument("--threshold", type=float, default=0.65)
+    parser.add_argument("--stub-latency", type=float, default=0.5)
+    parser.add_argument("--mbps", type=float, default=20.0,
+                        help="uplink bandwidth for the upload time estimate")
+    parser.add_argument("--live", action="store_true",
+                        help="call the real Gemini API instead of the stub")
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    configure_environment(args)
+
+    rows = []
+    for document_type in LAYOUTS:
+        for seed in range(args.per_type):
+            data, _ = mixed_document(document_type, seed, args.pages,
+                                     args.bad_pages, args.noise)
+            for page_routing in (False, True):
+                row = run(data, document_type, page_routing, args)
+                row.update({"document_type": document_type, "seed": seed})
+                rows.append(row)
+                print(json.dumps(row))
+
+    summary = summarize(rows)
+    print(json.dumps(summary, indent=2))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"summary": summary, "documents": rows}, f, indent=2)
@@ -0,0 +1,66 @@
+# Lines per second of per-page readtext against batched recognition.
+#
+#   python benchmarks/bench_recognition.py path/to/corpus [--batch 16 32 64]
+#
+# Runs in-process (no OCR pool) on every PDF in the corpus directory.
+
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr import (  # noqa: E402
+    pdf_to_images, preprocess_image, run_easyocr, run_easyocr_batched
+)
+
+
+def load_pages(corpus):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(corpus, "*.pdf"))):
+        with open(path, "rb") as f:
+            pages.extend(preprocess_image(img) for img in pdf_to_images(BytesIO(f.read())))
+    return pages
+
+
+def measure(name, fn):
+    start = time.perf_counter()
+    pages = fn()
+    seconds = time.perf_counter() - start
+    lines = sum(len(p) for p in pages)
+    return {
+        "mode": name,
+        "lines": lines,
+        "seconds": round(seconds, 3),
+        "lines_per_second": round(lines / seconds, 2) if seconds else None,
+        "mean_confidence": round(
+            sum(l["confidence"] for p in pages for l in p) / lines, 3
+        ) if lines else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EasyOCR recognition benchmark")
+    parser.add_argument("corpus", help="directory of PDFs")
+    parser.add_argument("--batch", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    pages = load_pages(args.corpus)
+    rows = [measure("readtext", lambda: [run_easyocr(p) for p in pages])]
+
+    for size in args.batch:
+        rows.append(measure(
+            f"batched_{size}", lambda: run_easyocr_batched(pages, batch_size=size)
+        ))
+
+    report = {"pages": len(pages), "runs": rows}
+    print(json.dumps(report, indent=2))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,71 @@
+# Startup cost of the NER service: import time, model load and warm-up,
+# each measured in a fresh interpreter.
+#
+#   python benchmarks/bench_startup.py [--repeat 3] [--out report.json]
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+NER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each probe prints {"seconds": ..., "max_rss_mb": ..., "torch": bool}.
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+{body}
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": round(seconds, 3),
+    "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    "torch": "torch" in sys.modules,
+}}))
+"""
+
+SCENARIOS = {
+    "import_ocr": "import ocr",
+    "import_flask_server": "import server",
+    "import_asgi_server": "import asgi_server",
+    "load_reader": "import models; models.preload(warm=False)",
+    "load_and_warm_reader": "import models; models.preload()",
+}
+
+
+def run_probe(body):
+    env = dict(os.environ, NER_WARMUP="lazy", JOB_WORKERS="0")
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE.format(body=body)],
+        cwd=NER_DIR, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        return {"error": lines[-1] if lines else f"exit {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NER startup benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    report = {}
+    for name, body in SCENARIOS.items():
+        runs = [run_probe(body) for _ in range(args.repeat)]
+        failed = [r for r in runs if "error" in r]
+        if failed:
+            report[name] = {"error": failed[0]["error"]}
+            print(name, json.dumps(report[name]))
+            continue
+        report[name] = {
+            "best_seconds": min(r["seconds"] for r in runs),
+            "max_rss_mb": max(r["max_rss_mb"] for r in runs),
+            "imports_torch": runs[0]["torch"],
+        }
+        print(name, json.dumps(report[name]))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
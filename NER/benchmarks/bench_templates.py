@@ -0,0 +1,94 @@
+# Region-of-interest (template) OCR against the full-page pass, on the
+# synthetic cards from synthetic.py.
+#
+#   python benchmarks/bench_templates.py [--per-type 5] [--skew 0 3] [--out report.json]
+#
+# For every card: time of the template pass and of full-page OCR, pixels
+# each one sends to the OCR model, and field accuracy of the template
+# pass against the generated ground truth.
+
+import os
+import sys
+import json
+import time
+import argparse
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import make_document  # noqa: E402
+from templates import TEMPLATES, CARD_SIZE  # noqa: E402
+from ocr import process_pdf_with_template, process_pdf_with_easyocr  # noqa: E402
+
+
+def template_pixels(document_type):
+    w, h = CARD_SIZE
+    regions = list(TEMPLATES[document_type]["fields"].values())
+    regions.append(TEMPLATES[document_type]["anchor"][0])
+    return sum(int((x1 - x0) * w) * int((y1 - y0) * h) for x0, y0, x1, y1 in regions)
+
+
+def bench_card(document_type, seed, skew, noise):
+    data, truth = make_document(document_type, seed=seed, skew=skew, noise=noise)
+
+    start = time.perf_counter()
+    result = process_pdf_with_template(data, document_type)
+    template_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    process_pdf_with_easyocr(BytesIO(data), keep_images=False, native_text=False)
+    full_s = time.perf_counter() - start
+
+    entities = (result or {}).get("extracted_entities", {})
+    correct = sum(
+        str(entities.get(k, "")).upper() == str(v).upper()
+        for k, v in truth["fields"].items()
+    )
+
+    return {
+        "document_type": document_type,
+        "seed": seed,
+        "skew": skew,
+        "template_used": result is not None,
+        "template_seconds": round(template_s, 3),
+        "full_page_seconds": round(full_s, 3),
+        "template_pixels": template_pixels(document_type),
+        "full_page_pixels": 2480 * 3508,
+        "field_accuracy": round(correct / len(truth["fields"]), 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Template OCR benchmark")
+    parser.add_argument("--per-type", type=int, default=5)
+    parser.add_argument("--skew", type=float, nargs="+", default=[0.0, 3.0])
+    parser.add_argument("--noise", type=float, default=8.0)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    rows = []
+    for document_type in TEMPLATES:
+        for seed in range(args.per_type):
+            skew = args.skew[seed % len(args.skew)]
+            rows.append(bench_card(document_type, seed, skew, args.noise))
+            print(json.dumps(rows[-1]))
+
+    template_total = sum(r["template_seconds"] for r in rows)
+    full_total = sum(r["full_page_seconds"] for r in rows)
+    summary = {
+        "cards": len(rows),
+        "template_hit_rate": round(sum(r["template_used"] for r in rows) / len(rows), 3),
+        "template_seconds": round(template_total, 3),
+        "full_page_seconds": round(full_total, 3),
+        "speedup": round(full_total / template_total, 2) if template_total else None,
+        "pixel_ratio": round(
+            sum(r["template_pixels"] for r in rows) / sum(r["full_page_pixels"] for r in rows), 4
+        ),
+        "field_accuracy": round(sum(r["field_accuracy"] for r in rows) / len(rows), 3),
+    }
+    print(json.dumps(summary, indent=2))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"summary": summary, "cards": rows}, f, indent=2)
@@ -0,0 +1,275 @@
+# End-to-end benchmark: replay a request mix against the pipeline with
+# Gemini replaced by the local stub (llm_stub.py), and report throughput,
+# latency percentiles, peak RSS and a per-stage breakdown as JSON.
+#
+#   python benchmarks/synthetic.py corpus/
+#   python benchmarks/run_benchmark.py corpus/requests.jsonl \
+#       [--concurrency 4] [--repeat 1] [--stub-latency 0.5] [--batch-size 4] \
+#       [--out report.json]
+#
+# Each line of the mix is {"target", "path", "document_type"[, "id"]};
+# paths are relative to the mix file. Targets:
+#   process_pdf               ocr.process_pdf (no result cache)
+#   process_file_with_gemini  text_ext.process_file_with_gemini
+#   upload                    POST /uploadDetails?trace=1 on the Flask app
+#
+# --live sends requests to the real Gemini API instead (GEMINI_API_KEY).
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+NER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, NER_DIR)
+
+TARGETS = ("process_pdf", "process_file_with_gemini", "upload")
+
+# ============================================================
+# ENVIRONMENT
+# ============================================================
+
+def configure_environment(args):
+    """
+    Must run before any NER module is imported: their settings are read
+    from the environment at import time. Explicit env vars still win.
+    """
+    if not args.live:
+        from llm_stub import start_stub_server
+        _, url = start_stub_server(latency=args.stub_latency,
+                                   fail_every=args.stub_fail_every)
+        os.environ["GEMINI_API_URL"] = url
+        os.environ.setdefault("LLM_RATE_PER_SEC", "0")
+
+    if args.batch_size is not None:
+        os.environ["LLM_BATCH_SIZE"] = str(args.batch_size)
+
+    os.environ.setdefault("JOB_WORKERS", "0")
+    os.environ.setdefault("NER_WARMUP", "lazy")
+    if not args.cache:
+        # Repeated files would otherwise be answered from the result cache.
+        os.environ.setdefault("RESULT_CACHE_SIZE", "0")
+        os.environ.pop("RESULT_CACHE_DB", None)
+
+# ============================================================
+# REQUESTS
+# ============================================================
+
+def load_mix(path, targets=None):
+    base = os.path.dirname(os.path.abspath(path))
+    mix = []
+    with open(path) as f:
+        for n, line in enumerate(f):
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            if request["target"] not in TARGETS:
+                raise ValueError(f"line {n + 1}: unknown target {request['target']!r}")
+            if targets and request["target"] not in targets:
+                continue
+            request.setdefault("id", f"{n}:{request['target']}")
+            with open(os.path.join(base, request["path"]), "rb") as doc:
+                request["data"] = doc.read()
+            mix.append(request)
+    return mix
+
+
+def run_request(request, flask_client):
+    import metrics
+    from ocr import process_pdf
+    from text_ext import process_file_with_gemini
+
+    target = request["target"]
+    filename = os.path.basename(request["path"])
+    trace = metrics.Trace(request["id"])
+    start = time.perf_counter()
+    error = None
+    traced = None
+
+    try:
+        if target == "process_pdf":
+            with metrics.tracing(trace):
+                process_pdf(BytesIO(request["data"]), request["document_type"])
+        elif target == "process_file_with_gemini":
+            with metrics.tracing(trace):
+                process_file_with_gemini(BytesIO(request["data"]), filename)
+        else:
+            response = flask_client.post(
+                "/uploadDetails?trace=1",
+                data={"file": [(BytesIO(request["data"]), filename)],
+                      "document_type": [request["document_type"]]},
+                content_type="multipart/form-data",
+            )
+            body = response.get_json()
+            if response.status_code != 200:
+                error = body.get("error", str(response.status_code))
+            trace = None
+            traced = (body.get("trace") or [{}])[0]
+    except Exception as e:
+        error = str(e)
+
+    row = {
+        "id": request["id"],
+        "target": target,
+        "seconds": time.perf_counter() - start,
+        "error": error,
+    }
+    row["trace"] = trace.to_dict() if trace is not None else traced
+    return row
+
+# ============================================================
+# REPORT
+# ============================================================
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of an unsorted list.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def latency_summary(rows, wall_seconds):
+    latencies = [r["seconds"] for r in rows]
+    return {
+        "requests": len(rows),
+        "errors": sum(1 for r in rows if r["error"]),
+        "throughput_rps": round(len(rows) / wall_seconds, 3) if wall_seconds else None,
+        "mean_ms": round(1000 * sum(latencies) / len(latencies), 1) if latencies else None,
+        **{
+            f"p{p}_ms": round(1000 * percentile(latencies, p), 1) if latencies else None
+            for p in (50, 95, 99)
+        },
+    }
+
+
+def stage_breakdown(rows):
+    stages = {}
+    for row in rows:
+        for stage, total in (row["trace"] or {}).get("stages", {}).items():
+            entry = stages.setdefault(stage, {"count": 0, "seconds": 0.0})
+            entry["count"] += total["count"]
+            entry["seconds"] += total["seconds"]
+
+    all_seconds = sum(e["seconds"] for e in stages.values())
+    return {
+        stage: {
+            "count": e["count"],
+            "seconds": round(e["seconds"], 3),
+            "mean_ms": round(1000 * e["seconds"] / e["count"], 2) if e["count"] else None,
+            "share": round(e["seconds"] / all_seconds, 3) if all_seconds else None,
+        }
+        for stage, e in sorted(stages.items(), key=lambda kv: -kv[1]["seconds"])
+    }
+
+
+def gemini_usage(rows):
+    usage = {}
+    for row in rows:
+        for key, value in (row["trace"] or {}).get("gemini", {}).items():
+            usage[key] = usage.get(key, 0) + value
+    return usage
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux; children are the OCR pool workers.
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return {"process": round(own, 1), "largest_child": round(children, 1)}
+
+
+def build_report(args, rows, wall_seconds, warmup_seconds):
+    by_target = {}
+    for target in TARGETS:
+        target_rows = [r for r in rows if r["target"] == target]
+        if target_rows:
+            # Per-target throughput is against the whole run's wall time.
+            by_target[target] = {
+                **latency_summary(target_rows, wall_seconds),
+                "stages": stage_breakdown(target_rows),
+            }
+
+    return {
+        "config": {
+            "mix": os.path.abspath(args.mix),
+            "concurrency": args.concurrency,
+            "repeat": args.repeat,
+            "gemini": "live" if args.live else {
+                "stub_latency": args.stub_latency,
+                "stub_fail_every": args.stub_fail_every,
+            },
+            "result_cache": args.cache,
+            "env": {
+                key: os.environ[key] for key in sorted(os.environ)
+                if key.startswith(("OCR_", "ADAPTIVE_", "NATIVE_TEXT", "DESKEW_",
+                                   "LLM_", "EXTRACT_", "RESULT_CACHE"))
+            },
+        },
+        "warmup_seconds": round(warmup_seconds, 3),
+        "wall_seconds": round(wall_seconds, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "summary": latency_summary(rows, wall_seconds),
+        "stages": stage_breakdown(rows),
+        "gemini": gemini_usage(rows),
+        "targets": by_target,
+        "requests": [
+            {k: (round(v, 4) if k == "seconds" else v) for k, v in r.items() if k != "trace"}
+            for r in rows
+        ],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NER pipeline benchmark")
+    parser.add_argument("mix", help="request mix (JSONL)")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="replay the mix this many times")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS)
+    parser.add_argument("--stub-latency", type=float, default=0.5,
+                        help="seconds the Gemini stub sleeps per request")
+    parser.add_argument("--stub-fail-every", type=int, default=0,
+                        help="stub answers every Nth request with 429")
+    parser.add_argument("--live", action="store_true",
+                        help="call the real Gemini API instead of the stub")
+    parser.add_argument("--cache", action="store_true",
+                        help="keep the result cache on for upload requests")
+    parser.add_argument("--batch-size", type=int,
+                        help="LLM_BATCH_SIZE (1 = one Gemini request per document)")
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    configure_environment(args)
+
+    import models
+    from server import app
+
+    mix = load_mix(args.mix, args.targets) * args.repeat
+
+    # Model loading is reported separately, not charged to the first request.
+    start = time.perf_counter()
+    models.warm_up()
+    warmup_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        rows = list(pool.map(lambda r: run_request(r, app.test_client()), mix))
+    wall_seconds = time.perf_counter() - start
+
+    for row in rows:
+        if row["error"]:
+            print(f"{row['id']}: {row['error']}", file=sys.stderr)
+
+    report = build_report(args, rows, wall_seconds, warmup_seconds)
+    print(json.dumps({k: report[k] for k in ("summary", "peak_rss_mb", "stages")}, indent=2))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
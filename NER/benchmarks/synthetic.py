@@ -0,0 +1,359 @@
+# Synthetic KYC documents for benchmarks: PAN, Aadhaar, Driving License
+# and Passport cards with known field values, controlled skew, noise and
+# page count, as PNG/JPEG images and PDFs (scanned or born-digital).
+#
+#   python benchmarks/synthetic.py corpus/ [--per-type 5] [--seed 0]
+#
+# Next to every document a <name>.json holds its ground truth
+# ({"document_type", "fields", "expected", ...}; "expected" is the format
+# bench_adaptive_dpi.py reads). corpus/requests.jsonl is a request mix for
+# run_benchmark.py.
+
+import os
+import io
+import sys
+import json
+import random
+import argparse
+
+import fitz
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rule_extract import verhoeff_check_digit  # noqa: E402
+
+# ============================================================
+# LAYOUTS
+# ============================================================
+
+# Cards are drawn at 300 DPI on an ID-1 (85.6 x 54 mm) canvas. Field
+# positions are fractions of the card, label first and value beneath.
+CARD_SIZE = (1011, 638)
+
+LAYOUTS = {
+    "PAN Card": {
+        "title": ["INCOME TAX DEPARTMENT", "GOVT. OF INDIA"],
+        "fields": [
+            ("name", "Name", 0.06, 0.30),
+            ("father_name", "Father's Name", 0.06, 0.47),
+            ("date_of_birth", "Date of Birth", 0.06, 0.64),
+            ("pan_number", "Permanent Account Number", 0.06, 0.81),
+        ],
+    },
+    "Aadhaar Card": {
+        "title": ["GOVERNMENT OF INDIA"],
+        "fields": [
+            ("name", "Name", 0.32, 0.22),
+            ("date_of_birth", "DOB", 0.32, 0.40),
+            ("gender", "Gender", 0.32, 0.58),
+            ("aadhaar_number", "Aadhaar No.", 0.25, 0.78),
+        ],
+    },
+    "Driving License": {
+        "title": ["INDIAN UNION DRIVING LICENCE"],
+        "fields": [
+            ("license_number", "DL No.", 0.06, 0.20),
+            ("name", "Name", 0.06, 0.36),
+            ("date_of_birth", "DOB", 0.06, 0.52),
+            ("issue_date", "Issue Date", 0.06, 0.68),
+            ("expiry_date", "Valid Till", 0.52, 0.68),
+            ("blood_group", "Blood Group", 0.52, 0.52),
+        ],
+    },
+    "Passport": {
+        "title": ["REPUBLIC OF INDIA", "PASSPORT"],
+        "fields": [
+            ("passport_number", "Passport No.", 0.34, 0.22),
+            ("name", "Given Name(s)", 0.34, 0.37),
+            ("nationality", "Nationality", 0.34, 0.52),
+            ("gender", "Sex", 0.74, 0.52),
+            ("date_of_birth", "Date of Birth", 0.34, 0.67),
+            ("place_of_issue", "Place of Issue", 0.34, 0.82),
+            ("expiry_date", "Date of Expiry", 0.74, 0.82),
+        ],
+    },
+}
+
+DOCUMENT_TYPES = list(LAYOUTS)
+
+FIRST_NAMES = ["Ram", "Sita", "Amit", "Priya", "Rajesh", "Anita", "Vikram",
+               "Kavya", "Arjun", "Meera", "Suresh", "Lakshmi"]
+LAST_NAMES = ["Sharma", "Gupta", "Kumar", "Iyer", "Patel", "Reddy", "Singh",
+              "Nair", "Das", "Joshi", "Rao", "Verma"]
+CITIES = ["Delhi", "Mumbai", "Chennai", "Kolkata", "Bengaluru", "Hyderabad"]
+STATES = ["DL", "MH", "TN", "KA", "UP", "WB"]
+BLOOD_GROUPS = ["A+", "B+", "O+", "AB+", "A-", "O-"]
+
+# ============================================================
+# FIELD VALUES
+# ============================================================
+
+def _letters(rng, n):
+    return "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(n))
+
+
+def _digits(rng, n):
+    return "".join(rng.choice("0123456789") for _ in range(n))
+
+
+def _date(rng, start_year, end_year):
+    return f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(start_year, end_year)}"
+
+
+def _aadhaar(rng):
+    digits = str(rng.randint(2, 9)) + _digits(rng, 10)
+    digits += verhoeff_check_digit(digits)
+    return f"{digits[:4]} {digits[4:8]} {digits[8:]}"
+
+
+def fake_fields(document_type, rng):
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    values = {
+        "name": name.upper() if document_type in ("PAN Card", "Passport") else name,
+        "father_name": f"{rng.choice(FIRST_NAMES)} {name.split()[-1]}".upper(),
+        "date_of_birth": _date(rng, 1960, 2004),
+        "gender": rng.choice(["Male", "Female"]),
+        # 4th PAN letter: P for an individual holder.
+        "pan_number": _letters(rng, 3) + "P" + _letters(rng, 1) + _digits(rng, 4) + _letters(rng, 1),
+        "aadhaar_number": _aadhaar(rng),
+        "license_number": f"{rng.choice(STATES)}-{_digits(rng, 2)}{rng.randint(2005, 2022)}{_digits(rng, 7)}",
+        "issue_date": _date(rng, 2015, 2022),
+        "expiry_date": _date(rng, 2030, 2040),
+        "blood_group": rng.choice(BLOOD_GROUPS),
+        "passport_number": _letters(rng, 1) + _digits(rng, 7),
+        "nationality": "INDIAN",
+        "place_of_issue": rng.choice(CITIES).upper(),
+    }
+    return {field: values[field] for field, *_ in LAYOUTS[document_type]["fields"]}
+
+# ============================================================
+# RENDERING
+# ============================================================
+
+def _font(size):
+    return ImageFont.load_default(size=size)
+
+
+def render_card(document_type, fields):
+    """
+    The clean card as a PIL RGB image.
+    """
+    layout = LAYOUTS[document_type]
+    w, h = CARD_SIZE
+    card = Image.new("RGB", CARD_SIZE, (250, 248, 240))
+    draw = ImageDraw.Draw(card)
+
+    draw.rectangle([4, 4, w - 5, h - 5], outline=(40, 40, 40), width=4)
+    for i, line in enumerate(layout["title"]):
+        draw.text((w // 2, 24 + i * 40), line, fill=(20, 20, 90),
+                  font=_font(32), anchor="mt")
+
+    label_font, value_font = _font(20), _font(34)
+    for field, label, x, y in layout["fields"]:
+        draw.text((x * w, y * h - 24), label, fill=(90, 90, 90), font=label_font)
+        draw.text((x * w, y * h), fields[field], fill=(0, 0, 0), font=value_font)
+
+    return card
+
+
+def degrade(img, skew=0.0, noise=0.0, rng=None, expand=True):
+    """
+    Rotate by skew degrees (as a crooked scan) and add Gaussian noise
+    with standard deviation noise (0-255 scale). expand=False keeps the
+    canvas size, as for a whole scanned page.
+    """
+    if skew:
+        img = img.rotate(skew, resample=Image.BICUBIC, expand=expand,
+                         fillcolor=(255, 255, 255))
+    if noise:
+        np_rng = np.random.default_rng(rng.randint(0, 2**31) if rng else None)
+        arr = np.asarray(img).astype(np.int16)
+        arr = arr + np_rng.normal(0, noise, arr.shape).astype(np.int16)
+        img = Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+    return img
+
+
+def filler_page(rng, size):
+    """
+    A plain A4 page of running text (annexures, terms) - no KYC fields.
+    """
+    page = Image.new("RGB", size, (255, 255, 255))
+    draw = ImageDraw.Draw(page)
+    font = _font(36)
+    words = ["declaration", "applicant", "verified", "address", "records",
+             "issued", "authority", "signature", "office", "government"]
+    for y in range(250, size[1] - 250, 70):
+        line = " ".join(rng.choice(words) for _ in range(rng.randint(6, 12)))
+        draw.text((200, y), line.capitalize() + ".", fill=(0, 0, 0), font=font)
+    return page
+
+# ============================================================
+# DOCUMENTS
+# ============================================================
+
+A4_PIXELS = (2480, 3508)  # 300 DPI
+
+
+def _jpeg_bytes(img):
+    # Scanners hand out JPEG; noisy pages as PNG would be tens of MB.
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def _scan_page(img, rng, skew, noise):
+    page = Image.new("RGB", A4_PIXELS, (255, 255, 255))
+    page.paste(img, (240, 240))
+    return degrade(page, skew, noise, rng, expand=False)
+
+
+def _pdf(pages, native_lines=None):
+    """
+    pages: PIL images (scanned PDF). With native_lines, one list of text
+    lines per page is written as a real text layer instead.
+    """
+    doc = fitz.open()
+    for i, img in enumerate(pages):
+        page = doc.new_page(width=595, height=842)  # A4 in points
+        if native_lines is not None:
+            y = 72
+            for line in native_lines[i]:
+                page.insert_text((72, y), line, fontsize=11)
+                y += 16
+        else:
+            page.insert_image(page.rect, stream=_jpeg_bytes(img))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_document(document_type, seed=0, skew=0.0, noise=0.0, pages=1,
+                  fmt="pdf", native_text=False):
+    """
+    Returns (file bytes, ground truth dict). fmt is "pdf", "png" or
+    "jpg"; images are a single card, PDFs put the card on page 1 and
+    filler text on the remaining pages.
+    """
+    rng = random.Random(f"{document_type}:{seed}")
+    fields = fake_fields(document_type, rng)
+    card = render_card(document_type, fields)
+
+    truth = {
+        "document_type": document_type,
+        "fields": fields,
+        "expected": list(fields.values()),
+        "skew": skew,
+        "noise": noise,
+        "format": fmt,
+        "pages": 1 if fmt != "pdf" else pages,
+        "native_text": native_text and fmt == "pdf",
+    }
+
+    if fmt in ("png", "jpg", "jpeg"):
+        img = degrade(card, skew, noise, rng)
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG" if fmt == "png" else "JPEG", quality=90)
+        return buffer.getvalue(), truth
+
+    if native_text:
+        layout = LAYOUTS[document_type]
+        card_lines = layout["title"] + [
+            f"{label}: {fields[field]}" for field, label, *_ in layout["fields"]
+        ]
+        filler = [
+            ["Annexure", "This page intentionally carries running text only."] * 3
+            for _ in range(pages - 1)
+        ]
+        return _pdf([None] * pages, [card_lines] + filler), truth
+
+    scans = [_scan_page(card, rng, skew, noise)]
+    scans += [degrade(filler_page(rng, A4_PIXELS), skew, noise, rng, expand=False)
+              for _ in range(pages - 1)]
+    return _pdf(scans), truth
+
+# ============================================================
+# CORPUS
+# ============================================================
+
+# Targets run_benchmark.py knows; process_pdf and the upload endpoint
+# only take PDFs.
+PDF_TARGETS = ["process_pdf", "process_file_with_gemini", "upload"]
+IMAGE_TARGETS = ["process_file_with_gemini"]
+
+
+def generate_corpus(out_dir, per_type=5, seed=0, skews=(0.0, 3.0),
+                    noises=(0.0, 12.0), page_counts=(1, 3),
+                    formats=("pdf", "png"), native_share=0.25,
+                    targets=None):
+    """
+    Write documents, their ground truth and requests.jsonl to out_dir.
+    Returns the request mix path.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    requests = []
+
+    for document_type in DOCUMENT_TYPES:
+        slug = document_type.split()[0].lower()
+        for i in range(per_type):
+            fmt = formats[i % len(formats)]
+            options = {
+                "skew": rng.choice(skews),
+                "noise": rng.choice(noises),
+                "pages": rng.choice(page_counts),
+                "native_text": fmt == "pdf" and rng.random() < native_share,
+            }
+            data, truth = make_document(
+                document_type, seed=seed * 1000 + i, fmt=fmt, **options
+            )
+
+            name = f"{slug}_{i:03d}.{fmt}"
+            with open(os.path.join(out_dir, name), "wb") as f:
+                f.write(data)
+            with open(os.path.join(out_dir, f"{slug}_{i:03d}.json"), "w") as f:
+                json.dump(truth, f, indent=2)
+
+            for target in (PDF_TARGETS if fmt == "pdf" else IMAGE_TARGETS):
+                if targets and target not in targets:
+                    continue
+                requests.append({
+                    "id": f"{slug}_{i:03d}:{target}",
+                    "target": target,
+                    "path": name,
+                    "document_type": document_type,
+                })
+
+    rng.shuffle(requests)
+    mix_path = os.path.join(out_dir, "requests.jsonl")
+    with open(mix_path, "w") as f:
+        for request in requests:
+            f.write(json.dumps(request) + "\n")
+    return mix_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic KYC corpus")
+    parser.add_argument("out_dir")
+    parser.add_argument("--per-type", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skew", type=float, nargs="+", default=[0.0, 3.0],
+                        help="skew angles (degrees) to draw from")
+    parser.add_argument("--noise", type=float, nargs="+", default=[0.0, 12.0],
+                        help="noise standard deviations to draw from")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 3],
+                        help="PDF page counts to draw from")
+    parser.add_argument("--formats", nargs="+", default=["pdf", "png"],
+                        choices=["pdf", "png", "jpg"])
+    parser.add_argument("--native-share", type=float, default=0.25,
+                        help="share of PDFs written with a text layer")
+    parser.add_argument("--targets", nargs="+",
+                        choices=sorted(set(PDF_TARGETS + IMAGE_TARGETS)))
+    args = parser.parse_args()
+
+    path = generate_corpus(
+        args.out_dir, args.per_type, args.seed, args.skew, args.noise,
+        args.pages, args.formats, args.native_share, args.targets
+    )
+    print(f"Wrote {path}")
@@ -0,0 +1,709 @@
+# Bulk ingestion of KYC archives: runs every document of a directory tree
+# or a JSONL manifest through ocr.process_pdf or
+# text_ext.process_file_with_gemini and writes the results to sharded
+# JSONL (or Parquet) files.
+#
+#   python bulk_ingest.py archive/ --out results/ --document-type "PAN Card"
+#   python bulk_ingest.py manifest.jsonl --out results/ --processes 4 --in-flight 4
+#
+# Manifest lines are {"path"[, "document_type", "target", "id"]}; paths
+# are relative to the manifest. --target auto sends PDFs with a
+# document_type to process_pdf and everything else (images, untyped
+# PDFs) to process_file_with_gemini.
+#
+# Worker processes each keep --in-flight documents going on threads, so
+# one document is rasterized while another is OCR'd and a third waits
+# on Gemini; the per-process OCR pool defaults to one worker here since
+# the processes already spread OCR over the cores. Identical files (same
+# sha256, target and document_type) are processed once and the copies
+# recorded as duplicates. Progress is checkpointed in
+# <out>/checkpoint.sqlite3 once a result is durably written, so an
+# interrupted run picks up where it stopped when started again with the
+# same --out; results it wrote after its last checkpoint are read back
+# from the shards then, not processed and written a second time. A worker process that dies takes its pool down: the pool
+# is restarted and the documents it was working on are retried one at a
+# time, so only a document that kills a worker on its own is FAILED.
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import argparse
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import (
+    ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+)
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# Worker processes, and documents each keeps in flight.
+BULK_PROCESSES = int(os.getenv("BULK_PROCESSES", max(1, (os.cpu_count() or 1) // 2)))
+BULK_IN_FLIGHT = int(os.getenv("BULK_IN_FLIGHT", 4))
+
+# Result rows per output shard.
+BULK_SHARD_SIZE = int(os.getenv("BULK_SHARD_SIZE", 5000))
+
+# Results written between checkpoint commits (JSONL is fsync'd first).
+BULK_FLUSH_EVERY = int(os.getenv("BULK_FLUSH_EVERY", 50))
+
+# Seconds between progress lines on stderr.
+BULK_PROGRESS_SECONDS = float(os.getenv("BULK_PROGRESS_SECONDS", 10))
+
+BULK_CONFIDENCE_THRESHOLD = float(os.getenv("BULK_CONFIDENCE_THRESHOLD", 0.70))
+
+TARGETS = ("process_pdf", "process_file_with_gemini")
+EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png")
+
+# Columns of a result row (every Parquet shard has all of them).
+COLUMNS = ("id", "path", "sha256", "document_type", "target", "status", "result",
+           "error", "duplicate_of", "pages", "seconds", "stages", "dedupe_key", "shard")
+
+DONE = "done"
+FAILED = "failed"
+DUPLICATE = "duplicate"
+
+# ============================================================
+# SOURCES
+# ============================================================
+
+def scan_directory(root):
+    """
+    Documents under root, in a stable order; ids are the paths relative
+    to root.
+    """
+    items = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(EXTENSIONS):
+                path = os.path.join(dirpath, name)
+                items.append({"path": path, "id": os.path.relpath(path, root)})
+    return items
+
+
+def read_manifest(path):
+    base = os.path.dirname(os.path.abspath(path))
+    items = []
+    with open(path) as f:
+        for n, line in enumerate(f):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if "path" not in item:
+                raise ValueError(f"line {n + 1}: missing path")
+            item.setdefault("id", item["path"])
+            item["path"] = os.path.join(base, item["path"])
+            items.append(item)
+    return items
+
+
+def resolve_target(item, target):
+    target = item.get("target") or target
+    if target != "auto":
+        return target
+    if item["path"].lower().endswith(".pdf") and item.get("document_type"):
+        return "process_pdf"
+    return "process_file_with_gemini"
+
+
+def load_items(source, document_type=None, target="auto"):
+    if os.path.isdir(source):
+        items = scan_directory(source)
+    else:
+        items = read_manifest(source)
+
+    for item in items:
+        item.setdefault("document_type", document_type)
+        item["target"] = resolve_target(item, target)
+        if item["target"] not in TARGETS:
+            raise ValueError(f"{item['id']}: unknown target {item['target']!r}")
+    return items
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dedupe_key(item):
+    """
+    Files are the same work when their bytes, target and document_type
+    all match.
+    """
+    return f"{item['sha256']}:{item['target']}:{item.get('document_type') or ''}"
+
+# ============================================================
+# WORKERS
+# ============================================================
+
+def _init_worker(verbose):
+    # Before ocr/ocr_pool are imported: the bulk processes already spread
+    # OCR over the cores, so each keeps a single OCR worker by default.
+    os.environ.setdefault("OCR_WORKERS", "1")
+    if verbose:
+        logging.basicConfig(level=logging.INFO)
+
+
+def _page_count(data, path):
+    if not path.lower().endswith(".pdf"):
+        return 1
+    import fitz
+    with fitz.open(stream=data, filetype="pdf") as pdf:
+        return pdf.page_count
+
+
+def process_item(item, confidence_threshold=BULK_CONFIDENCE_THRESHOLD):
+    """
+    Run one document through its target. Returns its result row; errors
+    are reported in the row, not raised.
+    """
+    import metrics
+    from ocr import new_entity_batcher, process_pdf
+    from text_ext import process_file_with_gemini
+
+    trace = metrics.Trace(item["id"])
+    start = time.perf_counter()
+    row = {key: item.get(key) for key in ("id", "path", "sha256", "document_type", "target")}
+
+    try:
+        with open(item["path"], "rb") as f:
+            data = f.read()
+        row["pages"] = _page_count(data, item["path"])
+
+        # Every archive file is its own customer: its Gemini requests are
+        # never packed with another file's.
+        with metrics.tracing(trace), new_entity_batcher().document():
+            if item["target"] == "process_pdf":
+                result = process_pdf(
+                    BytesIO(data), item["document_type"],
+                    confidence_threshold=confidence_threshold,
+                )
+            else:
+                result = process_file_with_gemini(
+                    BytesIO(data), os.path.basename(item["path"])
+                )
+        row.update(status=DONE, result=result)
+    except Exception as e:
+        row.update(status=FAILED, error=f"{type(e).__name__}: {e}")
+
+    row["seconds"] = round(time.perf_counter() - start, 3)
+    row["stages"] = {
+        stage: total["seconds"] for stage, total in trace.to_dict()["stages"].items()
+    }
+    return row
+
+
+def process_chunk(items, confidence_threshold):
+    """
+    One worker task: the documents of the chunk side by side on threads,
+    so their rasterize, OCR and Gemini stages overlap.
+    """
+    with ThreadPoolExecutor(max_workers=len(items)) as threads:
+        return list(threads.map(
+            lambda item: process_item(item, confidence_threshold), items
+        ))
+
+# ============================================================
+# CHECKPOINT
+# ============================================================
+
+class Checkpoint:
+    """
+    SQLite record of every file already written to a shard, and of the
+    first file written for each dedupe key.
+    """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                id TEXT PRIMARY KEY,
+                path TEXT,
+                dedupe_key TEXT,
+                status TEXT NOT NULL,
+                shard TEXT,
+                error TEXT,
+                finished_at REAL NOT NULL
+            )
+        """)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS originals (
+                dedupe_key TEXT PRIMARY KEY,
+                id TEXT NOT NULL
+            )
+        """)
+        self.db.commit()
+
+    def finished(self, retry_failed=False):
+        """
+        Ids not to process again.
+        """
+        statuses = (DONE, DUPLICATE) if retry_failed else (DONE, DUPLICATE, FAILED)
+        rows = self.db.execute(
+            f"SELECT id FROM files WHERE status IN ({','.join('?' * len(statuses))})",
+            statuses,
+        )
+        return {row[0] for row in rows}
+
+    def originals(self):
+        return dict(self.db.execute("SELECT dedupe_key, id FROM originals"))
+
+    def shards(self):
+        """
+        Shard each recorded file was written to.
+        """
+        return dict(self.db.execute("SELECT id, shard FROM files"))
+
+    def commit(self, rows):
+        now = time.time()
+        for row in rows:
+            self.db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (row["id"], row["path"], row["dedupe_key"], row["status"],
+                 row["shard"], row.get("error"), now),
+            )
+            if row["status"] == DONE:
+                self.db.execute(
+                    "INSERT OR IGNORE INTO originals VALUES (?, ?)",
+                    (row["dedupe_key"], row["id"]),
+                )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+# ============================================================
+# OUTPUT SHARDS
+# ============================================================
+
+def _shard_index(name):
+    return int(name.split("-")[1].split(".")[0])
+
+
+def _shard_names(out_dir, extension):
+    return sorted(
+        (name for name in os.listdir(out_dir)
+         if name.startswith("results-") and name.endswith(extension)),
+        key=_shard_index,
+    )
+
+
+def _next_shard_index(out_dir, extension):
+    return max(map(_shard_index, _shard_names(out_dir, extension)), default=-1) + 1
+
+
+class JsonlShards:
+    """
+    results-NNNNN.jsonl files of up to shard_size rows. A resumed run
+    starts a new shard rather than appending to an old one.
+    """
+
+    extension = ".jsonl"
+
+    def __init__(self, out_dir, shard_size):
+        self.out_dir = out_dir
+        self.shard_size = shard_size
+        self.index = _next_shard_index(out_dir, self.extension)
+        self.file = None
+        self.count = 0
+        self.pending = []
+
+    def _open(self):
+        name = f"results-{self.index:05d}{self.extension}"
+        self.file = open(os.path.join(self.out_dir, name), "a")
+        return name
+
+    def add(self, row):
+        if self.file is None:
+            self.name = self._open()
+        row["shard"] = self.name
+        self.file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        self.pending.append(row)
+        self.count += 1
+        if self.count >= self.shard_size:
+            durable = self.flush()
+            self.file.close()
+            self.file, self.count = None, 0
+            self.index += 1
+            return durable
+        return []
+
+    def flush(self):
+        """
+        Rows added since the last flush, now on disk.
+        """
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        durable, self.pending = self.pending, []
+        return durable
+
+    def close(self):
+        durable = self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        return durable
+
+    def recover(self, committed):
+        """
+        Rows an earlier run wrote to a shard but died before checkpointing
+        (committed: id -> shard from the checkpoint). They are recorded
+        rather than processed again, so no file gets a second row. Only
+        shards from the last one the checkpoint knows of onwards can hold
+        such rows.
+        """
+        known = [_shard_index(shard) for shard in committed.values() if shard]
+        first = max(known, default=-1)
+        rows = []
+        for name in _shard_names(self.out_dir, self.extension):
+            if _shard_index(name) < first:
+                continue
+            for row in self._read(os.path.join(self.out_dir, name), name, committed):
+                if committed.get(row["id"]) != name:
+                    rows.append(row)
+        return rows
+
+    def _read(self, path, name, committed):
+        # A line cut short by the crash is truncated away.
+        rows, size = [], 0
+        with open(path, "rb+") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                rows.append(json.loads(line))
+                size += len(line)
+            f.truncate(size)
+        return rows
+
+
+class ParquetShards(JsonlShards):
+    """
+    results-NNNNN.parquet files; a shard only reaches disk once full (or
+    at close), so that is when its rows become durable. result and
+    stages are stored as JSON strings.
+    """
+
+    extension = ".parquet"
+
+    def __init__(self, out_dir, shard_size):
+        if pyarrow is None:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+        super().__init__(out_dir, shard_size)
+        self.rows = []
+
+    def add(self, row):
+        row["shard"] = f"results-{self.index:05d}{self.extension}"
+        self.rows.append(row)
+        if len(self.rows) >= self.shard_size:
+            return self._write()
+        return []
+
+    def _write(self):
+        if not self.rows:
+            return []
+        records = [
+            dict({column: row.get(column) for column in COLUMNS},
+                 result=json.dumps(row.get("result"), ensure_ascii=False, default=str),
+                 stages=json.dumps(row.get("stages") or {}))
+            for row in self.rows
+        ]
+        path = os.path.join(self.out_dir, self.rows[0]["shard"])
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(records), path)
+        durable, self.rows = self.rows, []
+        self.index += 1
+        return durable
+
+    def flush(self):
+        return []
+
+    def close(self):
+        return self._write()
+
+    def _read(self, path, name, committed):
+        try:
+            return pyarrow.parquet.read_table(path).to_pylist()
+        except (pyarrow.ArrowInvalid, OSError):
+            if name in committed.values():
+                raise
+            # Cut short by the crash before any of its rows were recorded.
+            os.remove(path)
+            return []
+
+# ============================================================
+# PROGRESS
+# ============================================================
+
+class Progress:
+    def __init__(self, total, interval=BULK_PROGRESS_SECONDS):
+        self.total = total
+        self.interval = interval
+        self.start = self.last = time.perf_counter()
+        self.last_done = 0
+        self.counts = {DONE: 0, FAILED: 0, DUPLICATE: 0}
+        self.pages = 0
+
+    def add(self, row):
+        self.counts[row["status"]] += 1
+        if row["status"] == DONE:
+            self.pages += row.get("pages") or 0
+
+    @property
+    def done(self):
+        return sum(self.counts.values())
+
+    def maybe_report(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self.last < self.interval:
+            return
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        recent = (self.done - self.last_done) / (now - self.last) if now > self.last else 0.0
+        eta = (self.total - self.done) / rate if rate else None
+        print(
+            f"[bulk] {self.done}/{self.total}"
+            f" ok={self.counts[DONE]} dup={self.counts[DUPLICATE]} failed={self.counts[FAILED]}"
+            f" | {rate:.2f} docs/s ({recent:.2f} now), {self.pages / elapsed if elapsed else 0:.2f} pages/s"
+            f" | elapsed {elapsed:.0f}s" + (f", eta {eta:.0f}s" if eta is not None else ""),
+            file=sys.stderr, flush=True,
+        )
+        self.last, self.last_done = now, self.done
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        return {
+            "documents": self.done,
+            "processed": self.counts[DONE],
+            "duplicates": self.counts[DUPLICATE],
+            "failed": self.counts[FAILED],
+            "pages": self.pages,
+            "wall_seconds": round(elapsed, 3),
+            "documents_per_second": round(self.done / elapsed, 3) if elapsed else None,
+            "pages_per_second": round(self.pages / elapsed, 3) if elapsed else None,
+        }
+
+# ============================================================
+# RUN
+# ============================================================
+
+def duplicate_row(item, original_id):
+    row = {key: item.get(key) for key in ("id", "path", "sha256", "document_type", "target")}
+    row.update(status=DUPLICATE, duplicate_of=original_id, seconds=0.0)
+    return row
+
+
+def crashed_row(item, error):
+    row = {key: item.get(key) for key in ("id", "path", "sha256", "document_type", "target")}
+    row.update(status=FAILED, error=f"{type(error).__name__}: worker process died ({error})",
+               seconds=0.0)
+    return row
+
+
+def run(args):
+    os.makedirs(args.out, exist_ok=True)
+    checkpoint = Checkpoint(os.path.join(args.out, "checkpoint.sqlite3"))
+    shards = (ParquetShards if args.format == "parquet" else JsonlShards)(
+        args.out, args.shard_size
+    )
+
+    recovered = shards.recover(checkpoint.shards())
+    checkpoint.commit(recovered)
+    if recovered:
+        print(f"[bulk] {len(recovered)} results recovered from the shards of an interrupted run",
+              file=sys.stderr, flush=True)
+
+    items = load_items(args.source, args.document_type, args.target)
+    finished = checkpoint.finished(args.retry_failed)
+    todo = [item for item in items if item["id"] not in finished]
+    print(f"[bulk] {len(items)} documents, {len(items) - len(todo)} already done",
+          file=sys.stderr, flush=True)
+
+    originals = checkpoint.originals()  # dedupe key -> id written DONE
+    in_flight = {}                      # dedupe key -> copies waiting on it
+    progress = Progress(len(todo), args.progress)
+    unflushed = 0
+
+    def record(rows):
+        nonlocal unflushed
+        durable = []
+        for row in rows:
+            progress.add(row)
+            durable += shards.add(row)
+        unflushed += len(rows)
+        if unflushed >= args.flush_every:
+            durable += shards.flush()
+            unflushed = 0
+        checkpoint.commit(durable)
+
+    def finish(rows):
+        out = []
+        for row in rows:
+            row["dedupe_key"] = key = dedupe_key(row)
+            out.append(row)
+            if row["status"] == DONE:
+                originals[key] = row["id"]
+            # Copies of a failed document are retried on their own.
+            for copy in in_flight.pop(key, []):
+                if row["status"] == DONE:
+                    out.append(dict(duplicate_row(copy, row["id"]), dedupe_key=key))
+                else:
+                    requeue.append(copy)
+        record(out)
+
+    context = multiprocessing.get_context("spawn")
+
+    def new_pool():
+        return ProcessPoolExecutor(
+            max_workers=args.processes, mp_context=context,
+            initializer=_init_worker, initargs=(args.verbose,),
+        )
+
+    pool = new_pool()
+    pending = {}   # future -> (chunk, pool it runs in)
+    requeue = []
+    alone = set()  # ids retried in a chunk of their own after a crash
+    chunk = []
+
+    def restart(broken):
+        nonlocal pool
+        if broken is pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+            pool = new_pool()
+
+    def submit(chunk):
+        try:
+            future = pool.submit(process_chunk, chunk, args.confidence_threshold)
+        except BrokenProcessPool:
+            restart(pool)
+            future = pool.submit(process_chunk, chunk, args.confidence_threshold)
+        pending[future] = (chunk, pool)
+
+    def crashed(chunk, owner, error):
+        # Every chunk of the dead pool fails with it, not only the one
+        # whose document killed the worker: retry their documents alone,
+        # and fail a document only when it crashes a worker by itself.
+        restart(owner)
+        if len(chunk) == 1 and chunk[0]["id"] in alone:
+            finish([crashed_row(chunk[0], error)])
+            return
+        for item in chunk:
+            alone.add(item["id"])
+            requeue.extend(in_flight.pop(dedupe_key(item), []))
+            requeue.append(item)
+
+    def drain(block):
+        done, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            chunk, owner = pending.pop(future)
+            try:
+                rows = future.result()
+            except BrokenProcessPool as e:
+                crashed(chunk, owner, e)
+                continue
+            finish(rows)
+        progress.maybe_report()
+
+    queue = iter(todo)
+    try:
+        while True:
+            item = requeue.pop() if requeue else next(queue, None)
+            if item is None:
+                if chunk:
+                    submit(chunk)
+                    chunk = []
+                if not pending and not requeue:
+                    break
+                drain(block=True)
+                continue
+
+            if "sha256" not in item:
+                try:
+                    item["sha256"] = file_sha256(item["path"])
+                except OSError as e:
+                    row = {key: item.get(key) for key in ("id", "path", "document_type", "target")}
+                    row.update(status=FAILED, error=f"{type(e).__name__}: {e}",
+                               dedupe_key=None, seconds=0.0)
+                    record([row])
+                    continue
+            key = dedupe_key(item)
+            if originals.get(key, item["id"]) != item["id"]:
+                record([dict(duplicate_row(item, originals[key]), dedupe_key=key)])
+                continue
+            if key in in_flight:
+                in_flight[key].append(item)
+                continue
+            in_flight[key] = []
+
+            if item["id"] in alone:
+                # Run with nothing else in flight, so a crash is its own.
+                while pending:
+                    drain(block=True)
+                submit([item])
+                while pending:
+                    drain(block=True)
+                continue
+            chunk.append(item)
+            if len(chunk) >= args.in_flight:
+                submit(chunk)
+                chunk = []
+            # Keep every worker busy with one chunk queued behind it.
+            while len(pending) >= 2 * args.processes:
+                drain(block=True)
+            if pending:
+                drain(block=False)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        checkpoint.commit(shards.close())
+        checkpoint.close()
+
+    if progress.done != progress.last_done:
+        progress.maybe_report(force=True)
+    summary = progress.summary()
+    with open(os.path.join(args.out, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a directory or JSONL manifest of KYC documents through extraction."
+    )
+    parser.add_argument("source", help="directory of PDF/JPG/PNG files, or a JSONL manifest")
+    parser.add_argument("--out", required=True,
+                        help="output directory (shards, checkpoint, summary)")
+    parser.add_argument("--document-type",
+                        help="document_type of entries that do not give one")
+    parser.add_argument("--target", choices=("auto",) + TARGETS, default="auto")
+    parser.add_argument("--processes", type=int, default=BULK_PROCESSES)
+    parser.add_argument("--in-flight", type=int, default=BULK_IN_FLIGHT,
+                        help="documents each process works on at once")
+    parser.add_argument("--shard-size", type=int, default=BULK_SHARD_SIZE)
+    parser.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl")
+    parser.add_argument("--flush-every", type=int, default=BULK_FLUSH_EVERY)
+    parser.add_argument("--progress", type=float, default=BULK_PROGRESS_SECONDS,
+                        help="seconds between progress lines")
+    parser.add_argument("--confidence-threshold", type=float,
+                        default=BULK_CONFIDENCE_THRESHOLD)
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="process files that failed in an earlier run again")
+    parser.add_argument("--verbose", action="store_true",
+                        help="log the pipeline's progress per document")
+    run(parser.parse_args())
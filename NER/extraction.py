@@ -0,0 +1,114 @@
+import os
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from ocr import new_entity_batcher
+from result_cache import cached_process_pdf
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# Documents of one upload processed side by side. OCR itself is bounded
+# by the OCR pool and Gemini by the LLM client, so this only caps how
+# many documents are in the pipeline at once.
+EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", 4))
+
+UPLOAD_CONFIDENCE_THRESHOLD = 0.70
+
+executor = ThreadPoolExecutor(
+    max_workers=EXTRACT_CONCURRENCY,
+    thread_name_prefix="extract"
+)
+
+# ============================================================
+# SINGLE DOCUMENT
+# ============================================================
+
+class ExtractionError(Exception):
+    pass
+
+
+def validate_upload(files, document_types):
+    """
+    Returns an error message for a malformed upload, or None.
+    """
+    if not files:
+        return "No files uploaded."
+
+    if len(files) != len(document_types):
+        return "Each file must have a corresponding document_type"
+
+    return None
+
+
+def extract_document(file_bytes, filename, document_type, on_page=None,
+                     trace=None, batcher=None):
+    """
+    Run one uploaded document through the (cached) OCR → Gemini pipeline
+    and return its entities with document_type injected.
+
+    Pass a metrics.Trace to collect the per-stage timeline of this
+    document. Documents given the same batcher (ocr.new_entity_batcher(),
+    one per upload) share Gemini requests (see llm_batching.py); without
+    one the document is sent on its own.
+    """
+    batcher = batcher or new_entity_batcher()
+    with metrics.tracing(trace), batcher.document():
+        try:
+            result = cached_process_pdf(
+                file_stream=BytesIO(file_bytes),
+                document_type=document_type,
+                confidence_threshold=UPLOAD_CONFIDENCE_THRESHOLD,
+                on_page=on_page
+            )
+        except Exception:
+            metrics.DOCUMENTS.inc(status="error")
+            raise
+
+    if not result or "extracted_entities" not in result:
+        metrics.DOCUMENTS.inc(status="error")
+        raise ExtractionError(f"Failed to extract entities from {filename}")
+
+    metrics.DOCUMENTS.inc(status="ok")
+
+    entities = result["extracted_entities"]
+
+    # ✅ Inject correct document_type
+    entities["document_type"] = document_type
+
+    return entities
+
+# ============================================================
+# WHOLE UPLOAD
+# ============================================================
+
+def new_traces(uploads):
+    """
+    One metrics.Trace per upload, labelled with its filename.
+    """
+    return [metrics.Trace(filename) for _, filename, _ in uploads]
+
+
+def submit_documents(uploads, traces=None):
+    """
+    uploads: list of (file_bytes, filename, document_type).
+    traces: optional list of metrics.Trace, one per upload.
+    Returns one Future per upload, in the same order. Only the
+    documents of this upload share Gemini requests.
+    """
+    traces = traces or [None] * len(uploads)
+    batcher = new_entity_batcher()
+    return [
+        executor.submit(extract_document, *upload, trace=trace, batcher=batcher)
+        for upload, trace in zip(uploads, traces)
+    ]
+
+
+def extract_documents(uploads, traces=None):
+    """
+    Process every document of an upload concurrently and return their
+    entities in upload order. Raises the first failure.
+    """
+    return [future.result() for future in submit_documents(uploads, traces)]
@@ -0,0 +1,31 @@
+# Picked up automatically by gunicorn from the working directory.
+import os
+
+# NER_PRELOAD=1 imports the app in the master before the workers fork.
+# The EasyOCR reader is only loaded there when a worker would use it:
+# with OCR_WORKERS <= 1 (OCR in the worker itself) or with
+# OCR_START_METHOD=fork (OCR processes forked from the worker). The
+# default spawned OCR pool loads its own readers, so preloading it would
+# only cost the master memory. Warm-up inference still runs per worker.
+preload_app = os.getenv("NER_PRELOAD", "0") == "1"
+
+if preload_app:
+    # Job worker threads, warm-up and SQLite connections are started in
+    # each worker (post_fork), never in the master.
+    os.environ["NER_DEFER_STARTUP"] = "1"
+
+
+def on_starting(server):
+    if preload_app:
+        from ocr_pool import OCR_WORKERS, OCR_START_METHOD
+        if OCR_WORKERS <= 1 or OCR_START_METHOD == "fork":
+            import models
+            models.preload(warm=False)
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import models
+        from job_worker import start_local_workers
+        start_local_workers()
+        models.start_warmup()
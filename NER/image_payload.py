@@ -0,0 +1,223 @@
+import os
+from io import BytesIO
+from collections import namedtuple
+
+import fitz
+from PIL import Image
+
+import metrics
+import page_hash
+from page_buffer import pixmap_array
+
+# ============================================================
+# CONFIG
+# ============================================================
+#
+# How page images are shrunk before they are sent to Gemini vision.
+# Tune against the corpus with benchmarks/bench_image_payload.py.
+
+# Longest edge in pixels (0 = keep the rendered size). 2048 keeps an A4
+# page at ~175 DPI, and a card photo well above what the model reads.
+LLM_IMAGE_MAX_SIDE = int(os.getenv("LLM_IMAGE_MAX_SIDE", 2048))
+
+# jpeg | webp | png
+LLM_IMAGE_FORMAT = os.getenv("LLM_IMAGE_FORMAT", "jpeg").lower()
+
+# JPEG/WebP quality (1-100); ignored for PNG.
+LLM_IMAGE_QUALITY = int(os.getenv("LLM_IMAGE_QUALITY", 85))
+
+# Send single-channel images (1 = on).
+LLM_IMAGE_GRAYSCALE = os.getenv("LLM_IMAGE_GRAYSCALE", "0") == "1"
+
+MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+
+if LLM_IMAGE_FORMAT == "jpg":
+    LLM_IMAGE_FORMAT = "jpeg"
+if LLM_IMAGE_FORMAT not in MIME_TYPES:
+    raise ValueError(f"LLM_IMAGE_FORMAT must be one of {sorted(MIME_TYPES)}")
+
+# One encoded image, ready for image_part(). raw_bytes is the size of the
+# uncompressed RGB bitmap it replaces, for the bytes-saved report.
+Payload = namedtuple("Payload", "data mime_type width height raw_bytes")
+
+# ============================================================
+# SIZING
+# ============================================================
+
+def fit_size(width, height, max_side=LLM_IMAGE_MAX_SIDE):
+    """
+    (width, height) scaled down so the long edge is at most max_side.
+    """
+    longest = max(width, height)
+    if not max_side or longest <= max_side:
+        return width, height
+    scale = max_side / longest
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def capped_dpi(width_pt, height_pt, dpi, max_side=LLM_IMAGE_MAX_SIDE):
+    """
+    Render DPI for a page of width_pt x height_pt points, lowered so the
+    bitmap already fits max_side and never has to be resized.
+    """
+    if not max_side:
+        return dpi
+    return min(dpi, int(max_side * 72 / max(width_pt, height_pt)))
+
+# ============================================================
+# ENCODING
+# ============================================================
+
+def _save(img, fmt, quality):
+    buffer = BytesIO()
+    if fmt == "jpeg":
+        img.save(buffer, format="JPEG", quality=quality)
+    elif fmt == "webp":
+        img.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        img.save(buffer, format="PNG", compress_level=6)
+    return buffer.getvalue()
+
+
+def _encode(img, fmt, quality, max_side, grayscale):
+    if grayscale:
+        img = img.convert("L")
+    elif img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    size = fit_size(img.width, img.height, max_side)
+    if size != img.size:
+        img = img.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+    return _save(img, fmt, quality), img.width, img.height
+
+
+def encode_image(img, fmt=LLM_IMAGE_FORMAT, quality=LLM_IMAGE_QUALITY,
+                 max_side=LLM_IMAGE_MAX_SIDE, grayscale=LLM_IMAGE_GRAYSCALE):
+    """
+    Downsample, convert and compress a PIL image into a Payload.
+    """
+    data, width, height = _encode(img, fmt, quality, max_side, grayscale)
+    payload = Payload(data, MIME_TYPES[fmt], width, height, img.width * img.height * 3)
+    record(payload)
+    return payload
+
+
+def encode_upload(file_stream, fmt=LLM_IMAGE_FORMAT, quality=LLM_IMAGE_QUALITY,
+                  max_side=LLM_IMAGE_MAX_SIDE, grayscale=LLM_IMAGE_GRAYSCALE):
+    """
+    Payload for an uploaded image file. A file already in the target
+    format and size is sent as is, without decoding it.
+    """
+    data = file_stream.read()
+    img = Image.open(BytesIO(data))  # reads the header only
+    raw_bytes = img.width * img.height * 3
+    size = fit_size(img.width, img.height, max_side)
+
+    if (img.format or "").lower() == fmt and size == img.size and (img.mode == "L" or not grayscale):
+        width, height = img.size
+    else:
+        if img.format == "JPEG":
+            # Let libjpeg decode straight to (about) the target size.
+            img.draft("L" if grayscale else "RGB", size)
+        data, width, height = _encode(img, fmt, quality, max_side, grayscale)
+
+    payload = Payload(data, MIME_TYPES[fmt], width, height, raw_bytes)
+    record(payload)
+    return payload
+
+
+def render_page(page, dpi=300, fmt=LLM_IMAGE_FORMAT, quality=LLM_IMAGE_QUALITY,
+                max_side=LLM_IMAGE_MAX_SIDE, grayscale=LLM_IMAGE_GRAYSCALE):
+    """
+    Payload for a PyMuPDF page: rendered at a DPI that already fits
+    max_side, in the target colourspace, and encoded from the pixmap
+    without a PNG round trip.
+    """
+    pix = _rasterize(page, dpi, max_side, grayscale)
+    return _encode_pixmap(pix, page, dpi, fmt, quality, grayscale)
+
+
+def _rasterize(page, dpi, max_side, grayscale):
+    rect = page.rect
+    with metrics.stage_timer("rasterize", page=page.number + 1):
+        return page.get_pixmap(
+            dpi=capped_dpi(rect.width, rect.height, dpi, max_side),
+            colorspace=fitz.csGRAY if grayscale else fitz.csRGB,
+            alpha=False,
+        )
+
+
+def _encode_pixmap(pix, page, dpi, fmt, quality, grayscale):
+    rect = page.rect
+    raw_bytes = round(rect.width * dpi / 72) * round(rect.height * dpi / 72) * 3
+
+    with metrics.stage_timer("image_encode", page=page.number + 1):
+        if fmt == "webp":
+            # MuPDF has no WebP writer.
+            mode = "L" if grayscale else "RGB"
+            data = _save(Image.frombytes(mode, (pix.width, pix.height), pix.samples),
+                         fmt, quality)
+        elif fmt == "jpeg":
+            data = pix.tobytes("jpg", jpg_quality=quality)
+        else:
+            data = pix.tobytes("png")
+
+    payload = Payload(data, MIME_TYPES[fmt], pix.width, pix.height, raw_bytes)
+    record(payload)
+    return payload
+
+
+def iter_pdf_payloads(data, dpi=300, max_pages=None, pages=None, distinct=False,
+                      fmt=LLM_IMAGE_FORMAT, quality=LLM_IMAGE_QUALITY,
+                      max_side=LLM_IMAGE_MAX_SIDE, grayscale=LLM_IMAGE_GRAYSCALE):
+    """
+    Payloads for the pages of a PDF given as bytes, one page at a time.
+    pages limits it to those (0-based) page indexes.
+
+    With distinct, a page that looks the same as one already yielded
+    (page_hash.py) is dropped before it is encoded; the dropped pages are
+    reported in the trace note "duplicate_pages" ({page: page it matched}).
+    """
+    seen = []  # (signature, page number)
+    duplicates = {}
+    with fitz.open(stream=data, filetype="pdf") as pdf:
+        count = pdf.page_count if max_pages is None else min(pdf.page_count, max_pages)
+        indexes = range(count) if pages is None else [i for i in pages if i < count]
+        for index in indexes:
+            page = pdf[index]
+            pix = _rasterize(page, dpi, max_side, grayscale)
+            if distinct:
+                with metrics.stage_timer("page_hash", page=index + 1):
+                    sig = page_hash.signature(pixmap_array(pix))
+                    match = next((n for other, n in seen if page_hash.near_identical(sig, other)), None)
+                if match is not None:
+                    duplicates[index + 1] = match
+                    metrics.DUPLICATE_PAGES.inc(match="document")
+                    continue
+                seen.append((sig, index + 1))
+            yield _encode_pixmap(pix, page, dpi, fmt, quality, grayscale)
+
+    if duplicates:
+        metrics.note("duplicate_pages", duplicates)
+
+# ============================================================
+# REPORTING
+# ============================================================
+
+def record(payload):
+    metrics.IMAGE_PAYLOADS.inc()
+    metrics.IMAGE_PAYLOAD_BYTES.inc(payload.raw_bytes, kind="raw")
+    metrics.IMAGE_PAYLOAD_BYTES.inc(len(payload.data), kind="sent")
+    trace = metrics.current_trace()
+    if trace is not None:
+        trace.add_gemini(images=1, image_raw_bytes=payload.raw_bytes,
+                         image_bytes=len(payload.data))
+
+
+def bytes_saved():
+    """
+    Uncompressed bitmap bytes not sent to Gemini, since startup.
+    """
+    return (metrics.IMAGE_PAYLOAD_BYTES.value(kind="raw")
+            - metrics.IMAGE_PAYLOAD_BYTES.value(kind="sent"))
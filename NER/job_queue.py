@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# Directory for the service's local state. Relative file settings such as
+# JOB_DB resolve against it, not against the working directory.
+NER_DATA_DIR = os.getenv(
+    "NER_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+)
+
+JOB_DB = os.path.join(NER_DATA_DIR, os.getenv("JOB_DB", "jobs.sqlite3"))
+
+# A running job whose worker has not sent a heartbeat (see job_worker.py)
+# for this long is assumed dead (crash, restart) and handed to another
+# worker.
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", 600))
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# ============================================================
+# QUEUE
+# ============================================================
+
+class JobQueue:
+    """
+    SQLite-backed queue of extraction jobs.
+
+    Every process (HTTP front end or job_worker.py) opens the same file;
+    claim() is a single write transaction, so any number of workers can
+    poll it safely and jobs survive restarts.
+    """
+
+    def __init__(self, path=JOB_DB):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                batch_id TEXT NOT NULL,
+                filename TEXT,
+                document_type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload BLOB,
+                result TEXT,
+                error TEXT,
+                pages_done INTEGER NOT NULL DEFAULT 0,
+                pages_total INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat_at REAL
+            )
+        """)
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id)")
+        return db
+
+    def _db(self):
+        # One connection per thread, opened on first use in the process
+        # that uses it: nothing touches the file at import, and no
+        # connection is carried across a gunicorn fork.
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.db = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    # ---------------- producer side ----------------
+
+    def submit(self, uploads):
+        """
+        uploads: list of (file_bytes, filename, document_type).
+        Returns (batch_id, job_ids).
+        """
+        batch_id = uuid.uuid4().hex
+        job_ids = [uuid.uuid4().hex for _ in uploads]
+        now = time.time()
+
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        db.executemany(
+            """
+            INSERT INTO jobs (id, batch_id, filename, document_type, status,
+                              payload, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (job_id, batch_id, filename, document_type, QUEUED, data, now)
+                for job_id, (data, filename, document_type) in zip(job_ids, uploads)
+            ]
+        )
+        db.execute("COMMIT")
+
+        return batch_id, job_ids
+
+    # ---------------- worker side ----------------
+
+    def claim(self, worker_id):
+        """
+        Atomically take the oldest queued job. Returns a dict with the
+        file payload, or None when the queue is empty.
+        """
+        now = time.time()
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+
+        try:
+            db.execute(
+                """
+                UPDATE jobs SET status = ?, worker = NULL
+                WHERE status = ? AND heartbeat_at < ? AND attempts < ?
+                """,
+                (QUEUED, RUNNING, now - JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS)
+            )
+            db.execute(
+                """
+                UPDATE jobs SET status = ?, error = ?, payload = NULL,
+                                finished_at = ?
+                WHERE status = ? AND heartbeat_at < ?
+                """,
+                (FAILED, "Worker lost too many times", now,
+                 RUNNING, now - JOB_STALE_SECONDS)
+            )
+
+            row = db.execute(
+                """
+                SELECT id, filename, document_type, payload FROM jobs
+                WHERE status = ? ORDER BY created_at LIMIT 1
+                """,
+                (QUEUED,)
+            ).fetchone()
+
+            if row is not None:
+                db.execute(
+                    """
+                    UPDATE jobs
+                    SET status = ?, worker = ?, attempts = attempts + 1,
+                        started_at = ?, heartbeat_at = ?, pages_done = 0
+                    WHERE id = ?
+                    """,
+                    (RUNNING, worker_id, now, now, row["id"])
+                )
+
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+        return dict(row) if row is not None else None
+
+    def progress(self, job_id, pages_done, pages_total):
+        self._db().execute(
+            """
+            UPDATE jobs SET pages_done = ?, pages_total = ?, heartbeat_at = ?
+            WHERE id = ?
+            """,
+            (pages_done, pages_total, time.time(), job_id)
+        )
+
+    def heartbeat(self, job_id):
+        """
+        Mark a running job as alive without reporting progress.
+        """
+        self._db().execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ?",
+            (time.time(), job_id, RUNNING)
+        )
+
+    def complete(self, job_id, result):
+        self._finish(job_id, DONE, result=json.dumps(result))
+
+    def fail(self, job_id, error):
+        self._finish(job_id, FAILED, error=error)
+
+    def _finish(self, job_id, status, result=None, error=None):
+        self._db().execute(
+            """
+            UPDATE jobs
+            SET status = ?, result = ?, error = ?, payload = NULL,
+                finished_at = ?, heartbeat_at = ?
+            WHERE id = ?
+            """,
+            (status, result, error, time.time(), time.time(), job_id)
+        )
+
+    # ---------------- status ----------------
+
+    def _describe(self, row):
+        job = {
+            "job_id": row["id"],
+            "batch_id": row["batch_id"],
+            "filename": row["filename"],
+            "document_type": row["document_type"],
+            "status": row["status"],
+            "pages_done": row["pages_done"],
+            "pages_total": row["pages_total"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+        if row["status"] == DONE:
+            job["extracted_entities"] = json.loads(row["result"])
+        if row["status"] == FAILED:
+            job["error"] = row["error"]
+        return job
+
+    _STATUS_COLUMNS = """
+        id, batch_id, filename, document_type, status, result, error,
+        pages_done, pages_total, created_at, started_at, finished_at
+    """
+
+    def get(self, job_id):
+        row = self._db().execute(
+            f"SELECT {self._STATUS_COLUMNS} FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        return self._describe(row) if row is not None else None
+
+    def batch(self, batch_id):
+        rows = self._db().execute(
+            f"""
+            SELECT {self._STATUS_COLUMNS} FROM jobs
+            WHERE batch_id = ? ORDER BY rowid
+            """,
+            (batch_id,)
+        ).fetchall()
+
+        if not rows:
+            return None
+
+        jobs = [self._describe(row) for row in rows]
+        counts = {}
+        for job in jobs:
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+
+        return {
+            "batch_id": batch_id,
+            "finished": counts.get(DONE, 0) + counts.get(FAILED, 0) == len(jobs),
+            "counts": counts,
+            "jobs": jobs,
+        }
+
+
+job_queue = JobQueue()
@@ -0,0 +1,164 @@
+# Job workers for the SQLite extraction queue (job_queue.py).
+#
+# Runs inside the HTTP process when JOB_WORKERS > 0, or standalone so the
+# workers scale independently of the front end:
+#
+#   python job_worker.py --processes 2 --threads 2
+
+import os
+import socket
+import logging
+import argparse
+import threading
+import multiprocessing
+
+from job_queue import JobQueue, job_queue, JOB_STALE_SECONDS
+
+# In-process worker threads started by the HTTP servers.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 1))
+
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1.0))
+
+# Longest wait between retries while the queue itself keeps failing
+# (e.g. "database is locked"); the wait doubles from JOB_POLL_SECONDS.
+JOB_MAX_BACKOFF_SECONDS = float(os.getenv("JOB_MAX_BACKOFF_SECONDS", 60))
+
+# Seconds between heartbeats of a running job. Page progress alone stops
+# during the Gemini phase, which must not make the job look stale.
+JOB_HEARTBEAT_SECONDS = float(
+    os.getenv("JOB_HEARTBEAT_SECONDS", max(1.0, JOB_STALE_SECONDS / 4))
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _heartbeat(queue, job_id, stop_event):
+    while not stop_event.wait(JOB_HEARTBEAT_SECONDS):
+        try:
+            queue.heartbeat(job_id)
+        except Exception:
+            logger.exception("job %s: heartbeat failed", job_id)
+
+
+def run_job(queue, job):
+    # Imported here so the queue/status side never pulls in OCR models.
+    from extraction import extract_document
+
+    job_id = job["id"]
+    stop_beating = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(queue, job_id, stop_beating),
+                            name=f"job-heartbeat-{job_id[:8]}", daemon=True)
+    beat.start()
+    try:
+        entities = extract_document(
+            job["payload"],
+            job["filename"],
+            job["document_type"],
+            on_page=lambda done, total: queue.progress(job_id, done, total)
+        )
+    except Exception as e:
+        queue.fail(job_id, str(e))
+        return
+    finally:
+        stop_beating.set()
+        beat.join()
+
+    # Outside the try: a failure to store the result must not mark the
+    # extraction failed. The job stays running and is reclaimed once stale.
+    queue.complete(job_id, entities)
+
+
+def run_worker(queue, worker_id, stop_event):
+    """
+    Claim and run jobs until stop_event is set. A queue error is logged
+    and retried with backoff rather than ending the thread; a job left
+    running by one is reclaimed once it goes stale.
+    """
+    errors = 0
+    while not stop_event.is_set():
+        try:
+            job = queue.claim(worker_id)
+            if job is not None:
+                run_job(queue, job)
+            errors = 0
+        except Exception:
+            errors += 1
+            logger.exception("job worker %s: queue error", worker_id)
+            stop_event.wait(min(JOB_POLL_SECONDS * 2 ** errors, JOB_MAX_BACKOFF_SECONDS))
+            continue
+
+        if job is None:
+            stop_event.wait(JOB_POLL_SECONDS)
+
+
+class JobWorkerPool:
+    """
+    A set of worker threads polling the job queue.
+    """
+
+    def __init__(self, queue=job_queue, threads=JOB_WORKERS):
+        self.queue = queue
+        self.threads = threads
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        for i in range(self.threads):
+            t = threading.Thread(
+                target=run_worker,
+                args=(self.queue, f"{prefix}:{i}", self._stop),
+                name=f"job-worker-{i}",
+                daemon=True,
+            )
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+
+_local_pool = None
+
+
+def start_local_workers():
+    """
+    Start JOB_WORKERS threads in this process (once).
+    """
+    global _local_pool
+    if _local_pool is None and JOB_WORKERS > 0:
+        _local_pool = JobWorkerPool().start()
+    return _local_pool
+
+
+def _run_process(threads):
+    # Each process opens its own SQLite connections.
+    pool = JobWorkerPool(queue=JobQueue(), threads=threads).start()
+    for t in pool._threads:
+        t.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run extraction job workers.")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=1,
+                        help="worker threads per process")
+    args = parser.parse_args()
+
+    processes = [
+        multiprocessing.Process(target=_run_process, args=(args.threads,))
+        for _ in range(args.processes)
+    ]
+    for p in processes:
+        p.start()
+
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        for p in processes:
+            p.terminate()
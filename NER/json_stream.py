@@ -0,0 +1,202 @@
+import re
+import json
+
+import metrics
+
+# ============================================================
+# INCREMENTAL PARSER
+# ============================================================
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class JsonStreamParser:
+    """
+    Tolerant, incremental parser for one JSON object or array in an LLM
+    response: text before it (prose, a ```json fence) and after it is
+    ignored.
+
+    feed() takes the response a chunk at a time and keeps the top-level
+    members (of an object) or items (of an array) parsed so far, so a
+    caller can stop reading once the ones it needs are in. result() then
+    returns the value - repaired from the complete members if the
+    response was cut short or malformed.
+
+    With expect="{" (an object answer) parsing starts at the first "{",
+    so a bracket in the prose before it is not taken for the value.
+    """
+
+    def __init__(self, expect=None):
+        self.expect = expect
+        self.text = ""
+        self.members = {}   # top-level object members completed so far
+        self.items = []     # top-level array items completed so far
+        self.kind = None    # "{" or "[" once the value has started
+        self.done = False
+        self.stopped = False
+        self._pos = 0
+        self._start = None
+        self._item_start = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+
+    # ---------------- feeding ----------------
+
+    def feed(self, chunk):
+        if self.done or not chunk:
+            return
+        self.text += chunk
+        text = self.text
+
+        while self._pos < len(text) and not self.done:
+            ch = text[self._pos]
+            if self._start is None:
+                if ch in _CLOSERS and self.expect in (None, ch):
+                    self._start = self._pos
+                    self.kind = ch
+                    self._stack.append(ch)
+                    self._item_start = self._pos + 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in _CLOSERS:
+                self._stack.append(ch)
+            elif ch in "}]":
+                if len(self._stack) == 1:
+                    self._complete_item(self._pos)
+                    self.done = True
+                self._stack.pop()
+            elif ch == "," and len(self._stack) == 1:
+                self._complete_item(self._pos)
+                self._item_start = self._pos + 1
+            self._pos += 1
+
+    def _complete_item(self, end):
+        chunk = self.text[self._item_start:end].strip()
+        if not chunk:
+            return
+        try:
+            if self.kind == "{":
+                self.members.update(json.loads("{" + chunk + "}"))
+            else:
+                self.items.append(json.loads(chunk))
+        except json.JSONDecodeError:
+            # A malformed member is dropped; the others still count.
+            pass
+
+    def _open_member(self):
+        """
+        The top-level member being read, once its value is closed: the
+        last member of an object only completes at the closing brace,
+        the very end of the answer. A number is never taken as closed,
+        it may go on in the next chunk.
+        """
+        if self.kind != "{" or self.done or self._in_string or len(self._stack) != 1:
+            return None
+        raw = self.text[self._item_start:self._pos]
+        try:
+            member = json.loads("{" + raw.strip() + "}")
+        except json.JSONDecodeError:
+            return None
+        if len(member) != 1:
+            return None
+        value = next(iter(member.values()))
+        if isinstance(value, (int, float)) and not isinstance(value, bool) \
+                and raw.rstrip() == raw:
+            return None
+        return member
+
+    def has_members(self, keys):
+        missing = [key for key in keys if key not in self.members]
+        if not missing:
+            return True
+        member = self._open_member()
+        return member is not None and all(key in member for key in missing)
+
+    def stop(self):
+        """
+        The caller stopped reading on purpose (has_members() was true);
+        the members read so far are the result.
+        """
+        member = self._open_member()
+        if member:
+            self.members.update(member)
+        self.stopped = True
+
+    # ---------------- result ----------------
+
+    def _value(self):
+        if self.kind is None:
+            return None
+        if self.done:
+            try:
+                return json.loads(self.text[self._start:self._pos])
+            except json.JSONDecodeError:
+                pass
+        return None
+
+    def _repaired(self):
+        if self.kind is None:
+            return None
+
+        # Close whatever is still open.
+        candidate = self.text[self._start:self._pos if self.done else len(self.text)]
+        if not self.done:
+            # A value cut inside a string is never closed: it would come
+            # back truncated but look valid.
+            if self._in_string:
+                candidate = ""
+            candidate += "".join(_CLOSERS[c] for c in reversed(self._stack))
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            pass
+
+        # Fall back to the members that parsed on their own (this also
+        # drops a trailing comma or a malformed member).
+        if self.kind == "{":
+            return dict(self.members) if self.members else None
+        return list(self.items) if self.items else None
+
+    def _outermost_object(self):
+        # The old safe_json_parse: from the first "{" to the last "}".
+        match = re.search(r"\{.*\}", self.text, re.DOTALL)
+        if not match:
+            return None
+        try:
+            return json.loads(match.group())
+        except json.JSONDecodeError:
+            return None
+
+    def result(self):
+        """
+        (value, status): status is "ok", "repaired" or "failed" (value
+        None). Counted in ner_llm_json_parse_total.
+        """
+        with metrics.stage_timer("json_parse"):
+            value, status = self._value(), "ok"
+            if value is None and self.stopped and self.kind == "{":
+                value = dict(self.members)
+            if value is None:
+                value = self._repaired()
+                if value is None:
+                    value = self._outermost_object()
+                status = "repaired" if value is not None else "failed"
+        metrics.JSON_PARSE.inc(result=status)
+        return value, status
+
+
+def parse(text, expect=None):
+    """
+    (value, status) of a complete response text; see JsonStreamParser.
+    """
+    parser = JsonStreamParser(expect)
+    parser.feed(text or "")
+    return parser.result()
@@ -0,0 +1,425 @@
+import os
+import time
+import threading
+import contextlib
+import contextvars
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from llm_client import gemini_client, text_part, GeminiError, LLM_STREAM
+from json_stream import JsonStreamParser
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# Documents packed into one Gemini request (1 = one request each).
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", 4))
+
+# Estimated prompt tokens per batched request; a document that alone
+# exceeds it is still sent, by itself.
+LLM_BATCH_MAX_TOKENS = int(os.getenv("LLM_BATCH_MAX_TOKENS", 32000))
+
+# How long a document waits for others to join its batch. A batch is
+# sent earlier once it is full, or once every document in flight is
+# waiting in it.
+LLM_BATCH_WAIT_MS = float(os.getenv("LLM_BATCH_WAIT_MS", 500))
+
+# Documents a batch answered badly are re-sent this many times, alone.
+LLM_BATCH_RETRIES = int(os.getenv("LLM_BATCH_RETRIES", 1))
+
+# Gemini bills an image at 258 tokens per 768x768 tile; a page at the
+# default LLM_IMAGE_MAX_SIDE is about 2x3 tiles.
+IMAGE_PART_TOKENS = 258 * 6
+
+# ============================================================
+# REQUESTS
+# ============================================================
+
+# One document of a batch:
+#   intro   text that follows its "=== DOCUMENT n ===" delimiter
+#   parts   its content (OCR text or page image parts)
+#   schema  {field: None} it must answer with, or None for free-form JSON
+#   single  the complete request used when it is sent on its own
+#   json_schema  Gemini responseSchema of its answer; built from schema
+#           when not given
+BatchItem = namedtuple("BatchItem", "intro parts schema single json_schema",
+                       defaults=(None,))
+
+
+class BatchItemError(GeminiError):
+    """
+    A batched response had no usable answer for this document.
+    """
+
+
+def estimate_tokens(parts):
+    tokens = 0
+    for part in parts:
+        if "text" in part:
+            tokens += len(part["text"]) // 4
+        else:
+            tokens += IMAGE_PART_TOKENS
+    return tokens
+
+
+def item_tokens(item):
+    return estimate_tokens([text_part(item.intro)] + list(item.parts))
+
+
+def delimiter(index):
+    return f"=== DOCUMENT {index} ==="
+
+
+def build_request(header, items):
+    parts = [text_part(header.strip() + "\n")]
+    for index, item in enumerate(items):
+        parts.append(text_part(f"\n{delimiter(index)}\n{item.intro.strip()}\n"))
+        parts.extend(item.parts)
+    keys = ", ".join(f'"{i}"' for i in range(len(items)))
+    parts.append(text_part(
+        f"\nReturn ONE JSON object with exactly the keys {keys}: the document "
+        "numbers above. Each value is the JSON answer for that document alone."
+    ))
+    return parts
+
+
+def string_schema(fields):
+    """
+    responseSchema for a flat object of nullable string fields, every
+    one required and generated in the given order.
+    """
+    fields = list(fields)
+    return {
+        "type": "OBJECT",
+        "properties": {key: {"type": "STRING", "nullable": True} for key in fields},
+        "required": fields,
+        "propertyOrdering": fields,
+    }
+
+
+def item_schema(item):
+    if item.json_schema:
+        return item.json_schema
+    return string_schema(item.schema) if item.schema else None
+
+
+def response_schema(items):
+    """
+    Gemini responseSchema keyed by document index, or None when an item
+    has no fixed schema.
+    """
+    schemas = [item_schema(item) for item in items]
+    if any(schema is None for schema in schemas):
+        return None
+    keys = [str(i) for i in range(len(items))]
+    return {
+        "type": "OBJECT",
+        "properties": dict(zip(keys, schemas)),
+        "required": keys,
+        "propertyOrdering": keys,
+    }
+
+
+def json_config(generation_config, schema):
+    config = dict(generation_config or {})
+    config["responseMimeType"] = "application/json"
+    if schema:
+        config["responseSchema"] = schema
+    return config
+
+
+def generate_json(parts, generation_config=None, keys=None):
+    """
+    Parsed JSON answer of one request, or None when nothing usable came
+    back. With LLM_STREAM the answer is parsed as it streams in and the
+    stream is closed as soon as the top-level keys are all complete.
+    """
+    # Every answer asked for with keys is an object.
+    parser = JsonStreamParser("{" if keys else None)
+
+    if LLM_STREAM:
+        def on_text(chunk):
+            parser.feed(chunk)
+            if keys and parser.has_members(keys):
+                parser.stop()
+                return True
+            return False
+
+        gemini_client.generate_stream(parts, on_text, generation_config)
+    else:
+        parser.feed(gemini_client.generate(parts, generation_config))
+
+    value, _ = parser.result()
+    return value
+
+
+def _usable(item, value):
+    if value is None:
+        return False
+    return isinstance(value, dict) if item.schema is not None else True
+
+# ============================================================
+# SENDING
+# ============================================================
+
+def generate_batch(header, items, generation_config=None):
+    """
+    Send items as one request (or, for a single item, its own request).
+    Returns one entry per item: the parsed JSON answer, or the exception
+    for that item. A failed request fails every item with its error.
+    """
+    if len(items) == 1:
+        item = items[0]
+        try:
+            value = generate_json(item.single,
+                                  json_config(generation_config, item_schema(item)),
+                                  list(item.schema or ()))
+        except GeminiError as e:
+            return [e]
+        return [value if _usable(item, value)
+                else BatchItemError("Unparseable Gemini response")]
+
+    keys = [str(i) for i in range(len(items))]
+    config = json_config(generation_config, response_schema(items))
+
+    metrics.GEMINI_BATCH_SIZE.observe(len(items))
+    try:
+        answer = generate_json(build_request(header, items), config, keys)
+    except GeminiError as e:
+        return [e] * len(items)
+
+    if not isinstance(answer, dict):
+        answer = {}
+    results = []
+    for index, item in enumerate(items):
+        value = answer.get(str(index))
+        results.append(value if _usable(item, value)
+                       else BatchItemError(f"No answer for document {index} of the batch"))
+    return results
+
+
+def chunk_items(items, size=LLM_BATCH_SIZE, max_tokens=LLM_BATCH_MAX_TOKENS):
+    """
+    Split items (in order) into batches of at most size items and,
+    estimated, max_tokens prompt tokens. Yields lists of indexes.
+    """
+    batch, tokens = [], 0
+    for index, item in enumerate(items):
+        cost = item_tokens(item)
+        if batch and (len(batch) >= size or tokens + cost > max_tokens):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(index)
+        tokens += cost
+    if batch:
+        yield batch
+
+
+def _map_batches(send, batches):
+    # Batches go out side by side (the client caps concurrency); each
+    # thread runs in a copy of the caller's context to keep its trace.
+    if len(batches) == 1:
+        return [send(batches[0])]
+    with ThreadPoolExecutor(max_workers=len(batches), thread_name_prefix="llm-batch") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, send, batch)
+                   for batch in batches]
+        return [future.result() for future in futures]
+
+
+def run_batched(header, items, generation_config=None,
+                size=LLM_BATCH_SIZE, max_tokens=LLM_BATCH_MAX_TOKENS):
+    """
+    Answer every item with as few requests as the limits allow. Items a
+    batch failed are retried on their own (LLM_BATCH_RETRIES times); the
+    others are not sent again. Returns one entry per item, as
+    generate_batch() does.
+    """
+    results = [None] * len(items)
+    batches = [list(batch) for batch in chunk_items(items, size, max_tokens)]
+
+    def send(batch):
+        return generate_batch(header, [items[i] for i in batch], generation_config)
+
+    for attempt in range(LLM_BATCH_RETRIES + 1):
+        for batch, values in zip(batches, _map_batches(send, batches)):
+            for index, value in zip(batch, values):
+                results[index] = value
+
+        # Documents that failed inside a shared request are retried, and
+        # unparseable answers; a request error of a document sent alone
+        # was already retried by the client.
+        retry = [i for batch in batches for i in batch
+                 if isinstance(results[i], BatchItemError)
+                 or (len(batch) > 1 and isinstance(results[i], Exception))]
+        if not retry:
+            break
+        metrics.GEMINI_BATCH_RETRIES.inc(len(retry))
+        batches = [[i] for i in retry]
+
+    return results
+
+# ============================================================
+# BATCHER
+# ============================================================
+
+# The Batcher of the document being processed in this context, set by
+# Batcher.document().
+_current = contextvars.ContextVar("llm_batcher", default=None)
+
+
+def current_batcher():
+    return _current.get()
+
+
+class _Entry:
+    def __init__(self, item):
+        self.item = item
+        self.tokens = item_tokens(item)
+        self.deadline = None
+        self.taken = False
+        self.done = False
+        self.result = None
+        self.batch_size = 0
+        self.usage = None  # (gemini counts, stage timings) charged to it
+
+
+class Batcher:
+    """
+    Packs requests made concurrently by different documents (threads)
+    into shared Gemini requests. Only documents registered with the
+    same Batcher share a request: use one per upload or job, never one
+    across unrelated requests.
+
+    submit() blocks until the document's answer is back. The waiting
+    thread that finds the queue ready sends the batch for everyone. The
+    queue is ready when it is full, past its token budget, older than
+    wait_ms, or when every document registered with document() is
+    already waiting - nobody else is coming.
+    """
+
+    def __init__(self, header, generation_config=None, size=LLM_BATCH_SIZE,
+                 max_tokens=LLM_BATCH_MAX_TOKENS, wait_ms=LLM_BATCH_WAIT_MS):
+        self.header = header
+        self.generation_config = generation_config
+        self.size = size
+        self.max_tokens = max_tokens
+        self.wait = wait_ms / 1000
+        self._cond = threading.Condition()
+        self._queue = []
+        self._active = 0
+        self._sending = 0
+
+    @contextlib.contextmanager
+    def document(self):
+        """
+        Mark a document as in the pipeline, so batches wait for it, and
+        make this the current_batcher() of the code inside.
+        """
+        with self._cond:
+            self._active += 1
+        token = _current.set(self)
+        try:
+            yield
+        finally:
+            _current.reset(token)
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def _ready(self):
+        queue = self._queue
+        if not queue:
+            return False
+        return (
+            len(queue) >= self.size
+            or sum(e.tokens for e in queue) >= self.max_tokens
+            or len(queue) + self._sending >= self._active
+            or time.monotonic() >= queue[0].deadline
+        )
+
+    def _take(self):
+        batch, tokens = [], 0
+        while self._queue and len(batch) < self.size:
+            entry = self._queue[0]
+            if batch and tokens + entry.tokens > self.max_tokens:
+                break
+            batch.append(self._queue.pop(0))
+            tokens += entry.tokens
+        for entry in batch:
+            entry.taken = True
+        self._sending += len(batch)
+        return batch
+
+    def _send(self, batch):
+        # The request is traced on its own and its usage split over the
+        # documents by prompt size, instead of all landing on the trace
+        # of whichever thread happens to send it.
+        shared = metrics.Trace("llm_batch")
+        try:
+            with metrics.tracing(shared):
+                results = run_batched(self.header, [e.item for e in batch],
+                                      self.generation_config, self.size, self.max_tokens)
+        except Exception as e:
+            results = [e] * len(batch)
+        usage = shared.to_dict()
+        tokens = sum(e.tokens for e in batch)
+        with self._cond:
+            for entry, result in zip(batch, results):
+                share = entry.tokens / tokens if tokens else 1 / len(batch)
+                entry.usage = (
+                    {key: round(value * share, 3) for key, value in usage["gemini"].items()},
+                    [(event["stage"], event["seconds"] * share) for event in usage["events"]],
+                )
+                entry.result = result
+                entry.batch_size = len(batch)
+                entry.done = True
+            self._sending -= len(batch)
+            self._cond.notify_all()
+
+    def submit(self, item):
+        """
+        The parsed JSON answer for item. Raises the GeminiError the
+        request failed with; an answer that stays unusable after the
+        retries comes back as None.
+        """
+        if self.size <= 1:
+            result = run_batched(self.header, [item], self.generation_config, 1)[0]
+            return self._unwrap(result)
+
+        entry = _Entry(item)
+        with self._cond:
+            entry.deadline = time.monotonic() + self.wait
+            self._queue.append(entry)
+            self._cond.notify_all()
+
+            while not entry.done:
+                if self._ready():
+                    batch = self._take()
+                    self._cond.release()
+                    try:
+                        self._send(batch)
+                    finally:
+                        self._cond.acquire()
+                    continue
+                if entry.taken:
+                    self._cond.wait()
+                else:
+                    self._cond.wait(max(0.0, self._queue[0].deadline - time.monotonic()))
+
+        metrics.note("llm_batch_size", entry.batch_size)
+        trace = metrics.current_trace()
+        if trace is not None:
+            gemini, stages = entry.usage
+            trace.add_gemini(**gemini)
+            for stage, seconds in stages:
+                trace.add_stage(stage, seconds)
+        return self._unwrap(entry.result)
+
+    def _unwrap(self, result):
+        if isinstance(result, BatchItemError):
+            return None
+        if isinstance(result, Exception):
+            raise result
+        return result
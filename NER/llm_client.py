@@ -0,0 +1,471 @@
+import os
+import json
+import time
+import base64
+import random
+import asyncio
+import threading
+
+import httpx
+from dotenv import load_dotenv
+
+import metrics
+from image_payload import encode_image
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+load_dotenv()
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_API_URL = os.getenv("GEMINI_API_URL") or (
+    "https://generativelanguage.googleapis.com/v1beta/models/"
+    f"{GEMINI_MODEL}:generateContent"
+)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 16))
+LLM_RATE_PER_SEC = float(os.getenv("LLM_RATE_PER_SEC", 5))
+LLM_BURST = int(os.getenv("LLM_BURST", 10))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 1.0))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 30.0))
+# Seconds one HTTP attempt may take from sending to the last byte read
+# (httpx's own timeout only bounds each connect/read/write on its own).
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+# Seconds one call may take in all, queueing, retries and backoff included.
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", 300))
+
+# Stream JSON answers (streamGenerateContent) so they are parsed as they
+# arrive and the stream is closed once every expected field is in.
+# GEMINI_STREAM_URL defaults to GEMINI_API_URL with the method swapped;
+# a custom GEMINI_API_URL without ":generateContent" needs it set.
+LLM_STREAM = os.getenv("LLM_STREAM", "1") == "1"
+GEMINI_STREAM_URL = os.getenv("GEMINI_STREAM_URL") or GEMINI_API_URL.replace(
+    ":generateContent", ":streamGenerateContent"
+)
+if LLM_STREAM and GEMINI_STREAM_URL == GEMINI_API_URL:
+    raise ValueError(
+        "GEMINI_API_URL has no \":generateContent\" to derive the streaming "
+        "URL from; set GEMINI_STREAM_URL or LLM_STREAM=0"
+    )
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# ============================================================
+# REQUEST PARTS
+# ============================================================
+
+def text_part(text):
+    return {"text": text}
+
+
+def image_part(data, mime_type="image/png"):
+    if isinstance(data, (bytes, bytearray)):
+        data = base64.b64encode(data).decode("utf-8")
+    return {"inline_data": {"mime_type": mime_type, "data": data}}
+
+
+def payload_part(payload):
+    return image_part(payload.data, payload.mime_type)
+
+
+def pil_image_part(image):
+    # Downsampled and compressed per the LLM_IMAGE_* settings.
+    return payload_part(encode_image(image))
+
+# ============================================================
+# RATE LIMITING
+# ============================================================
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` requests per second on average, with
+    bursts of up to `capacity`. rate <= 0 disables limiting.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = None
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+# ============================================================
+# CLIENT
+# ============================================================
+
+class GeminiError(Exception):
+    pass
+
+
+class GeminiClient:
+    """
+    Shared Gemini REST client.
+
+    Owns one event loop on a background thread and one pooled
+    keep-alive httpx.AsyncClient on it, so every caller - sync Flask
+    handlers, worker threads, other event loops - shares the same
+    connections, concurrency cap and rate limit.
+    """
+
+    def __init__(
+        self,
+        api_url=GEMINI_API_URL,
+        api_key=GEMINI_API_KEY,
+        stream_url=GEMINI_STREAM_URL,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        max_connections=LLM_MAX_CONNECTIONS,
+        rate_per_sec=LLM_RATE_PER_SEC,
+        burst=LLM_BURST,
+        max_retries=LLM_MAX_RETRIES,
+        timeout=LLM_TIMEOUT,
+        deadline=LLM_DEADLINE,
+    ):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.stream_url = stream_url
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.deadline = deadline
+
+        self._bucket = TokenBucket(rate_per_sec, burst)
+        self._loop = None
+        self._http = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+
+    # ---------------- event loop ----------------
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return self._loop
+
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._http = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                    ),
+                )
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                ready.set()
+                loop.run_forever()
+
+            threading.Thread(target=run, name="gemini-client", daemon=True).start()
+            ready.wait()
+            self._loop = loop
+            return loop
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    # ---------------- requests ----------------
+
+    def _payload(self, parts, generation_config):
+        payload = {"contents": [{"parts": parts}]}
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        return payload
+
+    async def _post(self, payload, timeout, trace=None):
+        params = {"key": self.api_key} if self.api_key else None
+        # Serialised once so the bytes on the wire can be counted.
+        body = json.dumps(payload).encode("utf-8")
+        attempt = 0
+
+        while True:
+            await self._bucket.acquire()
+
+            try:
+                async with self._semaphore:
+                    response = await asyncio.wait_for(
+                        self._http.post(
+                            self.api_url,
+                            params=params,
+                            content=body,
+                            headers={"Content-Type": "application/json"},
+                            timeout=timeout or self.timeout,
+                        ),
+                        timeout or self.timeout,
+                    )
+            except (httpx.TimeoutException, httpx.TransportError,
+                    asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise GeminiError(f"Gemini request failed: {e!r}") from e
+                await asyncio.sleep(self._backoff(attempt, None))
+                attempt += 1
+                metrics.GEMINI_RETRIES.inc()
+                if trace is not None:
+                    trace.add_gemini(retries=1)
+                continue
+
+            metrics.GEMINI_BYTES.inc(len(body), direction="sent")
+            metrics.GEMINI_BYTES.inc(len(response.content), direction="received")
+            if trace is not None:
+                trace.add_gemini(bytes_sent=len(body),
+                                 bytes_received=len(response.content))
+
+            if response.status_code == 200:
+                return response.json()
+
+            if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                metrics.GEMINI_RETRIES.inc()
+                if trace is not None:
+                    trace.add_gemini(retries=1)
+                await asyncio.sleep(
+                    self._backoff(attempt, response.headers.get("Retry-After"))
+                )
+                attempt += 1
+                continue
+
+            raise GeminiError(
+                f"Gemini API error {response.status_code}: {response.text[:500]}"
+            )
+
+    def _backoff(self, attempt, retry_after):
+        if retry_after:
+            try:
+                return min(float(retry_after), LLM_BACKOFF_MAX)
+            except ValueError:
+                pass
+        delay = min(LLM_BACKOFF_BASE * (2 ** attempt), LLM_BACKOFF_MAX)
+        return delay * (0.5 + random.random() / 2)
+
+    async def _stream(self, payload, timeout, trace, on_text):
+        """
+        streamGenerateContent over SSE. on_text(chunk) is called with
+        each piece of answer text and returns True to stop reading. A
+        transport error or timeout after text has arrived ends the stream
+        with what came in. Returns (text, usageMetadata, stopped_early).
+        """
+        params = {"alt": "sse"}
+        if self.api_key:
+            params["key"] = self.api_key
+        body = json.dumps(payload).encode("utf-8")
+        attempt = 0
+
+        while True:
+            await self._bucket.acquire()
+            text, usage, received, stopped, error = [], {}, 0, False, None
+            response = None
+
+            async def read():
+                nonlocal usage, received, stopped, error, response
+                async with self._http.stream(
+                    "POST",
+                    self.stream_url,
+                    params=params,
+                    content=body,
+                    headers={"Content-Type": "application/json"},
+                    timeout=timeout or self.timeout,
+                ) as response:
+                    if response.status_code != 200:
+                        error = (await response.aread()).decode("utf-8", "replace")
+                        received = len(error)
+                        return
+                    async for line in response.aiter_lines():
+                        received += len(line) + 1
+                        if not line.startswith("data:"):
+                            continue
+                        chunk = json.loads(line[5:])
+                        usage = chunk.get("usageMetadata") or usage
+                        for candidate in chunk.get("candidates", [])[:1]:
+                            for part in candidate.get("content", {}).get("parts", []):
+                                if part.get("text"):
+                                    text.append(part["text"])
+                                    stopped = on_text(part["text"]) or stopped
+                        if stopped:
+                            return
+
+            try:
+                async with self._semaphore:
+                    await asyncio.wait_for(read(), timeout or self.timeout)
+            except (httpx.TimeoutException, httpx.TransportError,
+                    asyncio.TimeoutError, json.JSONDecodeError) as e:
+                if not text:
+                    if attempt >= self.max_retries:
+                        raise GeminiError(f"Gemini request failed: {e!r}") from e
+                    await asyncio.sleep(self._backoff(attempt, None))
+                    attempt += 1
+                    metrics.GEMINI_RETRIES.inc()
+                    if trace is not None:
+                        trace.add_gemini(retries=1)
+                    continue
+
+            metrics.GEMINI_BYTES.inc(len(body), direction="sent")
+            metrics.GEMINI_BYTES.inc(received, direction="received")
+            if trace is not None:
+                trace.add_gemini(bytes_sent=len(body), bytes_received=received)
+
+            if error is None:
+                return "".join(text), usage, stopped
+
+            if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                metrics.GEMINI_RETRIES.inc()
+                if trace is not None:
+                    trace.add_gemini(retries=1)
+                await asyncio.sleep(
+                    self._backoff(attempt, response.headers.get("Retry-After"))
+                )
+                attempt += 1
+                continue
+
+            raise GeminiError(
+                f"Gemini API error {response.status_code}: {error[:500]}"
+            )
+
+    async def _generate_stream(self, parts, generation_config, timeout, trace, on_text):
+        try:
+            text, usage, stopped = await self._stream(
+                self._payload(parts, generation_config), timeout, trace, on_text
+            )
+        except GeminiError:
+            metrics.GEMINI_REQUESTS.inc(status="error")
+            raise
+        metrics.GEMINI_REQUESTS.inc(status="ok")
+        if stopped:
+            metrics.GEMINI_STREAM_STOPS.inc()
+        self._record_usage(usage, trace)
+        return text
+
+    async def _generate(self, parts, generation_config, timeout, trace=None):
+        try:
+            body = await self._post(
+                self._payload(parts, generation_config), timeout, trace
+            )
+        except GeminiError:
+            metrics.GEMINI_REQUESTS.inc(status="error")
+            raise
+        metrics.GEMINI_REQUESTS.inc(status="ok")
+        self._record_usage(body.get("usageMetadata") or {}, trace)
+
+        candidates = body.get("candidates", [])
+        if not candidates:
+            raise GeminiError(f"Gemini returned no candidates: {body}")
+
+        parts_out = candidates[0].get("content", {}).get("parts", [])
+        return "".join(p.get("text", "") for p in parts_out)
+
+    async def _generate_many(self, requests, generation_config, timeout, trace=None):
+        return await asyncio.gather(
+            *(self._within_deadline(self._generate(parts, generation_config,
+                                                   timeout, trace))
+              for parts in requests),
+            return_exceptions=True,
+        )
+
+    async def _within_deadline(self, coro):
+        """
+        Run one call under the client's total deadline. LLM_TIMEOUT bounds
+        a single attempt; this bounds the queueing, retries and backoff
+        around them.
+        """
+        try:
+            return await asyncio.wait_for(coro, self.deadline)
+        except asyncio.TimeoutError:
+            metrics.GEMINI_REQUESTS.inc(status="error")
+            raise GeminiError(
+                f"Gemini call exceeded its {self.deadline:g}s deadline"
+            ) from None
+
+    def _record_usage(self, usage, trace):
+        tokens = {
+            "prompt": usage.get("promptTokenCount", 0),
+            "candidates": usage.get("candidatesTokenCount", 0),
+            "total": usage.get("totalTokenCount", 0),
+        }
+        for kind, count in tokens.items():
+            if count:
+                metrics.GEMINI_TOKENS.inc(count, kind=kind)
+        if trace is not None:
+            trace.add_gemini(
+                requests=1,
+                **{f"{kind}_tokens": count for kind, count in tokens.items() if count}
+            )
+
+    # ---------------- public API ----------------
+
+    def generate(self, parts, generation_config=None, timeout=None):
+        """
+        Blocking call. Returns the response text or raises GeminiError.
+        """
+        return self._submit(self._within_deadline(
+            self._generate(parts, generation_config, timeout,
+                           metrics.current_trace())
+        )).result()
+
+    def generate_stream(self, parts, on_text, generation_config=None, timeout=None):
+        """
+        Blocking streamed call. on_text(chunk) runs for every piece of
+        text as it arrives and returns True to close the stream early.
+        Returns the text read.
+        """
+        return self._submit(self._within_deadline(
+            self._generate_stream(parts, generation_config, timeout,
+                                  metrics.current_trace(), on_text)
+        )).result()
+
+    def generate_many(self, requests, generation_config=None, timeout=None):
+        """
+        Run several requests concurrently. Returns one entry per request,
+        in order: the response text, or the exception it failed with.
+        """
+        return self._submit(
+            self._generate_many(requests, generation_config, timeout,
+                                metrics.current_trace())
+        ).result()
+
+    async def generate_async(self, parts, generation_config=None, timeout=None):
+        """
+        Awaitable from any event loop; the request itself still runs on
+        the client's own loop and connection pool.
+        """
+        return await asyncio.wrap_future(
+            self._submit(self._within_deadline(
+                self._generate(parts, generation_config, timeout,
+                               metrics.current_trace())
+            ))
+        )
+
+    def close(self):
+        if self._loop is None:
+            return
+        self._submit(self._http.aclose()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+
+gemini_client = GeminiClient()
@@ -0,0 +1,171 @@
+"""
+Offline stand-in for the Gemini generateContent endpoint.
+
+    python llm_stub.py --port 8090
+    GEMINI_API_URL=http://127.0.0.1:8090/v1beta/models/stub:generateContent
+
+Replies are deterministic: prompts that carry a JSON schema ("... exact
+format: {...}") get that schema back with placeholder values, and the
+text_ext classification prompt gets a fixed PAN Card entry. Batched
+prompts ("=== DOCUMENT n ===" sections, see llm_batching.py) get one
+such reply per section, keyed by n. streamGenerateContent?alt=sse
+streams the same reply in small chunks.
+"""
+
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_PAN_ENTRY = [
+    {
+        "document_type": "PAN Card",
+        "named_entities": {
+            "Name": "Stub Name",
+            "Date of Birth": "01/01/1990",
+            "Permanent Account Number": "ABCDE1234F"
+        }
+    }
+]
+
+
+def _prompt_text(body):
+    texts = []
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                texts.append(part["text"])
+    return "\n".join(texts)
+
+
+BATCH_DELIMITER = re.compile(r"^=== DOCUMENT (\d+) ===$", re.MULTILINE)
+
+
+def stub_reply(prompt):
+    sections = BATCH_DELIMITER.split(prompt)
+    if len(sections) > 1:
+        header = sections[0]
+        return json.dumps({
+            index: json.loads(stub_reply(header + body))
+            for index, body in zip(sections[1::2], sections[2::2])
+        })
+
+    if "named_entities" in prompt:
+        return json.dumps(STUB_PAN_ENTRY)
+
+    match = re.search(r"exact format:\s*(\{.*?\n\})", prompt, re.DOTALL)
+    if match:
+        try:
+            schema = json.loads(match.group(1))
+            return json.dumps({k: f"stub_{k}" for k in schema})
+        except json.JSONDecodeError:
+            pass
+
+    return json.dumps({"name": "stub_name"})
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    fail_every = 0
+    _count = 0
+    _count_lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+
+        with self._count_lock:
+            StubHandler._count += 1
+            count = StubHandler._count
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        # Every Nth request is rate-limited, to exercise client retries.
+        if self.fail_every and count % self.fail_every == 0:
+            self._send(429, {"error": {"code": 429, "message": "stub rate limit"}})
+            return
+
+        body = json.loads(raw or b"{}")
+        text = stub_reply(_prompt_text(body))
+
+        if "streamGenerateContent" in self.path:
+            self._stream(text, len(raw))
+            return
+
+        self._send(200, {
+            "candidates": [
+                {"content": {"role": "model", "parts": [{"text": text}]}}
+            ],
+            "usageMetadata": {
+                "promptTokenCount": len(raw) // 4,
+                "candidatesTokenCount": len(text) // 4,
+            }
+        })
+
+    def _stream(self, text, request_bytes, chunk_size=24):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        try:
+            for start in range(0, len(text), chunk_size):
+                chunk = {"candidates": [{"content": {
+                    "role": "model", "parts": [{"text": text[start:start + chunk_size]}]
+                }}]}
+                if start + chunk_size >= len(text):
+                    chunk["usageMetadata"] = {
+                        "promptTokenCount": request_bytes // 4,
+                        "candidatesTokenCount": len(text) // 4,
+                    }
+                self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client stopped reading early
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port=0, latency=0.0, fail_every=0):
+    """
+    Start the stub on a background thread.
+    Returns (server, generateContent URL).
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "latency": latency,
+        "fail_every": fail_every,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    host, bound_port = server.server_address
+    url = f"http://{host}:{bound_port}/v1beta/models/stub:generateContent"
+    return server, url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds to sleep before every reply")
+    parser.add_argument("--fail-every", type=int, default=0,
+                        help="answer every Nth request with HTTP 429")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.port, args.latency, args.fail_every)
+    print(f"Gemini stub listening, set GEMINI_API_URL={url}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,11 +1,29 @@
-from ocr import process_pdf
+import sys
 import json
+import argparse
+
+from ocr import process_pdf
+
+# Run one document through the pipeline and print the result:
+#
+#   python main.py path/to/document.pdf [--document-type "PAN Card"]
+
+parser = argparse.ArgumentParser(description="Extract entities from one PDF")
+parser.add_argument("path", nargs="?", default="test_data/sample2.pdf")
+parser.add_argument("--document-type", default="Driving license")
+parser.add_argument("--confidence-threshold", type=float, default=0.40)
+args = parser.parse_args()
+
+try:
+    f = open(args.path, "rb")
+except FileNotFoundError:
+    sys.exit(f"No such file: {args.path} (generate one with benchmarks/synthetic.py)")
 
-with open("test_data/sample2.pdf", "rb") as f:
+with f:
     result = process_pdf(
         file_stream=f,
-        document_type="Driving license",
-        confidence_threshold=0.40
+        document_type=args.document_type,
+        confidence_threshold=args.confidence_threshold
     )
 
 print(json.dumps(result, indent=2))
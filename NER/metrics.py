@@ -0,0 +1,441 @@
+import time
+import bisect
+import threading
+import contextlib
+import contextvars
+
+# ============================================================
+# METRIC TYPES
+# ============================================================
+#
+# Minimal Prometheus-compatible counters/histograms. Values live in this
+# process only: under gunicorn each worker serves its own /metrics, the
+# same as prometheus_client without its multiprocess mode. OCR pool
+# workers ship their timings back with their results (see collect()).
+
+# Latency buckets in seconds, from a fast deskew up to a slow LLM call.
+SECONDS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+CONFIDENCE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.65, 0.7, 0.75, 0.8, 0.9, 0.95, 1.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """
+    A value read from a callback at scrape time.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, read):
+        super().__init__(name, documentation)
+        self._read = read
+
+    def _samples(self):
+        return [f"{self.name} {_format_value(self._read())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=SECONDS_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[-1] if state else 0
+
+    def _samples(self):
+        lines = []
+        for key, state in sorted(self._values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, state):
+                cumulative += n
+                le = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labelnames, key, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{le} {state[-1]}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(float(state[-2]))}")
+            lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+
+def render():
+    """
+    Every registered metric in the Prometheus text exposition format.
+    """
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ============================================================
+# PIPELINE METRICS
+# ============================================================
+
+STAGE_SECONDS = Histogram(
+    "ner_stage_seconds",
+    "Time spent per pipeline stage (per page for rasterize/deskew/detect).",
+    ["stage"],
+)
+
+DOCUMENT_SECONDS = Histogram(
+    "ner_document_seconds",
+    "End-to-end time per document, by route.",
+    ["route"],
+)
+
+DOCUMENTS = Counter(
+    "ner_documents_total",
+    "Documents processed, by outcome.",
+    ["status"],
+)
+
+ROUTES = Counter(
+    "ner_route_total",
+    "process_pdf routing decisions (template, ocr text, gemini vision, mixed).",
+    ["route"],
+)
+
+PAGE_ROUTES = Counter(
+    "ner_page_route_total",
+    "Pages sent to Gemini as OCR text vs as images (text, vision, empty).",
+    ["route"],
+)
+
+PAGE_SOURCES = Counter(
+    "ner_page_source_total",
+    "Pages read from the embedded text layer vs OCR.",
+    ["source"],
+)
+
+PAGE_CONFIDENCE = Histogram(
+    "ner_page_confidence",
+    "OCR line confidence per page, weighted by CONFIDENCE_WEIGHTING.",
+    buckets=CONFIDENCE_BUCKETS,
+)
+
+DOCUMENT_CONFIDENCE = Histogram(
+    "ner_document_confidence",
+    "Document confidence used for routing.",
+    buckets=CONFIDENCE_BUCKETS,
+)
+
+FIELD_SOURCES = Counter(
+    "ner_field_source_total",
+    "Extracted fields by provenance (rule, template, llm, llm_vision, llm_mixed).",
+    ["source"],
+)
+
+GEMINI_REQUESTS = Counter(
+    "ner_gemini_requests_total",
+    "Gemini generateContent calls, by outcome.",
+    ["status"],
+)
+
+GEMINI_RETRIES = Counter(
+    "ner_gemini_retries_total",
+    "Gemini HTTP attempts retried after a 429/5xx or transport error.",
+)
+
+GEMINI_TOKENS = Counter(
+    "ner_gemini_tokens_total",
+    "Tokens reported by Gemini usageMetadata.",
+    ["kind"],
+)
+
+GEMINI_BYTES = Counter(
+    "ner_gemini_bytes_total",
+    "Request/response body bytes exchanged with Gemini.",
+    ["direction"],
+)
+
+GEMINI_BATCH_SIZE = Histogram(
+    "ner_gemini_batch_size",
+    "Documents packed into one batched Gemini request (see llm_batching.py).",
+    buckets=(2, 3, 4, 6, 8, 12, 16, 32),
+)
+
+GEMINI_BATCH_RETRIES = Counter(
+    "ner_gemini_batch_retries_total",
+    "Documents re-sent alone after their batched request failed them.",
+)
+
+GEMINI_STREAM_STOPS = Counter(
+    "ner_gemini_stream_early_stops_total",
+    "Streamed Gemini responses closed once every expected field was in.",
+)
+
+JSON_PARSE = Counter(
+    "ner_llm_json_parse_total",
+    "LLM JSON answers by parse outcome (ok, repaired, failed).",
+    ["result"],
+)
+
+FIELD_RECALLS = Counter(
+    "ner_gemini_field_recalls_total",
+    "Fields requested again because the first answer missed them.",
+)
+
+PAGE_SHARED_BYTES = Counter(
+    "ner_page_shared_bytes_total",
+    "Page bitmap bytes handed to OCR workers through shared memory.",
+)
+
+DUPLICATE_PAGES = Counter(
+    "ner_duplicate_pages_total",
+    "Pages not OCR'd or sent to Gemini because they looked the same as another: "
+    "document = an earlier page of the same file, index = an identical render of "
+    "a page recently OCR'd for another request (see page_hash.py).",
+    ["match"],
+)
+
+IMAGE_PAYLOADS = Counter(
+    "ner_llm_images_total",
+    "Page images encoded for Gemini vision (see image_payload.py).",
+)
+
+IMAGE_PAYLOAD_BYTES = Counter(
+    "ner_llm_image_bytes_total",
+    "Gemini image bytes: raw = uncompressed RGB bitmap, sent = encoded payload.",
+    ["kind"],
+)
+
+CACHE_LOOKUPS = Counter(
+    "ner_result_cache_lookups_total",
+    "Result cache lookups, by outcome.",
+    ["result"],
+)
+
+
+def _cache_hit_rate():
+    hits = CACHE_LOOKUPS.value(result="memory_hit") + CACHE_LOOKUPS.value(result="disk_hit")
+    lookups = hits + CACHE_LOOKUPS.value(result="miss")
+    return round(hits / lookups, 4) if lookups else 0.0
+
+
+CACHE_HIT_RATE = Gauge(
+    "ner_result_cache_hit_rate",
+    "Share of result cache lookups served from either tier.",
+    _cache_hit_rate,
+)
+
+def record_field_sources(field_sources):
+    for source in field_sources.values():
+        FIELD_SOURCES.inc(source=source)
+
+# ============================================================
+# REQUEST TRACE
+# ============================================================
+
+class Trace:
+    """
+    Structured timeline of one document, returned with ?trace=1 to
+    debug slow documents.
+    """
+
+    def __init__(self, label=None):
+        self.label = label
+        self.started = time.perf_counter()
+        self.events = []  # {"stage", "seconds"[, "page"]}
+        self.notes = {}
+        self.gemini = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage, seconds, page=None):
+        event = {"stage": stage, "seconds": round(seconds, 4)}
+        if page is not None:
+            event["page"] = page
+        with self._lock:
+            self.events.append(event)
+
+    def note(self, key, value):
+        with self._lock:
+            self.notes[key] = value
+
+    def add_gemini(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.gemini[key] = self.gemini.get(key, 0) + value
+
+    def to_dict(self):
+        with self._lock:
+            totals = {}
+            for event in self.events:
+                total = totals.setdefault(event["stage"], {"count": 0, "seconds": 0.0})
+                total["count"] += 1
+                total["seconds"] = round(total["seconds"] + event["seconds"], 4)
+
+            return {
+                "label": self.label,
+                "elapsed_seconds": round(time.perf_counter() - self.started, 4),
+                "stages": totals,
+                "events": list(self.events),
+                "notes": dict(self.notes),
+                "gemini": dict(self.gemini),
+            }
+
+
+_trace = contextvars.ContextVar("ner_trace", default=None)
+_collector = contextvars.ContextVar("ner_stage_collector", default=None)
+
+
+def current_trace():
+    return _trace.get()
+
+
+@contextlib.contextmanager
+def tracing(trace):
+    """
+    Make trace the current trace for this thread/context (None is a no-op).
+    """
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def note(key, value):
+    trace = _trace.get()
+    if trace is not None:
+        trace.note(key, value)
+
+# ============================================================
+# STAGE TIMING
+# ============================================================
+
+def record_stage(stage, seconds, page=None):
+    collected = _collector.get()
+    if collected is not None:
+        collected.append((stage, seconds, page))
+        return
+
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_stage(stage, seconds, page)
+
+
+def record_stages(timings, page_offset=0):
+    """
+    Record timings captured by collect(), e.g. in an OCR pool worker.
+    Page indexes in them are shifted by page_offset.
+    """
+    for stage, seconds, page in timings:
+        record_stage(stage, seconds, None if page is None else page + page_offset)
+
+
+@contextlib.contextmanager
+def stage_timer(stage, page=None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, page)
+
+
+@contextlib.contextmanager
+def collect():
+    """
+    Capture stage timings into a list instead of recording them, so they
+    can be shipped to another process and passed to record_stages().
+    """
+    timings = []
+    token = _collector.set(timings)
+    try:
+        yield timings
+    finally:
+        _collector.reset(token)
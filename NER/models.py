@@ -0,0 +1,133 @@
+import os
+import time
+import threading
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+OCR_LANGUAGES = os.getenv("OCR_LANGUAGES", "en").split(",")
+OCR_GPU = os.getenv("OCR_GPU", "0") == "1"
+
+# When the HTTP servers warm models up:
+#   "background" - on a thread at startup; /ready reports 503 until done
+#   "eager"      - before the app finishes importing
+#   "lazy"       - on the first request that needs them
+NER_WARMUP = os.getenv("NER_WARMUP", "background")
+
+# ============================================================
+# REGISTRY
+# ============================================================
+
+_reader = None
+_reader_lock = threading.Lock()
+
+_ready = threading.Event()
+_status = {"load_seconds": None, "warm_seconds": None, "error": None}
+
+
+def get_reader():
+    """
+    The process-wide easyocr.Reader, built on first use. easyocr (and
+    with it torch) is only imported here.
+    """
+    global _reader
+    if _reader is not None:
+        return _reader
+
+    with _reader_lock:
+        if _reader is None:
+            start = time.perf_counter()
+            import easyocr
+            _reader = easyocr.Reader(OCR_LANGUAGES, gpu=OCR_GPU)
+            _status["load_seconds"] = round(time.perf_counter() - start, 3)
+
+    return _reader
+
+
+def reader_loaded():
+    return _reader is not None
+
+
+def preload(warm=True):
+    """
+    Load the reader now. With warm, also run one tiny inference so the
+    first real page does not pay for lazy kernel setup.
+
+    Use warm=False before forking (gunicorn --preload): the weights are
+    then shared copy-on-write, and no torch thread pool exists yet in the
+    parent to be inherited in a broken state.
+    """
+    reader = get_reader()
+    if warm:
+        import numpy as np
+        reader.readtext(np.full((32, 96), 255, dtype=np.uint8))
+    return reader
+
+# ============================================================
+# READINESS
+# ============================================================
+
+def warm_up():
+    """
+    Make the OCR path ready to serve: warm the pool's worker processes
+    when OCR runs there, else the in-process reader.
+    """
+    from ocr_pool import get_ocr_pool
+
+    start = time.perf_counter()
+    try:
+        pool = get_ocr_pool()
+        if pool.parallel:
+            pool.warm()
+        else:
+            preload()
+        _status["warm_seconds"] = round(time.perf_counter() - start, 3)
+        _ready.set()
+    except Exception as e:
+        _status["error"] = str(e)
+        raise
+
+
+def warm_up_in_background():
+    def run():
+        try:
+            warm_up()
+        except Exception:
+            pass  # reported through status()
+
+    threading.Thread(target=run, name="model-warmup", daemon=True).start()
+
+
+_warmup_started = False
+
+
+def start_warmup():
+    """
+    Apply NER_WARMUP for an HTTP server process (once).
+    """
+    global _warmup_started
+    if _warmup_started:
+        return
+    _warmup_started = True
+
+    if NER_WARMUP == "eager":
+        warm_up()
+    elif NER_WARMUP == "background":
+        warm_up_in_background()
+    else:
+        # Lazy: accept traffic now, the first request pays for loading.
+        _ready.set()
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def status():
+    return {
+        "ready": is_ready(),
+        "warmup": NER_WARMUP,
+        "reader_loaded": reader_loaded(),
+        **_status,
+    }
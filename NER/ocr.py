@@ -1,27 +1,31 @@
 import os
 import json
-import re
+import math
 import fitz  # PyMuPDF
-import cv2
 import numpy as np
-import tempfile
-from PIL import Image
-import easyocr
+from io import BytesIO
 from dotenv import load_dotenv
-import google.generativeai as genai
+
+import metrics
+from models import get_reader
+
+from ocr_pool import get_ocr_pool
+from templates import has_template, read_card_fields
+from rule_extract import extract_fields
+from deskew import deskew_pil_image, deskew_to_gray  # noqa: F401
+from llm_client import text_part, pil_image_part, payload_part
+from image_payload import Payload, iter_pdf_payloads
+import page_buffer
+import page_hash
+from page_hash import page_index
+from llm_batching import BatchItem, Batcher, current_batcher
 
 # ============================================================
-# ENV + GEMINI SETUP
+# ENV
 # ============================================================
 
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-
-gemini_model = genai.GenerativeModel(
-    model_name="models/gemini-2.5-flash"
-)
-
 # ============================================================
 # ENTITY SCHEMAS
 # ============================================================
@@ -32,69 +36,155 @@ ENTITY_SCHEMAS = {
         "father_name": None,
         "pan_number": None,
         "date_of_birth": None
+    },
+    "Aadhaar Card": {
+        "name": None,
+        "aadhaar_number": None,
+        "date_of_birth": None,
+        "gender": None
+    },
+    "Driving License": {
+        "name": None,
+        "license_number": None,
+        "date_of_birth": None,
+        "issue_date": None,
+        "expiry_date": None,
+        "blood_group": None
+    },
+    "Passport": {
+        "name": None,
+        "passport_number": None,
+        "date_of_birth": None,
+        "gender": None,
+        "nationality": None,
+        "place_of_issue": None,
+        "expiry_date": None
+    },
+    "Credit Card": {
+        "name": None,
+        "card_number": None,
+        "expiry_date": None,
+        "bank_name": None
+    },
+    "Cheque": {
+        "name": None,
+        "account_number": None,
+        "bank_name": None,
+        "ifsc_code": None,
+        "cheque_number": None,
+        "amount": None
     }
 }
 
 # ============================================================
-# EASY OCR
+# FIELD TEMPLATES
 # ============================================================
 
-reader = easyocr.Reader(["en"], gpu=False)
+# Fixed-layout cards (templates.py) are first read field by field from
+# page 1; the full-page pipeline only runs when the card cannot be
+# aligned or a field is missing. Off by default: the regions are
+# calibrated on the synthetic cards only (benchmarks/synthetic.py) and
+# need recalibrating against real scans before they are trusted.
+TEMPLATE_OCR = os.getenv("TEMPLATE_OCR", "0") == "1"
 
 # ============================================================
-# PDF → IMAGES
+# RENDER DPI
 # ============================================================
 
-def pdf_to_images(file_stream, dpi=300):
-    images = []
+DEFAULT_DPI = 300
 
-    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-        tmp.write(file_stream.read())
-        pdf_path = tmp.name
+# Adaptive mode: OCR every page at ADAPTIVE_LOW_DPI first and re-render
+# only the pages whose page_confidence is below ADAPTIVE_DPI_THRESHOLD.
+ADAPTIVE_DPI = os.getenv("ADAPTIVE_DPI", "0") == "1"
+ADAPTIVE_LOW_DPI = int(os.getenv("ADAPTIVE_LOW_DPI", 150))
+ADAPTIVE_HIGH_DPI = int(os.getenv("ADAPTIVE_HIGH_DPI", DEFAULT_DPI))
+ADAPTIVE_DPI_THRESHOLD = float(os.getenv("ADAPTIVE_DPI_THRESHOLD", 0.75))
 
-    pdf = fitz.open(pdf_path)
+# ============================================================
+# NATIVE TEXT
+# ============================================================
+
+# Born-digital pages with at least this much embedded text skip
+# rasterization and OCR entirely.
+NATIVE_TEXT = os.getenv("NATIVE_TEXT", "1") == "1"
+NATIVE_TEXT_MIN_CHARS = int(os.getenv("NATIVE_TEXT_MIN_CHARS", 50))
+
+# ============================================================
+# CONFIDENCE AND PAGE ROUTING
+# ============================================================
+
+# How lines and pages are weighted in page/document confidence:
+# chars (text length), lines (line count) or mean (plain average).
+CONFIDENCE_WEIGHTING = os.getenv("CONFIDENCE_WEIGHTING", "chars")
 
-    for page in pdf:
-        pix = page.get_pixmap(dpi=dpi)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        images.append(img)
+# Route each page on its own confidence: pages at or above the threshold
+# go to Gemini as OCR text, only the others as images. 0 = route the
+# whole document on its document confidence.
+PAGE_ROUTING = os.getenv("PAGE_ROUTING", "1") == "1"
 
-    pdf.close()
-    os.remove(pdf_path)
-    return images
+# A page OCR found no text on still goes to Gemini as an image (it may
+# hold a photo, a signature or handwriting) unless its render is blank:
+# under BLANK_INK_RATIO of its pixels, at BLANK_CHECK_DPI, darker than
+# the paper by BLANK_INK_CONTRAST grey levels.
+BLANK_CHECK_DPI = 72
+BLANK_INK_CONTRAST = 64
+BLANK_INK_RATIO = 0.00005
 
 # ============================================================
-# DESKEW (SAFE)
+# EASY OCR
 # ============================================================
 
-def deskew_pil_image(pil_img):
-    img = np.array(pil_img)
-    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+# The reader is built lazily, once per process, by models.get_reader();
+# importing this module no longer loads torch or the OCR weights.
 
-    _, thresh = cv2.threshold(
-        gray, 0, 255,
-        cv2.THRESH_BINARY + cv2.THRESH_OTSU
-    )
+# Text crops per recogniser forward pass. EasyOCR's own readtext runs the
+# recogniser one crop at a time on CPU whatever batch_size it is given;
+# above 1 we gather crops ourselves (see run_easyocr_batched).
+OCR_RECOGNIZE_BATCH = int(os.getenv("OCR_RECOGNIZE_BATCH", 16))
 
-    coords = np.column_stack(np.where(thresh > 0))
-    if len(coords) < 100:
-        return img
+# ============================================================
+# PDF → IMAGES
+# ============================================================
+
+def open_pdf(file_stream):
+    # Opened straight from the uploaded bytes - no temp-file round trip.
+    return fitz.open(stream=file_stream.read(), filetype="pdf")
 
-    angle = cv2.minAreaRect(coords)[-1]
-    if angle < -45:
-        angle = 90 + angle
+def render_page(pdf, index, dpi=DEFAULT_DPI, gray=True):
+    """
+    page_buffer.PageBuffer of one page: the pixmap's own memory viewed as
+    a NumPy array, grayscale unless gray=False.
+    """
+    with metrics.stage_timer("rasterize", page=index + 1):
+        return page_buffer.render(pdf[index], dpi, gray)
 
-    if abs(angle) > 10 or abs(angle) < 0.5:
-        return img
+def iter_pdf_images(pdf, dpi=DEFAULT_DPI, gray=True):
+    """
+    Render an open PDF one page at a time. Only the page being rendered
+    is held here; callers decide how many to keep alive.
+    """
+    for index in range(pdf.page_count):
+        yield render_page(pdf, index, dpi, gray)
 
-    h, w = img.shape[:2]
-    M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
+def native_page_lines(page):
+    """
+    Lines of the page's embedded text layer at full confidence, or None
+    when the page does not carry enough text to skip OCR.
+    """
+    with metrics.stage_timer("native_text", page=page.number + 1):
+        text = page.get_text("text")
+    if len(text.strip()) < NATIVE_TEXT_MIN_CHARS:
+        return None
 
-    return cv2.warpAffine(
-        img, M, (w, h),
-        flags=cv2.INTER_CUBIC,
-        borderMode=cv2.BORDER_REPLICATE
-    )
+    return [
+        {"text": line.strip(), "confidence": 1.0}
+        for line in text.splitlines()
+        if line.strip()
+    ]
+
+def pdf_to_images(file_stream, dpi=DEFAULT_DPI, gray=True):
+    with open_pdf(file_stream) as pdf:
+        return list(iter_pdf_images(pdf, dpi, gray))
 
 def ensure_name_field(entities: dict):
     """
@@ -123,68 +213,416 @@ def ensure_name_field(entities: dict):
 # PREPROCESS
 # ============================================================
 
-def preprocess_image(pil_img):
-    deskewed = deskew_pil_image(pil_img)
-    return cv2.cvtColor(deskewed, cv2.COLOR_RGB2GRAY)
+def preprocess_image(image):
+    """
+    Grayscale + deskew of a PageBuffer, array or PIL image. A page
+    rendered in grayscale that needs no rotation is returned without
+    being copied.
+    """
+    return deskew_to_gray(image)
 
 # ============================================================
 # OCR WITH CONFIDENCE
 # ============================================================
 
-def run_easyocr(image_np):
-    results = reader.readtext(image_np, detail=1, paragraph=False)
+def format_ocr_lines(results):
     return [
         {"text": t.strip(), "confidence": round(float(c), 3)}
         for _, t, c in results
     ]
 
+def run_easyocr(image_np):
+    # readtext() split into its two halves so each can be timed.
+    reader = get_reader()
+    with metrics.stage_timer("detect"):
+        horizontal, free = reader.detect(image_np)
+    with metrics.stage_timer("recognize"):
+        results = reader.recognize(image_np, horizontal[0], free[0],
+                                   detail=1, paragraph=False)
+    return format_ocr_lines(results)
+
+def run_easyocr_batched(images_np, batch_size=OCR_RECOGNIZE_BATCH):
+    """
+    Detect text boxes on every page, then recognise the crops of all
+    pages together in batches of batch_size. Crops are cut exactly as
+    readtext cuts them and bucketed by width to keep padding small.
+    Returns one list of lines per page, in readtext's line order.
+    """
+    # EasyOCR internals; imported here to keep torch out of module import.
+    from easyocr.easyocr import imgH as RECOGNIZER_HEIGHT
+    from easyocr.utils import get_image_list
+    from easyocr.recognition import get_text
+
+    reader = get_reader()
+    crops = []  # (page index, (box, crop image))
+
+    for page_index, img in enumerate(images_np):
+        with metrics.stage_timer("detect"):
+            horizontal, free = reader.detect(img)
+        for box in horizontal[0]:
+            image_list, _ = get_image_list([box], [], img, model_height=RECOGNIZER_HEIGHT)
+            crops.extend((page_index, item) for item in image_list)
+        for box in free[0]:
+            image_list, _ = get_image_list([], [box], img, model_height=RECOGNIZER_HEIGHT)
+            crops.extend((page_index, item) for item in image_list)
+
+    ignore_char = "".join(set(reader.character) - set(reader.lang_char))
+    recognized = [None] * len(crops)
+    by_width = sorted(range(len(crops)), key=lambda i: crops[i][1][1].shape[1])
+
+    # One "recognize" stage for the crops of every page in the batch.
+    with metrics.stage_timer("recognize"):
+        for start in range(0, len(by_width), batch_size):
+            chunk = by_width[start:start + batch_size]
+            widest = max(crops[i][1][1].shape[1] for i in chunk)
+            results = get_text(
+                reader.character, RECOGNIZER_HEIGHT,
+                math.ceil(widest / RECOGNIZER_HEIGHT) * RECOGNIZER_HEIGHT,
+                reader.recognizer, reader.converter,
+                [crops[i][1] for i in chunk],
+                ignore_char, batch_size=len(chunk), workers=0, device=reader.device
+            )
+            for i, result in zip(chunk, results):
+                recognized[i] = result
+
+    pages = [[] for _ in images_np]
+    for (page_index, _), result in zip(crops, recognized):
+        pages[page_index].append(result)
+
+    return [format_ocr_lines(results) for results in pages]
+
+def run_easyocr_pages(images_np):
+    if OCR_RECOGNIZE_BATCH > 1:
+        return run_easyocr_batched(images_np)
+    return [run_easyocr(img) for img in images_np]
+
 # ============================================================
 # CONFIDENCE
 # ============================================================
 
+def line_weight(line):
+    # A misread two-letter fragment should not count as much as a full
+    # line of text.
+    if CONFIDENCE_WEIGHTING == "chars":
+        return len(line["text"].strip())
+    return 1
+
+def page_weight(page):
+    if CONFIDENCE_WEIGHTING == "mean":
+        return 1 if page["page_confidence"] > 0 else 0
+    return sum(line_weight(line) for line in page["content"])
+
 def compute_page_confidence(lines):
-    return round(sum(l["confidence"] for l in lines) / len(lines), 3) if lines else 0.0
+    total = sum(line_weight(l) for l in lines)
+    if not total:
+        return 0.0
+    return round(sum(l["confidence"] * line_weight(l) for l in lines) / total, 3)
 
 def compute_document_confidence(pages):
-    vals = [p["page_confidence"] for p in pages if p["page_confidence"] > 0]
-    return round(sum(vals) / len(vals), 3) if vals else 0.0
+    weights = [page_weight(p) for p in pages]
+    total = sum(weights)
+    if not total:
+        return 0.0
+    return round(sum(p["page_confidence"] * w for p, w in zip(pages, weights)) / total, 3)
+
+def is_blank_page(image):
+    """
+    True when a rendered page carries (next to) no ink.
+    """
+    gray = page_buffer.as_array(image)
+    paper = np.median(gray)
+    ink = np.count_nonzero(gray < paper - BLANK_INK_CONTRAST)
+    return ink < BLANK_INK_RATIO * gray.size
+
+def blank_pages(data, indexes):
+    """
+    The pages among indexes (0-based) of the PDF in data that render
+    blank.
+    """
+    if not indexes:
+        return set()
+    with open_pdf(BytesIO(data)) as pdf:
+        return {
+            index for index in indexes
+            if is_blank_page(render_page(pdf, index, BLANK_CHECK_DPI))
+        }
+
+def route_pages(pages, threshold, blank=()):
+    """
+    "text" or "vision" per page: OCR text is trusted on pages at or above
+    threshold; pages with less confidence or no text go as images. Only
+    pages in blank (0-based indexes of pages that render blank, see
+    blank_pages) are "empty" and not sent - unless every page is, when
+    every page goes as an image.
+    """
+    if len(blank) == len(pages):
+        return ["vision"] * len(pages)
+    return [
+        "empty" if index in blank
+        else "text" if page["content"] and page["page_confidence"] >= threshold
+        else "vision"
+        for index, page in enumerate(pages)
+    ]
 
 # ============================================================
 # OCR PIPELINE
 # ============================================================
 
-def process_pdf_with_easyocr(file_stream):
-    pages = pdf_to_images(file_stream)
-    output = []
-
-    for i, img in enumerate(pages, start=1):
-        processed = preprocess_image(img)
-        lines = run_easyocr(processed)
-        output.append({
-            "page": i,
-            "page_confidence": compute_page_confidence(lines),
-            "content": lines
+def process_pdf_with_easyocr(file_stream, on_page=None, keep_images=True,
+                             adaptive_dpi=None, native_text=None, dedupe_pages=None):
+    """
+    Pages are rendered lazily and fed to the OCR pool as they come out of
+    the rasterizer, so at most OCR_MAX_INFLIGHT bitmaps are alive at once
+    unless keep_images asks for all of them back (as grayscale
+    page_buffer.PageBuffer objects).
+
+    With native_text (default: NATIVE_TEXT) pages that carry an embedded
+    text layer are read with page.get_text and never rasterized; each
+    page reports its "source" ("native_text" or "ocr").
+
+    With adaptive_dpi (default: ADAPTIVE_DPI) the first pass renders at
+    ADAPTIVE_LOW_DPI and only pages below ADAPTIVE_DPI_THRESHOLD are
+    re-rendered and re-OCR'd at ADAPTIVE_HIGH_DPI. Each page reports the
+    "dpi" its content came from (None for native text).
+
+    With dedupe_pages (default: page_hash.PAGE_HASH) a page that looks
+    the same as an earlier page of the PDF, or renders exactly like a
+    page recently OCR'd for another request (page_hash.page_index), is
+    not OCR'd: it takes that page's lines and reports it in
+    "duplicate_of" (its page number, or "index").
+
+    on_page(pages_done, total_pages) is called as each page finishes.
+    """
+    if adaptive_dpi is None:
+        adaptive_dpi = ADAPTIVE_DPI
+    if native_text is None:
+        native_text = NATIVE_TEXT
+    if dedupe_pages is None:
+        dedupe_pages = page_hash.PAGE_HASH
+
+    first_dpi = ADAPTIVE_LOW_DPI if adaptive_dpi else DEFAULT_DPI
+    pool = get_ocr_pool()
+
+    with open_pdf(file_stream) as pdf:
+        total_pages = pdf.page_count
+        output = [None] * total_pages
+        images = [None] * total_pages if keep_images else None
+        ocr_indexes = []
+        seen = []      # (signature, future, index) of pages OCR'd here
+        claims = {}    # index -> future this document publishes
+        copies = {}    # index -> (future, duplicate_of) of skipped pages
+        done = 0
+
+        def finish(index, lines, source, dpi, duplicate_of=None):
+            nonlocal done
+            output[index] = {
+                "page": index + 1,
+                "page_confidence": compute_page_confidence(lines),
+                "source": source,
+                "dpi": dpi,
+                "duplicate_of": duplicate_of,
+                "content": lines
+            }
+            done += 1
+            if on_page:
+                on_page(done, total_pages)
+
+        def pages():
+            for index in range(total_pages):
+                lines = native_page_lines(pdf[index]) if native_text else None
+
+                if lines is not None:
+                    if keep_images:
+                        images[index] = render_page(pdf, index, first_dpi)
+                    finish(index, lines, "native_text", None)
+                    continue
+
+                img = render_page(pdf, index, first_dpi)
+                if keep_images:
+                    images[index] = img
+                if dedupe_pages and match_page(index, img):
+                    continue
+                ocr_indexes.append(index)
+                yield img
+
+        def match_page(index, img):
+            with metrics.stage_timer("page_hash", page=index + 1):
+                sig = page_hash.signature(img)
+                for other, future, other_index in seen:
+                    if page_hash.near_identical(sig, other):
+                        copies[index] = (future, other_index + 1)
+                        return True
+                owner, future = page_index.claim(sig.digest)
+            if not owner:
+                copies[index] = (future, "index")
+                return True
+            seen.append((sig, future, index))
+            claims[index] = future
+            return False
+
+        try:
+            # Results come back from the pool in the order pages were fed in;
+            # ocr_indexes is always filled ahead of them by the generator.
+            batch = pool.document_batch(total_pages)
+            for n, lines in enumerate(pool.map_pages(pages(), batch)):
+                finish(ocr_indexes[n], lines, "ocr", first_dpi)
+
+            if adaptive_dpi and ADAPTIVE_HIGH_DPI > first_dpi:
+                retry = [
+                    index for index in ocr_indexes
+                    if output[index]["page_confidence"] < ADAPTIVE_DPI_THRESHOLD
+                ]
+                rendered = {}
+
+                def retry_pages():
+                    for index in retry:
+                        img = render_page(pdf, index, ADAPTIVE_HIGH_DPI)
+                        if keep_images:
+                            rendered[index] = img
+                        yield img
+
+                retried = pool.map_pages(retry_pages(), pool.document_batch(len(retry)))
+                for index, lines in zip(retry, retried):
+                    confidence = compute_page_confidence(lines)
+                    # Keep whichever pass read the page better.
+                    if confidence >= output[index]["page_confidence"]:
+                        output[index].update({
+                            "page_confidence": confidence,
+                            "dpi": ADAPTIVE_HIGH_DPI,
+                            "content": lines
+                        })
+                        if keep_images:
+                            images[index] = rendered[index]
+                    rendered.pop(index, None)
+
+            # Publish before waiting on other requests' pages, so two
+            # requests waiting on each other's pages never block.
+            for index, future in claims.items():
+                page = output[index]
+                page_index.publish(future, {"content": page["content"], "dpi": page["dpi"]})
+            for index, (future, duplicate_of) in copies.items():
+                reuse_page(pdf, index, future, duplicate_of, first_dpi, finish)
+        finally:
+            for future in claims.values():
+                page_index.abandon(future)
+
+    if copies:
+        metrics.note("duplicate_pages", {
+            index + 1: output[index]["duplicate_of"] for index in copies
         })
 
-    return output, pages  # return images also
+    return output, images  # return images also
+
+def reuse_page(pdf, index, future, duplicate_of, dpi, finish):
+    """
+    Finish a skipped page with the lines of the page it matched, or OCR
+    it after all when that page failed or does not come in time.
+    """
+    try:
+        matched = future.result(timeout=page_hash.PAGE_HASH_WAIT_SECONDS)
+    except TimeoutError:
+        matched = None
+
+    if matched is None:
+        lines = next(iter(get_ocr_pool().map_pages([render_page(pdf, index, dpi)])))
+        finish(index, lines, "ocr", dpi)
+        return
+
+    metrics.DUPLICATE_PAGES.inc(match="index" if duplicate_of == "index" else "document")
+    finish(index, [dict(line) for line in matched["content"]], "ocr",
+           matched["dpi"], duplicate_of)
 
 # ============================================================
-# JSON SAFETY
+# GEMINI — BATCHING
 # ============================================================
+#
+# Concurrent documents of one upload share Gemini requests: each one
+# becomes a "=== DOCUMENT n ===" section under this header, and the
+# answer is keyed by n. See llm_batching.py.
 
-def safe_json_parse(text):
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        match = re.search(r"\{.*\}", text, re.DOTALL)
-        return json.loads(match.group()) if match else {}
+BATCH_HEADER = """
+You are extracting structured data from several official documents at once.
+Each document starts with a line "=== DOCUMENT <n> ===", followed by its
+document type, the JSON format to fill and its OCR text or page images.
+
+IMPORTANT RULES (for every document):
+- If the document contains fields like:
+  "Student Name", "Candidate Name", "Applicant Name",
+  "Name of the Student", "Name of Candidate"
+  → they MUST be mapped to the field "name".
+- If no name is found, return "name" as an empty string.
+- Do NOT create new keys.
+- Read each document on its own; never copy values between documents.
+- Do NOT return explanations.
+"""
+
+def new_entity_batcher():
+    """
+    Batcher for the documents of one upload (or job); run each document
+    inside its document() so their Gemini requests are packed together.
+    """
+    return Batcher(BATCH_HEADER, generation_config={"temperature": 0.0})
+
+
+def submit_entities(item):
+    """
+    The Gemini answer for item, packed with the other documents of its
+    upload; a document processed outside Batcher.document() is sent on
+    its own.
+    """
+    return (current_batcher() or new_entity_batcher()).submit(item)
+
+
+def batch_intro(document_type, schema, content_label):
+    return f"""Document type: {document_type}
+
+Return STRICT JSON in this exact format:
+{json.dumps(schema, indent=2)}
+
+{content_label}"""
+
+# ============================================================
+# GEMINI — ANSWERS
+# ============================================================
+#
+# Answers come back schema-constrained (responseSchema) and are parsed
+# by json_stream.py; fields a partial answer lacks are asked for again.
+
+def valid_entities(answer):
+    """
+    The answer's fields that hold a plain value; anything else (a nested
+    object, a list) counts as a failed field.
+    """
+    if not isinstance(answer, dict):
+        return {}
+    return {
+        key: value for key, value in answer.items()
+        if value is None or isinstance(value, (str, int, float))
+    }
+
+
+def failed_fields(entities, schema):
+    return [key for key in schema if key not in entities]
+
+
+def recall_fields(missing):
+    metrics.FIELD_RECALLS.inc(len(missing))
+    metrics.note("recalled_fields", missing)
+    return missing
 
 # ============================================================
 # GEMINI — OCR TEXT PATH (HIGH CONF)
 # ============================================================
 
-def extract_entities_from_text(ocr_text, document_type):
+def extract_entities_from_text(ocr_text, document_type, fields=None, recall=True):
+    """
+    fields narrows the requested schema to those keys (the ones the
+    rule extractor could not fill). Fields a partial answer missed are
+    asked for once more (recall), alone.
+    """
     schema = ENTITY_SCHEMAS.get(document_type, {})
+    if fields is not None:
+        schema = {key: None for key in fields}
 
     prompt = f"""
 You are extracting structured data from an official document.
@@ -208,19 +646,66 @@ TEXT:
 {ocr_text}
 """
 
-    response = gemini_model.generate_content(
-        prompt,
-        generation_config={"temperature": 0.0}
+    item = BatchItem(
+        intro=batch_intro(document_type, schema, "TEXT:"),
+        parts=[text_part(ocr_text)],
+        schema=schema or None,
+        single=[text_part(prompt)],
     )
+    with metrics.stage_timer("gemini_text"):
+        entities = valid_entities(submit_entities(item))
+
+    missing = failed_fields(entities, schema)
+    if recall and entities and missing:
+        entities.update(extract_entities_from_text(
+            ocr_text, document_type, fields=recall_fields(missing), recall=False
+        ))
+    return entities
 
-    return safe_json_parse(response.text)
+# ============================================================
+# RULES FIRST, GEMINI FOR THE REST (HIGH CONF)
+# ============================================================
+
+def extract_entities_from_lines(lines, document_type):
+    """
+    Fill the schema from OCR lines with the deterministic rules
+    (rule_extract.py) and ask Gemini only for the fields they left
+    empty. Returns (entities, field_sources) where each field's source
+    is "rule" or "llm".
+    """
+    schema = ENTITY_SCHEMAS.get(document_type, {})
+    found = extract_fields(lines, document_type, schema)
+
+    entities = {key: value for key, (value, _) in found.items()}
+    field_sources = {key: "rule" for key in found}
+
+    missing = [key for key in schema if key not in found]
+    if missing or not schema:
+        text = "\n".join(line["text"] for line in lines)
+        llm_entities = extract_entities_from_text(
+            text, document_type, fields=missing if schema else None
+        )
+        if isinstance(llm_entities, dict):
+            for key, value in llm_entities.items():
+                if key not in entities:
+                    entities[key] = value
+                    field_sources[key] = "llm"
+
+    metrics.note("field_sources", field_sources)
+    return entities, field_sources
 
 # ============================================================
 # GEMINI — FULL DOCUMENT (VISION) PATH (LOW CONF)
 # ============================================================
 
-def extract_entities_from_images(page_images, document_type):
+def extract_entities_from_images(page_images, document_type, fields=None, recall=True):
+    """
+    page_images are PIL images or already encoded image_payload Payloads.
+    fields and recall work as in extract_entities_from_text().
+    """
     schema = ENTITY_SCHEMAS.get(document_type, {})
+    if fields is not None:
+        schema = {key: None for key in fields}
 
     prompt = f"""
 You are given scanned official document images.
@@ -241,40 +726,250 @@ Return STRICT JSON in this exact format:
 {json.dumps(schema, indent=2)}
 """
 
-    contents = [prompt] + page_images
-
-    response = gemini_model.generate_content(
-        contents,
-        generation_config={"temperature": 0.0}
+    with metrics.stage_timer("image_encode"):
+        images = [
+            payload_part(img) if isinstance(img, Payload) else pil_image_part(img)
+            for img in page_images
+        ]
+
+    item = BatchItem(
+        intro=batch_intro(document_type, schema, "Scanned page images:"),
+        parts=images,
+        schema=schema or None,
+        single=[text_part(prompt)] + images,
     )
+    with metrics.stage_timer("gemini_vision"):
+        entities = valid_entities(submit_entities(item))
+
+    missing = failed_fields(entities, schema)
+    if recall and entities and missing:
+        entities.update(extract_entities_from_images(
+            page_images, document_type, fields=recall_fields(missing), recall=False
+        ))
+    return entities
+
+# ============================================================
+# GEMINI — MIXED TEXT + IMAGES (PER-PAGE ROUTING)
+# ============================================================
+
+def extract_entities_from_mixed(text_pages, page_images, document_type,
+                                fields=None, recall=True):
+    """
+    One multimodal request for a document read partly by OCR:
+    text_pages is [(page number, OCR text)] of the pages OCR read well,
+    page_images [(page number, image or Payload)] of the others.
+    fields and recall work as in extract_entities_from_text().
+    """
+    schema = ENTITY_SCHEMAS.get(document_type, {})
+    if fields is not None:
+        schema = {key: None for key in fields}
 
-    return safe_json_parse(response.text)
+    prompt = f"""
+You are extracting structured data from an official document. Some of
+its pages are given as OCR text, the pages OCR could not read reliably
+as scanned images. Use both.
+
+IMPORTANT RULES:
+- If the document contains fields like:
+  "Student Name", "Candidate Name", "Applicant Name",
+  "Name of the Student", "Name of Candidate"
+  → they MUST be mapped to the field "name".
+- If no name is found, return "name" as an empty string.
+- Prefer what the page images show over OCR text of the same field.
+- Do NOT create new keys.
+- Do NOT return explanations.
+
+Document type: {document_type}
+
+Return STRICT JSON in this exact format:
+{json.dumps(schema, indent=2)}
+"""
+
+    with metrics.stage_timer("image_encode"):
+        content = []
+        for number, text in text_pages:
+            content.append(text_part(f"\n--- Page {number} (OCR text) ---\n{text}\n"))
+        for number, img in page_images:
+            content.append(text_part(f"\n--- Page {number} (image) ---\n"))
+            content.append(payload_part(img) if isinstance(img, Payload) else pil_image_part(img))
+
+    item = BatchItem(
+        intro=batch_intro(document_type, schema, "OCR text and page images:"),
+        parts=content,
+        schema=schema or None,
+        single=[text_part(prompt)] + content,
+    )
+    with metrics.stage_timer("gemini_mixed"):
+        entities = valid_entities(submit_entities(item))
+
+    missing = failed_fields(entities, schema)
+    if recall and entities and missing:
+        entities.update(extract_entities_from_mixed(
+            text_pages, page_images, document_type,
+            fields=recall_fields(missing), recall=False
+        ))
+    return entities
 
 # ============================================================
 # FINAL ROUTER
 # ============================================================
 
-def process_pdf(file_stream, document_type, confidence_threshold=0.65):
-    ocr_pages, page_images = process_pdf_with_easyocr(file_stream)
-    doc_conf = compute_document_confidence(ocr_pages)
+def record_page_metrics(ocr_pages, doc_conf):
+    for page in ocr_pages:
+        metrics.PAGE_SOURCES.inc(source=page["source"])
+        if page["source"] == "ocr":
+            metrics.PAGE_CONFIDENCE.observe(page["page_confidence"])
+    metrics.DOCUMENT_CONFIDENCE.observe(doc_conf)
+    metrics.note("document_confidence", doc_conf)
+    metrics.note("page_confidence", [page["page_confidence"] for page in ocr_pages])
+
+def process_pdf_with_template(data, document_type):
+    """
+    Region-of-interest pass over page 1 of a fixed-layout card. Returns
+    a process_pdf result, or None when the full pipeline must run.
+    """
+    schema = ENTITY_SCHEMAS.get(document_type)
+    if not schema or not has_template(document_type):
+        return None
+
+    with open_pdf(BytesIO(data)) as pdf:
+        if pdf.page_count == 0:
+            return None
+        # Born-digital first pages are cheaper through the text layer.
+        if NATIVE_TEXT and native_page_lines(pdf[0]) is not None:
+            return None
+        img = render_page(pdf, 0, DEFAULT_DPI)
+        page_count = pdf.page_count
+
+    read = get_ocr_pool().call(read_card_fields, img, document_type)
+    if read is None:
+        metrics.note("template", "not_aligned")
+        return None
+
+    missing = [key for key in schema if not read["fields"].get(key)]
+    if missing:
+        metrics.note("template", {"missing": missing})
+        return None
+
+    metrics.note("template", "complete")
+    metrics.record_field_sources({key: "template" for key in schema})
+    confidence = [read["confidence"][key] for key in schema]
+    doc_conf = round(sum(confidence) / len(confidence), 3)
 
-    if doc_conf >= confidence_threshold:
-        text = "\n".join(
-            line["text"]
-            for page in ocr_pages
-            for line in page["content"]
+    return {
+        "source": "template",
+        "document_type": document_type,
+        "document_confidence": doc_conf,
+        "page_sources": ["template"] + [None] * (page_count - 1),
+        "page_dpi": [DEFAULT_DPI] + [None] * (page_count - 1),
+        "page_duplicates": [None] * page_count,
+        "page_routes": ["template"] + [None] * (page_count - 1),
+        "field_confidence": read["confidence"],
+        "field_sources": {key: "template" for key in schema},
+        "extracted_entities": ensure_name_field(
+            {key: read["fields"][key] for key in schema}
         )
-        entities = extract_entities_from_text(text, document_type)
-        source = "ocr"
+    }
+
+def route_document(data, ocr_pages, document_type, confidence_threshold,
+                   page_routing=None):
+    """
+    Extract the entities of an OCR'd document. Returns (source,
+    page_routes, entities, field_sources); source is "ocr" (all pages as
+    text), "gemini_vision" (all as images) or "mixed".
+    """
+    if page_routing is None:
+        page_routing = PAGE_ROUTING
+
+    if page_routing:
+        # Only pages OCR read nothing on are rendered for the blank check.
+        blank = blank_pages(data, [i for i, p in enumerate(ocr_pages) if not p["content"]])
+        page_routes = route_pages(ocr_pages, confidence_threshold, blank)
     else:
-        entities = extract_entities_from_images(page_images, document_type)
-        source = "gemini_vision"
+        doc_conf = compute_document_confidence(ocr_pages)
+        whole = "text" if doc_conf >= confidence_threshold else "vision"
+        page_routes = [whole] * len(ocr_pages)
+
+    text_pages = [p for p, r in zip(ocr_pages, page_routes) if r == "text"]
+    vision_indexes = [i for i, r in enumerate(page_routes) if r == "vision"]
+
+    if not vision_indexes:
+        lines = [line for page in text_pages for line in page["content"]]
+        entities, field_sources = extract_entities_from_lines(lines, document_type)
+        return "ocr", page_routes, entities, field_sources
+
+    # Only the pages routed to vision are rendered, straight to the
+    # compressed payloads Gemini receives.
+    images = list(iter_pdf_payloads(data, DEFAULT_DPI, pages=vision_indexes))
+
+    if not text_pages:
+        entities = extract_entities_from_images(images, document_type)
+        return "gemini_vision", page_routes, entities, {key: "llm_vision" for key in entities}
+
+    # Rules on the well-read pages first; one mixed request for the rest.
+    schema = ENTITY_SCHEMAS.get(document_type, {})
+    lines = [line for page in text_pages for line in page["content"]]
+    found = extract_fields(lines, document_type, schema)
+    entities = {key: value for key, (value, _) in found.items()}
+    field_sources = {key: "rule" for key in found}
+
+    missing = [key for key in schema if key not in found]
+    if missing or not schema:
+        mixed = extract_entities_from_mixed(
+            [(p["page"], "\n".join(l["text"] for l in p["content"])) for p in text_pages],
+            [(i + 1, img) for i, img in zip(vision_indexes, images)],
+            document_type,
+            fields=missing if schema else None,
+        )
+        for key, value in mixed.items():
+            if key not in entities:
+                entities[key] = value
+                field_sources[key] = "llm_mixed"
+
+    metrics.note("field_sources", field_sources)
+    return "mixed", page_routes, entities, field_sources
+
+def process_pdf(file_stream, document_type, confidence_threshold=0.65, on_page=None,
+                page_routing=None):
+    data = file_stream.read()
+
+    if TEMPLATE_OCR:
+        result = process_pdf_with_template(data, document_type)
+        if result is not None:
+            metrics.ROUTES.inc(route="template")
+            metrics.note("route", "template")
+            if on_page:
+                total = len(result["page_sources"])
+                on_page(total, total)
+            return result
+
+    # Page bitmaps are not kept through OCR; the vision path re-renders.
+    ocr_pages, _ = process_pdf_with_easyocr(
+        BytesIO(data), on_page=on_page, keep_images=False
+    )
+    doc_conf = compute_document_confidence(ocr_pages)
+    record_page_metrics(ocr_pages, doc_conf)
+
+    source, page_routes, entities, field_sources = route_document(
+        data, ocr_pages, document_type, confidence_threshold, page_routing
+    )
 
     entities = ensure_name_field(entities)
+    metrics.ROUTES.inc(route=source)
+    metrics.note("route", source)
+    metrics.note("page_routes", page_routes)
+    for route in page_routes:
+        metrics.PAGE_ROUTES.inc(route=route)
+    metrics.record_field_sources(field_sources)
 
     return {
         "source": source,
         "document_type": document_type,
         "document_confidence": doc_conf,
+        "page_sources": [page["source"] for page in ocr_pages],
+        "page_dpi": [page["dpi"] for page in ocr_pages],
+        "page_duplicates": [page["duplicate_of"] for page in ocr_pages],
+        "page_routes": page_routes,
+        "field_sources": field_sources,
         "extracted_entities": entities
     }
@@ -0,0 +1,273 @@
+import os
+import math
+import time
+import queue
+import atexit
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import metrics
+import page_buffer
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# OCR_WORKERS <= 1 keeps OCR in the calling process (old serial behaviour).
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Upper bound on pages rendered and waiting for / inside a worker, across
+# every document currently being processed by this process.
+OCR_MAX_INFLIGHT = int(os.getenv("OCR_MAX_INFLIGHT", 2 * max(OCR_WORKERS, 1)))
+
+# Torch intra-op threads per worker. One thread per process avoids the
+# workers fighting each other for the same cores.
+OCR_WORKER_THREADS = int(os.getenv("OCR_WORKER_THREADS", 1))
+
+# Pages handed to a worker per task. With batched recognition
+# (OCR_RECOGNIZE_BATCH > 1 in ocr.py) the text crops of all pages in a
+# task are recognised together. 0 = per document: its pages are split
+# evenly over the workers (one task in-process), at most
+# OCR_PAGE_BATCH_MAX pages a task.
+OCR_PAGE_BATCH = max(0, int(os.getenv("OCR_PAGE_BATCH", 0)))
+
+# Largest per-document task; a task keeps all its pages' bitmaps alive.
+OCR_PAGE_BATCH_MAX = max(1, int(os.getenv("OCR_PAGE_BATCH_MAX", 4)))
+
+# Seconds warm() waits for every worker to report its reader loaded.
+OCR_WARM_TIMEOUT = float(os.getenv("OCR_WARM_TIMEOUT", 600))
+
+# "spawn" is the safe default: forking a parent that has already run torch
+# can deadlock the child on OpenMP locks. "fork" lets workers share a
+# reader preloaded (without warm-up) in the parent copy-on-write.
+OCR_START_METHOD = os.getenv("OCR_START_METHOD", "spawn")
+
+# Hand rendered pages to the workers through shared memory (see
+# page_buffer.py) instead of pickling them.
+PAGE_SHM = page_buffer.PAGE_SHM
+
+# ============================================================
+# WORKER SIDE
+# ============================================================
+
+def _init_worker(torch_threads, ready=None):
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+
+    # Load (or, when forked from a preloaded parent, reuse) this worker's
+    # reader once, so every page it receives afterwards hits a warm model.
+    import models
+    models.preload()
+    if ready is not None:
+        ready.put(os.getpid())
+
+
+def _run(fn, *args):
+    # Timings travel back with the result; metrics in a worker process
+    # would never be scraped. Pages sent through shared memory arrive as
+    # handles and are mapped back in here.
+    with page_buffer.attached(args) as pages_args:
+        with metrics.collect() as timings:
+            result = fn(*pages_args)
+        del pages_args  # the shared blocks can only be detached unreferenced
+    return result, timings
+
+
+def _ocr_pages(pages):
+    import ocr
+
+    images = []
+    for page in pages:
+        with metrics.stage_timer("deskew"):
+            images.append(ocr.preprocess_image(page))
+    return ocr.run_easyocr_pages(images)
+
+# ============================================================
+# POOL
+# ============================================================
+
+class OcrPool:
+    """
+    Page-parallel EasyOCR engine.
+
+    Pages are submitted in batches (page_batch, or per document when it
+    is 0 - see document_batch()) and run in a pool of worker processes;
+    map_pages() hands results back per page, in input order.
+    """
+
+    def __init__(self, workers=OCR_WORKERS, max_inflight=OCR_MAX_INFLIGHT,
+                 page_batch=OCR_PAGE_BATCH):
+        self.workers = workers
+        self.page_batch = page_batch
+        # In-flight limit counted in tasks, so each task holds one slot;
+        # per-document batching keeps at least one task per worker.
+        largest = page_batch or OCR_PAGE_BATCH_MAX
+        self.max_inflight = max(1, max_inflight // largest)
+        if not page_batch:
+            self.max_inflight = max(self.max_inflight, workers)
+        self._slots = threading.BoundedSemaphore(self.max_inflight)
+        self._executor = None
+        self._ready = None  # queue each worker reports to once warm
+        self._warmed = False
+        self._lock = threading.Lock()
+
+    @property
+    def parallel(self):
+        return self.workers > 1
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context(OCR_START_METHOD)
+                self._ready = context.Queue()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(OCR_WORKER_THREADS, self._ready),
+                )
+            return self._executor
+
+    def _submit(self, fn, *args):
+        """
+        Run fn(*args) on a worker and return a Future of (result, stage
+        timings). Blocks while the in-flight limit is reached.
+        """
+        if not self.parallel:
+            future = Future()
+            try:
+                future.set_result(_run(fn, *args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        self._slots.acquire()
+        blocks = []
+        try:
+            if PAGE_SHM:
+                # Pages cross to the worker as shared memory names, not
+                # pickled bitmaps.
+                args, blocks = page_buffer.share_args(args)
+            future = self._get_executor().submit(_run, fn, *args)
+        except Exception:
+            page_buffer.release(blocks)
+            self._slots.release()
+            raise
+
+        def done(_):
+            page_buffer.release(blocks)
+            self._slots.release()
+
+        future.add_done_callback(done)
+        return future
+
+    def submit(self, pages):
+        """
+        Queue a batch of pages (page_buffer.PageBuffer, NumPy or PIL
+        images) for OCR and return a Future of (lines per page, stage
+        timings).
+        """
+        return self._submit(_ocr_pages, pages)
+
+    def call(self, fn, *args):
+        """
+        Run a picklable module-level fn(*args) where page OCR runs (so the
+        reader is the workers' one) and return its result.
+        """
+        result, timings = self._submit(fn, *args).result()
+        metrics.record_stages(timings)
+        return result
+
+    def document_batch(self, total_pages):
+        """
+        Pages per task for a document of total_pages: page_batch when set,
+        else the document split evenly over the workers.
+        """
+        if self.page_batch:
+            return self.page_batch
+        per_worker = math.ceil(total_pages / self.workers) if self.parallel else total_pages
+        return max(1, min(per_worker, OCR_PAGE_BATCH_MAX))
+
+    def _batches(self, images, page_batch):
+        batch = []
+        for img in images:
+            batch.append(img)
+            if len(batch) == page_batch:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def map_pages(self, images, page_batch=None):
+        """
+        Yield OCR lines for each image, in input order, page_batch
+        (default: the pool's, or 1) images per task.
+
+        Images are pulled from the iterable only as slots free up, so a
+        generator upstream is never drained faster than OCR can keep up.
+        """
+        pending = deque()
+
+        def results(future):
+            pages, timings = future.result()
+            metrics.record_stages(timings)
+            return pages
+
+        for batch in self._batches(images, page_batch or self.page_batch or 1):
+            if len(pending) >= self.max_inflight:
+                yield from results(pending.popleft())
+            pending.append(self.submit(batch))
+
+        while pending:
+            yield from results(pending.popleft())
+
+    def warm(self):
+        """
+        Start every worker process and wait until each has reported from
+        its initializer that its reader is loaded and warm.
+        """
+        if not self.parallel or self._warmed:
+            return
+        executor = self._get_executor()
+        # One task per worker makes the executor start all of them (with
+        # fork it only starts processes on demand).
+        futures = [executor.submit(os.getpid) for _ in range(self.workers)]
+        deadline = time.monotonic() + OCR_WARM_TIMEOUT
+        reported = 0
+        while reported < self.workers:
+            try:
+                self._ready.get(timeout=1)
+                reported += 1
+            except queue.Empty:
+                # A worker whose initializer failed breaks the pool and
+                # will never report.
+                for future in futures:
+                    if future.done() and future.exception() is not None:
+                        raise future.exception()
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"OCR workers not warm after {OCR_WARM_TIMEOUT}s")
+        self._warmed = True
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OcrPool()
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -0,0 +1,190 @@
+import os
+import contextlib
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import fitz
+import numpy as np
+from PIL import Image
+
+import metrics
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# Hand pages to the OCR worker processes through shared memory instead of
+# pickling them through the pool's pipe (1 = on).
+PAGE_SHM = os.getenv("PAGE_SHM", "1") == "1"
+
+# ============================================================
+# PAGE BUFFERS
+# ============================================================
+
+class PageBuffer:
+    """
+    One rendered page as a uint8 NumPy array - (h, w) grayscale or
+    (h, w, 3) RGB - that views memory owned by something else (a PyMuPDF
+    pixmap, a shared memory block) without copying it.
+
+    The buffer keeps its owner alive: hold on to the buffer, not just the
+    array, for as long as the array is in use. np.asarray(buffer) is the
+    array itself.
+    """
+
+    __slots__ = ("array", "_owner")
+
+    def __init__(self, array, owner=None):
+        self.array = array
+        self._owner = owner
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is not None and dtype != self.array.dtype:
+            return self.array.astype(dtype)
+        return self.array.copy() if copy else self.array
+
+    @property
+    def width(self):
+        return self.array.shape[1]
+
+    @property
+    def height(self):
+        return self.array.shape[0]
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    @property
+    def mode(self):
+        return "L" if self.array.ndim == 2 else "RGB"
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
+
+    def to_pil(self):
+        """
+        PIL image of the page. Grayscale pages share the buffer's memory;
+        PIL has no shared RGB mode, so RGB pages are copied once.
+        """
+        array = np.ascontiguousarray(self.array)
+        return Image.frombuffer(self.mode, self.size, array, "raw", self.mode, 0, 1)
+
+    def close(self):
+        self.array = None
+        self._owner = None
+
+
+def pixmap_array(pix):
+    """
+    NumPy view of a pixmap's samples (no copy); rows keep the pixmap's
+    stride. Valid only while pix is alive.
+    """
+    shape = (pix.height, pix.width) if pix.n == 1 else (pix.height, pix.width, pix.n)
+    strides = (pix.stride, 1) if pix.n == 1 else (pix.stride, pix.n, 1)
+    return np.ndarray(shape, dtype=np.uint8, buffer=pix.samples_mv, strides=strides)
+
+
+def render(page, dpi=300, gray=True):
+    """
+    Render a PyMuPDF page into a PageBuffer: straight to one channel with
+    gray (what OCR reads), else RGB, and without an alpha channel.
+    """
+    pix = page.get_pixmap(
+        dpi=dpi,
+        colorspace=fitz.csGRAY if gray else fitz.csRGB,
+        alpha=False,
+    )
+    return PageBuffer(pixmap_array(pix), pix)
+
+
+def as_array(image):
+    """
+    The pixels of a PageBuffer, NumPy array or PIL image as an array;
+    only a PIL image is copied.
+    """
+    return np.asarray(image)
+
+# ============================================================
+# SHARED MEMORY (OCR WORKERS)
+# ============================================================
+
+# What crosses the process boundary instead of the pixels: the name of
+# the shared memory block holding them, and the array's shape.
+SharedPage = namedtuple("SharedPage", "name shape")
+
+
+def share(image):
+    """
+    Copy a page into a new shared memory block. Returns (SharedPage,
+    SharedMemory); the caller unlinks the block once the worker is done.
+    """
+    array = as_array(image)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=np.uint8, buffer=shm.buf)[...] = array
+    metrics.PAGE_SHARED_BYTES.inc(array.nbytes)
+    return SharedPage(shm.name, array.shape), shm
+
+
+def release(blocks):
+    for shm in blocks:
+        try:
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _attach(name):
+    # Pool workers share their parent's resource tracker, so attaching
+    # registers nothing new; the block is unlinked once, by its creator.
+    return shared_memory.SharedMemory(name=name)
+
+
+def share_args(args):
+    """
+    args with every PageBuffer / NumPy page (also inside lists) replaced
+    by a SharedPage. Returns (args, blocks to release afterwards).
+    """
+    blocks = []
+
+    def convert(value):
+        if isinstance(value, (PageBuffer, np.ndarray)):
+            handle, shm = share(value)
+            blocks.append(shm)
+            return handle
+        if isinstance(value, list):
+            return [convert(v) for v in value]
+        return value
+
+    return tuple(convert(a) for a in args), blocks
+
+
+@contextlib.contextmanager
+def attached(args):
+    """
+    Worker side of share_args(): SharedPage handles become PageBuffers
+    over the shared block, detached again on exit.
+    """
+    blocks = []
+
+    def convert(value):
+        if isinstance(value, SharedPage):
+            shm = _attach(value.name)
+            blocks.append(shm)
+            return PageBuffer(np.ndarray(value.shape, dtype=np.uint8, buffer=shm.buf), shm)
+        if isinstance(value, list):
+            return [convert(v) for v in value]
+        return value
+
+    try:
+        yield tuple(convert(a) for a in args)
+    finally:
+        for shm in blocks:
+            try:
+                shm.close()
+            except BufferError:
+                # An array over the block is still referenced (e.g. kept in
+                # a result); the mapping goes away with it.
+                pass
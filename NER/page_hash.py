@@ -0,0 +1,204 @@
+# Page hashing: spot repeated pages (both sides of a card uploaded twice,
+# a page repeated in a PDF) so they are OCR'd or sent to Gemini once.
+#
+# Within one PDF pages are compared perceptually. A page's signature is a
+# 64-bit dHash and pHash plus a grayscale copy of the page shrunk to
+# DETAIL_SIDE pixels on its long edge; pages are near-identical when both
+# hashes are within PAGE_HASH_DISTANCE bits and no pixel of the shrunk
+# copies differs by more than PAGE_HASH_PIXEL_DIFF grey levels. The
+# hashes find candidates, the pixel check keeps two forms of the same
+# layout that differ by a digit apart.
+#
+# Across requests only exact copies are reused: page_index is keyed on
+# the sha256 of the rendered bitmap.
+import os
+import math
+import hashlib
+import threading
+from collections import namedtuple, OrderedDict
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+from page_buffer import as_array
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# Reuse OCR output between repeated pages (1 = on).
+PAGE_HASH = os.getenv("PAGE_HASH", "1") == "1"
+
+# Bits (of 64) each hash may differ by.
+PAGE_HASH_DISTANCE = int(os.getenv("PAGE_HASH_DISTANCE", 6))
+
+# Largest grey-level difference allowed at any pixel of the shrunk pages
+# (about 7 px of a 300 DPI A4 scan each). Kept tight: a page taken for
+# another reuses its text. A re-encoded copy (JPEG 60) scores about 10;
+# one digit changed in 6 pt text at 150 DPI scores about 40.
+PAGE_HASH_PIXEL_DIFF = int(os.getenv("PAGE_HASH_PIXEL_DIFF", 20))
+
+# Exact page renders remembered across requests (a digest and a future
+# each, plus the page's text; 0 = only match pages within one document).
+PAGE_INDEX_SIZE = int(os.getenv("PAGE_INDEX_SIZE", 256))
+
+# Seconds to wait for a matching page still being OCR'd elsewhere before
+# OCR'ing this one after all.
+PAGE_HASH_WAIT_SECONDS = float(os.getenv("PAGE_HASH_WAIT_SECONDS", 120))
+
+HASH_SIZE = 8
+
+# Long edge of the shrunk page kept in a signature (~180 KB for A4; held
+# only while its document is processed).
+DETAIL_SIDE = 512
+
+# Aspect ratios (width / height) further apart than this never match.
+ASPECT_TOLERANCE = 0.02
+
+# ============================================================
+# SIGNATURES
+# ============================================================
+
+Signature = namedtuple("Signature", "digest dhash phash aspect detail")
+
+
+def _bits(flags):
+    return int("".join("1" if flag else "0" for flag in flags.flatten()), 2)
+
+
+def digest(image):
+    """
+    sha256 of a page's pixels and shape: equal only for identical renders.
+    """
+    pixels = np.ascontiguousarray(as_array(image))
+    sha = hashlib.sha256(repr(pixels.shape).encode())
+    sha.update(pixels.data)
+    return sha.hexdigest()
+
+
+def signature(image):
+    """
+    Signature of a page (PageBuffer, NumPy array or PIL image, grayscale
+    or RGB).
+    """
+    pixels = as_array(image)
+    gray = pixels
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(np.ascontiguousarray(gray), cv2.COLOR_RGB2GRAY)
+    height, width = gray.shape
+
+    # INTER_AREA is only fast for whole-number factors: shrink by one
+    # (dropping under `factor` edge pixels) and take the hashes from that.
+    factor = max(1, math.ceil(max(height, width) / DETAIL_SIDE))
+    detail = gray
+    if factor > 1:
+        detail = cv2.resize(
+            gray[:height - height % factor, :width - width % factor],
+            (width // factor, height // factor), interpolation=cv2.INTER_AREA,
+        )
+
+    small = cv2.resize(detail, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    dhash = _bits(small[:, 1:] > small[:, :-1])
+
+    # pHash: sign of the low frequencies of the DCT against their median,
+    # leaving out the DC term.
+    dct = cv2.dct(cv2.resize(detail, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32))
+    low = dct[:HASH_SIZE, :HASH_SIZE].flatten()[1:]
+    phash = _bits(low > np.median(low))
+    return Signature(digest(pixels), dhash, phash, width / max(height, 1), detail)
+
+
+def near_identical(a, b, distance=PAGE_HASH_DISTANCE, pixel_diff=PAGE_HASH_PIXEL_DIFF):
+    if a.digest == b.digest:
+        return True
+    # Pages rendered to different sizes are never taken for each other.
+    if a.detail.shape != b.detail.shape:
+        return False
+    if abs(a.aspect - b.aspect) > ASPECT_TOLERANCE * b.aspect:
+        return False
+    if (a.dhash ^ b.dhash).bit_count() > distance or (a.phash ^ b.phash).bit_count() > distance:
+        return False
+    return cv2.absdiff(a.detail, b.detail).max() <= pixel_diff
+
+# ============================================================
+# INDEX
+# ============================================================
+
+class PageIndex:
+    """
+    LRU index of recently OCR'd pages by digest(), shared by every
+    request of the process. Only byte-identical renders match: near
+    matches are never taken across requests.
+
+    claim(digest) is how a page asks to be OCR'd: if the same render is
+    already in the index the caller gets that page's future and skips
+    OCR; otherwise the page itself is entered (as a future its caller
+    must publish() or abandon()), so a copy arriving while it is still
+    being OCR'd - later in the same PDF or in a concurrent request -
+    waits for it instead of OCR'ing it again.
+    """
+
+    def __init__(self, max_entries=PAGE_INDEX_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # digest -> Future
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def claim(self, digest):
+        """
+        (owner, future): with owner the caller OCRs the page and publishes
+        it through future; otherwise future resolves to the matching
+        page's published value (None if its OCR failed).
+        """
+        with self._lock:
+            future = self._entries.get(digest)
+            if future is not None and not (future.done() and future.result() is None):
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return False, future
+
+            self.misses += 1
+            future = Future()
+            if self.max_entries > 0:
+                self._entries[digest] = future
+                self._entries.move_to_end(digest)
+                while len(self._entries) > self.max_entries:
+                    # An evicted claim still resolves for whoever waits on it.
+                    self._entries.popitem(last=False)
+            return True, future
+
+    def publish(self, future, value):
+        if not future.done():
+            future.set_result(value)
+
+    def abandon(self, future):
+        """
+        Give up a claim (OCR failed): pages waiting on it get None and the
+        entry no longer matches. No-op once published.
+        """
+        if future.done():
+            return
+        future.set_result(None)
+        with self._lock:
+            for key, other in list(self._entries.items()):
+                if other is future:
+                    del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+page_index = PageIndex()
@@ -0,0 +1,324 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from io import BytesIO
+from collections import OrderedDict
+
+import metrics
+import ocr
+import templates
+import rule_extract
+from ocr import process_pdf
+from llm_client import GEMINI_MODEL
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# Entries kept in the in-memory LRU tier.
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 256))
+
+# Seconds a cached result stays valid (0 = never expires).
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 7 * 24 * 3600))
+
+# SQLite file for the on-disk tier. Unset = memory only.
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB")
+
+# Size cap for the on-disk tier, in bytes of stored JSON.
+RESULT_CACHE_DB_MAX_BYTES = int(
+    os.getenv("RESULT_CACHE_DB_MAX_BYTES", 256 * 1024 * 1024)
+)
+
+# Bump when a change to the pipeline code alters what process_pdf returns
+# for the same input, so results of the old code stop being served.
+PIPELINE_VERSION = 1
+
+# ============================================================
+# KEY
+# ============================================================
+
+def pipeline_settings():
+    """
+    Everything besides the upload that decides what process_pdf returns.
+    """
+    return {
+        "version": PIPELINE_VERSION,
+        "gemini_model": GEMINI_MODEL,
+        "template_ocr": ocr.TEMPLATE_OCR,
+        "template_min_confidence": templates.TEMPLATE_MIN_CONFIDENCE,
+        "rule_min_confidence": rule_extract.RULE_MIN_CONFIDENCE,
+        "page_routing": ocr.PAGE_ROUTING,
+        "confidence_weighting": ocr.CONFIDENCE_WEIGHTING,
+        "dpi": ocr.DEFAULT_DPI,
+        "adaptive_dpi": ocr.ADAPTIVE_DPI,
+        "adaptive_low_dpi": ocr.ADAPTIVE_LOW_DPI,
+        "adaptive_high_dpi": ocr.ADAPTIVE_HIGH_DPI,
+        "adaptive_dpi_threshold": ocr.ADAPTIVE_DPI_THRESHOLD,
+        "native_text": ocr.NATIVE_TEXT,
+        "native_text_min_chars": ocr.NATIVE_TEXT_MIN_CHARS,
+    }
+
+
+def pipeline_fingerprint(settings=None):
+    text = json.dumps(settings or pipeline_settings(), sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# The settings are read from the environment once, at import.
+PIPELINE_FINGERPRINT = pipeline_fingerprint()
+
+
+def make_cache_key(file_bytes, document_type, confidence_threshold,
+                   fingerprint=None):
+    h = hashlib.sha256(file_bytes)
+    h.update(b"\0" + document_type.encode("utf-8"))
+    h.update(b"\0" + repr(float(confidence_threshold)).encode("ascii"))
+    h.update(b"\0" + (fingerprint or PIPELINE_FINGERPRINT).encode("ascii"))
+    return h.hexdigest()
+
+# ============================================================
+# CACHE
+# ============================================================
+
+class ResultCache:
+    """
+    Two-tier cache of process_pdf results.
+
+    Values are stored as JSON text, so every get() hands back a fresh
+    copy that callers are free to mutate.
+    """
+
+    def __init__(
+        self,
+        max_entries=RESULT_CACHE_SIZE,
+        ttl=RESULT_CACHE_TTL,
+        db_path=RESULT_CACHE_DB,
+        db_max_bytes=RESULT_CACHE_DB_MAX_BYTES,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_max_bytes = db_max_bytes
+
+        self._memory = OrderedDict()  # key -> (stored_at, json_text)
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._db.commit()
+
+    def _expired(self, stored_at, now):
+        return self.ttl > 0 and now - stored_at > self.ttl
+
+    def get(self, key):
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if not self._expired(stored_at, now):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    self._record("memory_hit")
+                    return json.loads(value)
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, stored_at FROM results WHERE key = ?",
+                    (key,)
+                ).fetchone()
+
+                if row is not None and not self._expired(row[1], now):
+                    self._db.execute(
+                        "UPDATE results SET accessed_at = ? WHERE key = ?",
+                        (now, key)
+                    )
+                    self._db.commit()
+                    self._remember(key, row[1], row[0])
+                    self.disk_hits += 1
+                    self._record("disk_hit")
+                    return json.loads(row[0])
+
+            self.misses += 1
+            self._record("miss")
+            return None
+
+    def _record(self, result):
+        metrics.CACHE_LOOKUPS.inc(result=result)
+        metrics.note("cache", result)
+
+    def put(self, key, result):
+        now = time.time()
+        value = json.dumps(result)
+
+        with self._lock:
+            self._remember(key, now, value)
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now, now)
+                )
+                self._evict_disk(now)
+                self._db.commit()
+
+    def _remember(self, key, stored_at, value):
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now):
+        if self.ttl > 0:
+            self._db.execute(
+                "DELETE FROM results WHERE stored_at < ?",
+                (now - self.ttl,)
+            )
+
+        total = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()[0]
+
+        # Drop least recently used rows until we are back under the cap.
+        rows = self._db.execute(
+            "SELECT key, size FROM results ORDER BY accessed_at"
+        )
+        stale = []
+        for key, size in rows:
+            if total <= self.db_max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+
+        self._db.executemany("DELETE FROM results WHERE key = ?", stale)
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            disk_entries = 0
+            if self._db is not None:
+                disk_entries = self._db.execute(
+                    "SELECT COUNT(*) FROM results"
+                ).fetchone()[0]
+
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+
+result_cache = ResultCache()
+
+# ============================================================
+# CACHED PIPELINE
+# ============================================================
+
+def _worth_caching(result):
+    # An all-empty extraction usually means the LLM reply failed to parse;
+    # let the next upload try again instead of pinning the bad result.
+    entities = result.get("extracted_entities") if result else None
+    return isinstance(entities, dict) and any(entities.values())
+
+
+# Uploads being processed right now, by cache key: an identical upload
+# arriving meanwhile waits for that result instead of running the
+# pipeline a second time.
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None  # JSON text, None if the pipeline raised
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _served(result, start, on_page):
+    metrics.DOCUMENT_SECONDS.observe(time.perf_counter() - start, route="cache")
+    if on_page:
+        total = len(result.get("page_sources") or []) or 1
+        on_page(total, total)
+    return result
+
+
+def cached_process_pdf(file_stream, document_type, confidence_threshold=0.65,
+                       on_page=None):
+    """
+    process_pdf behind the result cache. Identical file bytes with the
+    same document_type and threshold, under the same pipeline settings,
+    skip OCR and Gemini entirely; concurrent identical uploads share one
+    run.
+    """
+    start = time.perf_counter()
+    data = file_stream.read()
+    key = make_cache_key(data, document_type, confidence_threshold)
+
+    while True:
+        cached = result_cache.get(key)
+        if cached is not None:
+            return _served(cached, start, on_page)
+
+        with _flights_lock:
+            flight = _flights.get(key)
+            if flight is None:
+                flight = _flights[key] = _Flight()
+                break
+
+        flight.done.wait()
+        if flight.result is not None:
+            metrics.note("cache", "shared")
+            return _served(json.loads(flight.result), start, on_page)
+        # The run we waited on raised: try again ourselves.
+
+    try:
+        result = process_pdf(
+            file_stream=BytesIO(data),
+            document_type=document_type,
+            confidence_threshold=confidence_threshold,
+            on_page=on_page
+        )
+        if _worth_caching(result):
+            result_cache.put(key, result)
+        flight.result = json.dumps(result)
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+    metrics.DOCUMENT_SECONDS.observe(
+        time.perf_counter() - start, route=result.get("source", "unknown")
+    )
+    return result
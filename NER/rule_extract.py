@@ -0,0 +1,369 @@
+import os
+import re
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# OCR lines below this confidence are not trusted for a rule match; the
+# field is left to the LLM instead.
+RULE_MIN_CONFIDENCE = float(os.getenv("RULE_MIN_CONFIDENCE", 0.6))
+
+# ============================================================
+# CHECKSUMS
+# ============================================================
+
+_VERHOEFF_D = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [1, 2, 3, 4, 0, 6, 7, 8, 9, 5],
+    [2, 3, 4, 0, 1, 7, 8, 9, 5, 6],
+    [3, 4, 0, 1, 2, 8, 9, 5, 6, 7],
+    [4, 0, 1, 2, 3, 9, 5, 6, 7, 8],
+    [5, 9, 8, 7, 6, 0, 4, 3, 2, 1],
+    [6, 5, 9, 8, 7, 1, 0, 4, 3, 2],
+    [7, 6, 5, 9, 8, 2, 1, 0, 4, 3],
+    [8, 7, 6, 5, 9, 3, 2, 1, 0, 4],
+    [9, 8, 7, 6, 5, 4, 3, 2, 1, 0],
+]
+_VERHOEFF_P = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [1, 5, 7, 6, 2, 8, 3, 0, 9, 4],
+    [5, 8, 0, 3, 7, 9, 6, 1, 4, 2],
+    [8, 9, 1, 6, 0, 4, 3, 5, 2, 7],
+    [9, 4, 5, 3, 1, 2, 6, 8, 7, 0],
+    [4, 2, 8, 6, 5, 7, 3, 9, 0, 1],
+    [2, 7, 9, 3, 8, 0, 6, 4, 1, 5],
+    [7, 0, 4, 6, 9, 1, 3, 2, 5, 8],
+]
+_VERHOEFF_INV = [0, 4, 3, 2, 1, 5, 6, 7, 8, 9]
+
+
+def verhoeff_valid(digits):
+    c = 0
+    for i, d in enumerate(reversed(digits)):
+        c = _VERHOEFF_D[c][_VERHOEFF_P[i % 8][int(d)]]
+    return c == 0
+
+
+def verhoeff_check_digit(digits):
+    """
+    The digit to append to digits so the result passes verhoeff_valid.
+    """
+    c = 0
+    for i, d in enumerate(reversed(digits)):
+        c = _VERHOEFF_D[c][_VERHOEFF_P[(i + 1) % 8][int(d)]]
+    return str(_VERHOEFF_INV[c])
+
+
+# ICAO 9303 check digits: digits count as themselves, A-Z as 10-35 and
+# the filler "<" as 0, weighted 7, 3, 1 repeating.
+_MRZ_VALUES = {c: i for i, c in enumerate("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ")}
+
+
+def mrz_check_digit(chars):
+    total = sum(_MRZ_VALUES.get(c, 0) * (7, 3, 1)[i % 3] for i, c in enumerate(chars))
+    return str(total % 10)
+
+
+def luhn_valid(digits):
+    total = 0
+    for i, d in enumerate(reversed(digits)):
+        n = int(d)
+        if i % 2:
+            n *= 2
+            if n > 9:
+                n -= 9
+        total += n
+    return total % 10 == 0
+
+# ============================================================
+# OCR CLEAN-UP
+# ============================================================
+
+# Characters EasyOCR commonly swaps, by what the position must hold.
+_AS_DIGIT = str.maketrans({"O": "0", "D": "0", "Q": "0", "I": "1", "L": "1",
+                           "Z": "2", "S": "5", "B": "8", "G": "6"})
+_AS_LETTER = str.maketrans({"0": "O", "1": "I", "2": "Z", "5": "S", "8": "B", "6": "G"})
+
+
+def _fix_pan(token):
+    # AAAAA9999A; the 4th letter is the holder type (P = person, ...).
+    if len(token) != 10:
+        return None
+    fixed = (
+        token[:5].translate(_AS_LETTER)
+        + token[5:9].translate(_AS_DIGIT)
+        + token[9].translate(_AS_LETTER)
+    )
+    if re.fullmatch(r"[A-Z]{3}[ABCFGHJLPT][A-Z][0-9]{4}[A-Z]", fixed):
+        return fixed
+    return None
+
+
+def _digits_only(text):
+    return re.sub(r"\D", "", text.upper().translate(_AS_DIGIT))
+
+
+def _normalize_date(day, month, year):
+    day, month = int(day), int(month)
+    if not (1 <= day <= 31 and 1 <= month <= 12):
+        return None
+    return f"{day:02d}/{month:02d}/{year}"
+
+
+DATE_RE = re.compile(r"\b(\d{1,2})\s?[/\-.]\s?(\d{1,2})\s?[/\-.]\s?((?:19|20)\d{2})\b")
+
+# ============================================================
+# LINE HELPERS
+# ============================================================
+
+def _key(text):
+    return re.sub(r"[^a-z/ ]", "", text.lower().replace("(s)", "")).strip()
+
+
+# Printed labels per field, most specific first. "name" is matched last
+# so "Father's Name" never reads as the holder's name.
+FIELD_LABELS = {
+    "father_name": ["fathers name", "father name", "son/daughter/wife of", "s/o", "d/o", "w/o"],
+    "date_of_birth": ["date of birth", "dob", "do b", "birth date", "year of birth"],
+    "issue_date": ["date of issue", "issue date", "doi", "issued on"],
+    "expiry_date": ["date of expiry", "valid till", "valid upto", "valid thru", "validity", "expiry date", "expiry"],
+    "gender": ["gender", "sex"],
+    "blood_group": ["blood group", "bg"],
+    "place_of_issue": ["place of issue"],
+    "nationality": ["nationality"],
+    "passport_number": ["passport no", "passport number", "passport num"],
+    "account_number": ["account number", "account no", "a/c no", "ac no"],
+    "name": ["name", "given name", "full name", "holders name", "candidate name",
+             "student name", "applicant name", "name of the student", "name of candidate"],
+}
+
+
+def _label_value(lines, field):
+    """
+    (value text, confidence) of the line following field's label, or of
+    the text after "Label:" on the same line.
+    """
+    labels = FIELD_LABELS[field]
+    for i, line in enumerate(lines):
+        text = line["text"]
+        head, sep, tail = text.partition(":")
+        if sep and _key(head) in labels and tail.strip():
+            return tail.strip(), line["confidence"]
+        if _key(text) in labels and i + 1 < len(lines):
+            nxt = lines[i + 1]
+            return nxt["text"].strip(), nxt["confidence"]
+    return None
+
+
+def _is_label(text):
+    key = _key(text)
+    return any(key in labels for labels in FIELD_LABELS.values())
+
+# ============================================================
+# FIELD RULES
+# ============================================================
+#
+# Each rule takes the OCR lines ({"text", "confidence"}) and returns
+# (value, confidence) or None.
+
+def rule_pan_number(lines, document_type):
+    for line in lines:
+        # Whole tokens only (OCR may split one as 5-4-1), so a label on
+        # the same line is never glued onto the number.
+        for match in re.finditer(
+            r"(?<![A-Z0-9])[A-Z0-9]{5}\s?[A-Z0-9]{4}\s?[A-Z0-9](?![A-Z0-9])",
+            line["text"].upper(),
+        ):
+            pan = _fix_pan(match.group().replace(" ", ""))
+            if pan:
+                return pan, line["confidence"]
+    return None
+
+
+# A whole run of 4-character digit groups: never the tail of a longer
+# one, such as the last 12 digits of a 16-digit VID.
+AADHAAR_RUN_RE = re.compile(
+    r"(?<![\dA-Z])(?<!\d{4}\s)[\dOIlSB]{4}(?:\s?[\dOIlSB]{4})+(?![\dA-Z])(?!\s?\d)"
+)
+
+
+def rule_aadhaar_number(lines, document_type):
+    for line in lines:
+        for match in AADHAAR_RUN_RE.finditer(line["text"]):
+            # 4-4-4 groups only; a 16-digit VID is not an Aadhaar number.
+            digits = _digits_only(match.group())
+            if len(digits) == 12 and digits[0] not in "01" and verhoeff_valid(digits):
+                return f"{digits[:4]} {digits[4:8]} {digits[8:]}", line["confidence"]
+    return None
+
+
+def rule_ifsc_code(lines, document_type):
+    for line in lines:
+        match = re.search(r"\b([A-Z]{4})\s?0\s?([A-Z0-9]{6})\b", line["text"].upper())
+        if match:
+            return f"{match.group(1)}0{match.group(2)}", line["confidence"]
+    return None
+
+
+def rule_card_number(lines, document_type):
+    for line in lines:
+        for match in re.finditer(r"(?:\d[ -]?){13,19}", line["text"]):
+            digits = re.sub(r"\D", "", match.group())
+            if 13 <= len(digits) <= 19 and luhn_valid(digits):
+                groups = [digits[i:i + 4] for i in range(0, len(digits), 4)]
+                return " ".join(groups), line["confidence"]
+    return None
+
+
+# Second MRZ line of a passport: document number, filler, its check
+# digit, nationality and date of birth.
+MRZ_NUMBER_RE = re.compile(r"([A-Z][0-9]{7}<)([0-9])[A-Z<]{3}[0-9]{6}")
+
+
+def rule_passport_number(lines, document_type):
+    # Only where it is known to be the passport number: after its label,
+    # or in the MRZ with a matching check digit. Any other letter and 7
+    # digits on the page (a file number, a reference) is left to the LLM.
+    found = _label_value(lines, "passport_number")
+    if found:
+        match = re.fullmatch(r"([A-Z])[\s-]?(\d{7})", found[0].strip().upper())
+        if match:
+            return match.group(1) + match.group(2), found[1]
+
+    for line in lines:
+        text = re.sub(r"\s", "", line["text"].upper())
+        for match in MRZ_NUMBER_RE.finditer(text):
+            number, check = match.groups()
+            if mrz_check_digit(number) == check:
+                return number[:8], line["confidence"]
+    return None
+
+
+def rule_license_number(lines, document_type):
+    # SS-RR YYYY NNNNNNN: state code, RTO, year of issue, serial.
+    for line in lines:
+        match = re.search(r"\b([A-Z]{2})[\s-]?(\d{2})[\s-]?((?:19|20)\d{2})[\s-]?(\d{7})\b",
+                          line["text"].upper())
+        if match:
+            state, rto, year, serial = match.groups()
+            return f"{state}-{rto}{year}{serial}", line["confidence"]
+    return None
+
+
+def rule_account_number(lines, document_type):
+    found = _label_value(lines, "account_number")
+    if found:
+        digits = re.sub(r"\D", "", found[0])
+        if 9 <= len(digits) <= 18:
+            return digits, found[1]
+    return None
+
+
+def _date_rule(field):
+    def rule(lines, document_type):
+        found = _label_value(lines, field)
+        if found:
+            match = DATE_RE.search(found[0])
+            if match:
+                date = _normalize_date(*match.groups())
+                if date:
+                    return date, found[1]
+
+        # A PAN or Aadhaar card prints a single date: the date of birth.
+        if field == "date_of_birth" and document_type in ("PAN Card", "Aadhaar Card"):
+            dates = [(m, line) for line in lines for m in DATE_RE.finditer(line["text"])]
+            if len(dates) == 1:
+                date = _normalize_date(*dates[0][0].groups())
+                if date:
+                    return date, dates[0][1]["confidence"]
+        return None
+    return rule
+
+
+def rule_gender(lines, document_type):
+    for line in lines:
+        match = re.search(r"\b(male|female|transgender)\b", line["text"], re.IGNORECASE)
+        if match:
+            return match.group(1).capitalize(), line["confidence"]
+    found = _label_value(lines, "gender")
+    if found and found[0].strip().upper() in ("M", "F", "T"):
+        return {"M": "Male", "F": "Female", "T": "Transgender"}[found[0].strip().upper()], found[1]
+    return None
+
+
+def rule_blood_group(lines, document_type):
+    found = _label_value(lines, "blood_group")
+    if found:
+        match = re.search(r"\b(AB|A|B|O)\s?([+-])", found[0].upper())
+        if match:
+            return match.group(1) + match.group(2), found[1]
+    return None
+
+
+def rule_nationality(lines, document_type):
+    found = _label_value(lines, "nationality")
+    if found and re.fullmatch(r"[A-Za-z ]{3,30}", found[0]):
+        return found[0].upper(), found[1]
+    return None
+
+
+def _person_rule(field):
+    def rule(lines, document_type):
+        found = _label_value(lines, field)
+        if not found:
+            return None
+        value = found[0].strip(" .,-")
+        if not re.fullmatch(r"[A-Za-z][A-Za-z .']{1,60}", value) or _is_label(value):
+            return None
+        return value, found[1]
+    return rule
+
+
+def rule_place_of_issue(lines, document_type):
+    found = _label_value(lines, "place_of_issue")
+    if found and re.fullmatch(r"[A-Za-z ]{2,40}", found[0]) and not _is_label(found[0]):
+        return found[0].upper(), found[1]
+    return None
+
+
+FIELD_RULES = {
+    "name": _person_rule("name"),
+    "father_name": _person_rule("father_name"),
+    "pan_number": rule_pan_number,
+    "aadhaar_number": rule_aadhaar_number,
+    "ifsc_code": rule_ifsc_code,
+    "card_number": rule_card_number,
+    "passport_number": rule_passport_number,
+    "license_number": rule_license_number,
+    "account_number": rule_account_number,
+    "date_of_birth": _date_rule("date_of_birth"),
+    "issue_date": _date_rule("issue_date"),
+    "expiry_date": _date_rule("expiry_date"),
+    "gender": rule_gender,
+    "blood_group": rule_blood_group,
+    "nationality": rule_nationality,
+    "place_of_issue": rule_place_of_issue,
+}
+
+# ============================================================
+# ENGINE
+# ============================================================
+
+def extract_fields(lines, document_type, fields, min_confidence=RULE_MIN_CONFIDENCE):
+    """
+    Fill what the rules can of fields from OCR lines.
+
+    Returns {field: (value, confidence)} for the fields a rule matched on
+    a line of at least min_confidence; the rest are left to the LLM.
+    """
+    lines = [line for line in lines if line["text"].strip()]
+    found = {}
+    for field in fields:
+        rule = FIELD_RULES.get(field)
+        if rule is None:
+            continue
+        match = rule(lines, document_type)
+        if match and match[0] and match[1] >= min_confidence:
+            found[field] = (match[0], round(float(match[1]), 3))
+    return found
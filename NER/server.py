@@ -1,66 +1,113 @@
 # dbms lab project - automated KYC document processing API
 
-from flask import Flask, jsonify, request
+import os
+
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-from io import BytesIO
 
-# ✅ IMPORT FROM ocr.py
-from ocr import process_pdf
+# ✅ IMPORT FROM extraction.py (cached ocr.py pipeline)
+from extraction import extract_documents, new_traces, validate_upload
+from result_cache import result_cache
+from page_hash import page_index
+from job_queue import job_queue
+from job_worker import start_local_workers
+import models
+import metrics
 
 app = Flask(__name__)
 CORS(app)
 
+# Under gunicorn --preload this module is imported in the master, whose
+# threads do not survive the fork; gunicorn.conf.py starts them in each
+# worker instead.
+if os.getenv("NER_DEFER_STARTUP") != "1":
+    start_local_workers()
+    models.start_warmup()
+
 
 @app.route('/', methods=['GET'])
 def test():
     return jsonify({"message": "Flask server is running"}), 200
 
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    status = models.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@app.route('/cacheStats', methods=['GET'])
+def cache_stats():
+    return jsonify(dict(result_cache.stats(), page_index=page_index.stats())), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @app.route('/uploadDetails', methods=['POST'])
 def upload_details():
     try:
         files = request.files.getlist("file")
         document_types = request.form.getlist("document_type")
 
-        if not files:
-            return jsonify({"error": "No files uploaded."}), 400
+        error = validate_upload(files, document_types)
+        if error:
+            return jsonify({"error": error}), 400
 
-        if len(files) != len(document_types):
-            return jsonify({
-                "error": "Each file must have a corresponding document_type"
-            }), 400
+        uploads = [
+            (file.read(), file.filename, document_types[idx])
+            for idx, file in enumerate(files)
+        ]
 
-        extracted_entities_list = []
+        # ?trace=1 adds a per-document stage timeline to the response.
+        traces = new_traces(uploads) if request.args.get("trace") == "1" else None
 
-        for idx, file in enumerate(files):
-            file_stream = BytesIO(file.read())
+        # Documents of one upload run concurrently; order is preserved.
+        extracted_entities_list = extract_documents(uploads, traces)
 
-            document_type = document_types[idx]
+        response = {"extracted_entities": extracted_entities_list}
+        if traces:
+            response["trace"] = [trace.to_dict() for trace in traces]
 
-            result = process_pdf(
-                file_stream=file_stream,
-                document_type=document_type,
-                confidence_threshold=0.70
-            )
+        return jsonify(response), 200
 
-            if not result or "extracted_entities" not in result:
-                return jsonify({
-                    "error": f"Failed to extract entities from {file.filename}"
-                }), 500
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-            entities = result["extracted_entities"]
 
-            # ✅ Inject correct document_type
-            entities["document_type"] = document_type
+@app.route('/jobs', methods=['POST'])
+def submit_jobs():
+    files = request.files.getlist("file")
+    document_types = request.form.getlist("document_type")
 
-            extracted_entities_list.append(entities)
+    error = validate_upload(files, document_types)
+    if error:
+        return jsonify({"error": error}), 400
 
-        return jsonify({
-            "extracted_entities": extracted_entities_list
-        }), 200
+    batch_id, job_ids = job_queue.submit([
+        (file.read(), file.filename, document_types[idx])
+        for idx, file in enumerate(files)
+    ])
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return jsonify({"batch_id": batch_id, "job_ids": job_ids}), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    return jsonify(job), 200
+
+
+@app.route('/jobs/batch/<batch_id>', methods=['GET'])
+def batch_status(batch_id):
+    batch = job_queue.batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Unknown batch id"}), 404
+    return jsonify(batch), 200
 
 
 if __name__ == "__main__":
@@ -0,0 +1,256 @@
+import os
+import re
+
+import cv2
+import numpy as np
+
+import metrics
+from models import get_reader
+from deskew import to_gray
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# Fields read with less confidence than this count as missing, and the
+# document goes through the full-page pipeline instead.
+TEMPLATE_MIN_CONFIDENCE = float(os.getenv("TEMPLATE_MIN_CONFIDENCE", 0.5))
+
+# Cards are warped to this size (ID-1 at 300 DPI) before cropping.
+CARD_SIZE = (1011, 638)
+CARD_ASPECT = CARD_SIZE[0] / CARD_SIZE[1]
+
+# Allowed relative deviation from CARD_ASPECT for a detected card outline
+# (A4, at 1.41, must not pass for a card).
+ASPECT_TOLERANCE = 0.08
+
+# A card outline must cover at least this share of the page or image.
+MIN_CARD_AREA = 0.04
+
+# ============================================================
+# TEMPLATES
+# ============================================================
+
+# Regions are (x0, y0, x1, y1) as fractions of the upright card; each
+# field region holds the value only, not its printed label. Keys are the
+# ENTITY_SCHEMAS keys in ocr.py. The anchor region must contain one of
+# the keywords or the card is treated as not aligned.
+#
+# The layouts follow the cards drawn by benchmarks/synthetic.py;
+# recalibrate the regions against real scans of each card design.
+
+DATE = r"\d{2}[/-]\d{2}[/-]\d{4}"
+
+TEMPLATES = {
+    "PAN Card": {
+        "anchor": ((0.10, 0.0, 0.90, 0.20), ["INCOME", "TAX", "INDIA"]),
+        "fields": {
+            "name": (0.03, 0.295, 0.80, 0.385),
+            "father_name": (0.03, 0.465, 0.80, 0.555),
+            "date_of_birth": (0.03, 0.635, 0.60, 0.725),
+            "pan_number": (0.03, 0.805, 0.60, 0.895),
+        },
+    },
+    "Aadhaar Card": {
+        "anchor": ((0.10, 0.0, 0.90, 0.15), ["GOVERNMENT", "INDIA"]),
+        "fields": {
+            "name": (0.29, 0.215, 0.95, 0.305),
+            "date_of_birth": (0.29, 0.395, 0.80, 0.485),
+            "gender": (0.29, 0.575, 0.80, 0.665),
+            "aadhaar_number": (0.22, 0.775, 0.90, 0.865),
+        },
+    },
+    "Driving License": {
+        "anchor": ((0.05, 0.0, 0.95, 0.13), ["DRIVING", "LICENCE", "LICENSE"]),
+        "fields": {
+            "license_number": (0.03, 0.195, 0.90, 0.285),
+            "name": (0.03, 0.355, 0.90, 0.445),
+            "date_of_birth": (0.03, 0.515, 0.48, 0.605),
+            "blood_group": (0.49, 0.515, 0.90, 0.605),
+            "issue_date": (0.03, 0.675, 0.48, 0.765),
+            "expiry_date": (0.49, 0.675, 0.90, 0.765),
+        },
+    },
+    "Passport": {
+        "anchor": ((0.10, 0.0, 0.90, 0.20), ["REPUBLIC", "INDIA", "PASSPORT"]),
+        "fields": {
+            "passport_number": (0.31, 0.215, 0.95, 0.305),
+            "name": (0.31, 0.365, 0.95, 0.455),
+            "nationality": (0.31, 0.515, 0.70, 0.605),
+            "gender": (0.71, 0.515, 0.98, 0.605),
+            "date_of_birth": (0.31, 0.665, 0.70, 0.755),
+            "place_of_issue": (0.31, 0.815, 0.70, 0.905),
+            "expiry_date": (0.71, 0.815, 0.98, 0.905),
+        },
+    },
+}
+
+# Values that must match a pattern to be accepted; the match is returned.
+FIELD_PATTERNS = {
+    "pan_number": r"[A-Z]{5}[0-9]{4}[A-Z]",
+    "aadhaar_number": r"\d{4}\s?\d{4}\s?\d{4}",
+    "passport_number": r"[A-Z][0-9]{7}",
+    "license_number": r"[A-Z]{2}[- ]?\d{13}",
+    "blood_group": r"(?:AB|A|B|O)\s?[+-]",
+    "gender": r"(?i)\b(?:male|female|transgender)\b",
+    "date_of_birth": DATE,
+    "issue_date": DATE,
+    "expiry_date": DATE,
+}
+
+
+# Free-text name fields have no pattern, so a value is only accepted when
+# it reads as a name: letters, spaces, dots and apostrophes, with at least
+# NAME_MIN_LETTERS letters. Anything else sends the card to the full
+# pipeline.
+NAME_FIELDS = ("name", "father_name")
+NAME_PATTERN = r"[A-Z][A-Z .']*"
+NAME_MIN_LETTERS = 3
+
+
+def has_template(document_type):
+    return document_type in TEMPLATES
+
+# ============================================================
+# ALIGNMENT
+# ============================================================
+
+def _order_corners(points):
+    # top-left, top-right, bottom-right, bottom-left
+    s = points.sum(axis=1)
+    d = np.diff(points, axis=1).ravel()
+    return np.array([
+        points[np.argmin(s)], points[np.argmin(d)],
+        points[np.argmax(s)], points[np.argmax(d)],
+    ], dtype=np.float32)
+
+
+def _warp_to_card(gray, corners):
+    w, h = CARD_SIZE
+    corners = _order_corners(corners)
+    # A card lying on its side: make the long edge the top one.
+    if np.linalg.norm(corners[1] - corners[0]) < np.linalg.norm(corners[3] - corners[0]):
+        corners = np.roll(corners, 1, axis=0)
+    target = np.array([[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]], dtype=np.float32)
+    M = cv2.getPerspectiveTransform(corners, target)
+    return cv2.warpPerspective(gray, M, CARD_SIZE, flags=cv2.INTER_LINEAR,
+                               borderMode=cv2.BORDER_REPLICATE)
+
+
+def _card_shaped(width, height):
+    if min(width, height) == 0:
+        return False
+    aspect = max(width, height) / min(width, height)
+    return abs(aspect - CARD_ASPECT) / CARD_ASPECT <= ASPECT_TOLERANCE
+
+
+def locate_card(gray):
+    """
+    The card warped upright to CARD_SIZE, or None when no card-shaped
+    outline is found. A page that is itself card-shaped (a photo or
+    crop of the card) is used as is.
+    """
+    h, w = gray.shape[:2]
+
+    # Outlines are searched on a small copy; corners are scaled back.
+    scale = min(1.0, 1000 / max(h, w))
+    small = cv2.resize(gray, (round(w * scale), round(h * scale)),
+                       interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+
+    edges = cv2.Canny(cv2.GaussianBlur(small, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    min_area = MIN_CARD_AREA * small.shape[0] * small.shape[1]
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        if cv2.contourArea(contour) < min_area:
+            break
+        rect = cv2.minAreaRect(contour)
+        if _card_shaped(*rect[1]):
+            corners = cv2.boxPoints(rect) / scale
+            return _warp_to_card(gray, corners)
+
+    if _card_shaped(w, h):
+        corners = np.array([[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]], dtype=np.float32)
+        return _warp_to_card(gray, corners)
+
+    return None
+
+# ============================================================
+# FIELD OCR
+# ============================================================
+
+def _crop(card, region):
+    w, h = CARD_SIZE
+    x0, y0, x1, y1 = region
+    return card[int(y0 * h):int(y1 * h), int(x0 * w):int(x1 * w)]
+
+
+def _read_region(card, region):
+    """
+    (text, mean confidence) of one region, lines joined left to right.
+    """
+    results = get_reader().readtext(_crop(card, region), detail=1, paragraph=False)
+    if not results:
+        return "", 0.0
+    results.sort(key=lambda r: (r[0][0][1] // 20, r[0][0][0]))
+    text = " ".join(t.strip() for _, t, _ in results if t.strip())
+    return text, sum(float(c) for _, _, c in results) / len(results)
+
+
+def _clean_value(field, text):
+    if field in NAME_FIELDS:
+        value = " ".join(text.upper().split()).strip(" :.-")
+        letters = sum(ch.isalpha() for ch in value)
+        if letters < NAME_MIN_LETTERS or not re.fullmatch(NAME_PATTERN, value):
+            return None
+        return value
+
+    pattern = FIELD_PATTERNS.get(field)
+    if pattern is None:
+        return text.strip(" :.-") or None
+    match = re.search(pattern, text.upper() if field != "gender" else text)
+    if not match:
+        return None
+    value = match.group()
+    return value.capitalize() if field == "gender" else value
+
+
+def _anchor_matches(card, anchor):
+    region, keywords = anchor
+    text, _ = _read_region(card, region)
+    text = text.upper()
+    return any(keyword in text for keyword in keywords)
+
+
+def read_card_fields(image, document_type):
+    """
+    Read the template fields of one page (or card image).
+
+    Returns None when the card cannot be aligned, else
+    {"fields": {key: value or None}, "confidence": {key: float}}.
+    Runs inside the OCR pool.
+    """
+    template = TEMPLATES[document_type]
+
+    with metrics.stage_timer("align"):
+        card = locate_card(to_gray(np.asarray(image)))
+
+    if card is None:
+        return None
+
+    with metrics.stage_timer("roi_ocr"):
+        if not _anchor_matches(card, template["anchor"]):
+            # Upside-down scans are common enough to try once.
+            card = cv2.rotate(card, cv2.ROTATE_180)
+            if not _anchor_matches(card, template["anchor"]):
+                return None
+
+        fields, confidence = {}, {}
+        for field, region in template["fields"].items():
+            text, conf = _read_region(card, region)
+            value = _clean_value(field, text) if conf >= TEMPLATE_MIN_CONFIDENCE else None
+            fields[field] = value
+            confidence[field] = round(conf, 3)
+
+    return {"fields": fields, "confidence": confidence}
@@ -0,0 +1,6 @@
+# The NER modules import each other as top-level modules (they run from
+# this directory), so the tests do the same.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,89 @@
+import os
+import json
+
+from bulk_ingest import Checkpoint, JsonlShards, DONE, FAILED
+
+
+def result_row(n, status=DONE):
+    return {"id": f"d{n}.pdf", "path": f"/in/d{n}.pdf", "dedupe_key": f"k{n}",
+            "status": status, "result": {"n": n}}
+
+
+def crashed_run(out, shard_size=100):
+    """
+    A run that checkpointed d0-d1 and then died with d2-d3 written to the
+    shard (and flushed by the OS) but not checkpointed, half-way through
+    writing d4.
+    """
+    checkpoint = Checkpoint(os.path.join(out, "checkpoint.sqlite3"))
+    shards = JsonlShards(out, shard_size)
+    for n in range(2):
+        shards.add(result_row(n))
+    checkpoint.commit(shards.flush())
+    for n in range(2, 4):
+        shards.add(result_row(n))
+    shards.file.write('{"id": "d4.pdf", "sta')
+    shards.file.close()
+    checkpoint.close()
+
+
+def shard_ids(out):
+    ids = []
+    for name in sorted(os.listdir(out)):
+        if name.startswith("results-"):
+            with open(os.path.join(out, name)) as f:
+                ids += [json.loads(line)["id"] for line in f]
+    return ids
+
+
+def test_uncheckpointed_rows_are_recovered(tmp_path):
+    out = str(tmp_path)
+    crashed_run(out)
+
+    checkpoint = Checkpoint(os.path.join(out, "checkpoint.sqlite3"))
+    assert checkpoint.finished() == {"d0.pdf", "d1.pdf"}
+
+    recovered = JsonlShards(out, 100).recover(checkpoint.shards())
+    assert [row["id"] for row in recovered] == ["d2.pdf", "d3.pdf"]
+
+    checkpoint.commit(recovered)
+    assert checkpoint.finished() == {"d0.pdf", "d1.pdf", "d2.pdf", "d3.pdf"}
+    assert checkpoint.originals()["k3"] == "d3.pdf"
+
+
+def test_partial_last_line_is_truncated(tmp_path):
+    out = str(tmp_path)
+    crashed_run(out)
+    checkpoint = Checkpoint(os.path.join(out, "checkpoint.sqlite3"))
+
+    JsonlShards(out, 100).recover(checkpoint.shards())
+
+    assert shard_ids(out) == ["d0.pdf", "d1.pdf", "d2.pdf", "d3.pdf"]
+
+
+def test_nothing_to_recover_after_a_clean_run(tmp_path):
+    out = str(tmp_path)
+    checkpoint = Checkpoint(os.path.join(out, "checkpoint.sqlite3"))
+    shards = JsonlShards(out, 2)
+    for n in range(5):
+        checkpoint.commit(shards.add(result_row(n)))
+    checkpoint.commit(shards.close())
+
+    assert JsonlShards(out, 2).recover(checkpoint.shards()) == []
+
+
+def test_older_rows_superseded_by_a_retry_are_not_recovered(tmp_path):
+    out = str(tmp_path)
+    checkpoint = Checkpoint(os.path.join(out, "checkpoint.sqlite3"))
+    first = JsonlShards(out, 100)
+    first.add(result_row(0, FAILED))
+    checkpoint.commit(first.close())
+
+    # --retry-failed: d0 done in a new shard and checkpointed there.
+    second = JsonlShards(out, 100)
+    second.add(result_row(0))
+    checkpoint.commit(second.close())
+
+    assert JsonlShards(out, 100).recover(checkpoint.shards()) == []
+    assert checkpoint.finished(retry_failed=True) == {"d0.pdf"}
+
@@ -0,0 +1,227 @@
+import os
+import sys
+import time
+import types
+import threading
+
+import pytest
+
+import job_queue
+import job_worker
+from job_queue import JobQueue, QUEUED, RUNNING, DONE, FAILED
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def age_heartbeat(queue, job_id, seconds):
+    queue._db().execute(
+        "UPDATE jobs SET heartbeat_at = heartbeat_at - ? WHERE id = ?",
+        (seconds, job_id)
+    )
+
+
+def row(queue, job_id):
+    return queue._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def test_nothing_is_created_until_first_use(tmp_path):
+    path = tmp_path / "data" / "jobs.sqlite3"
+    queue = JobQueue(str(path))
+    assert not path.parent.exists()
+
+    assert queue.claim("w") is None
+    assert path.exists()
+
+
+@pytest.mark.skipif(os.path.isabs(os.getenv("JOB_DB", "")), reason="JOB_DB set to an absolute path")
+def test_relative_job_db_resolves_under_the_data_dir():
+    assert os.path.isabs(job_queue.JOB_DB)
+    assert os.path.dirname(job_queue.JOB_DB) == job_queue.NER_DATA_DIR
+
+
+def test_claim_takes_the_oldest_queued_job(queue):
+    _, first = queue.submit([(b"one", "a.pdf", "PAN")])
+    _, second = queue.submit([(b"two", "b.pdf", "Aadhaar")])
+
+    job = queue.claim("w1")
+    assert job == {"id": first[0], "filename": "a.pdf",
+                   "document_type": "PAN", "payload": b"one"}
+    assert queue.claim("w2")["id"] == second[0]
+    assert queue.claim("w3") is None
+
+    stored = row(queue, first[0])
+    assert stored["status"] == RUNNING
+    assert stored["worker"] == "w1"
+    assert stored["attempts"] == 1
+
+
+def test_concurrent_claims_never_share_a_job(queue):
+    _, ids = queue.submit([(b"x", f"{i}.pdf", "PAN") for i in range(20)])
+    claimed = []
+    lock = threading.Lock()
+
+    def work(worker):
+        while True:
+            job = queue.claim(worker)
+            if job is None:
+                return
+            with lock:
+                claimed.append(job["id"])
+
+    threads = [threading.Thread(target=work, args=(f"w{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(claimed) == sorted(ids)
+
+
+def test_complete_stores_the_result_and_drops_the_payload(queue):
+    batch_id, (job_id,) = queue.submit([(b"pdf", "a.pdf", "PAN")])
+    queue.claim("w")
+    queue.progress(job_id, 1, 2)
+    assert queue.get(job_id)["pages_done"] == 1
+
+    queue.complete(job_id, {"pan_number": "ABCDE1234F"})
+
+    job = queue.get(job_id)
+    assert job["status"] == DONE
+    assert job["extracted_entities"] == {"pan_number": "ABCDE1234F"}
+    assert row(queue, job_id)["payload"] is None
+    assert queue.batch(batch_id)["finished"] is True
+
+
+def test_fail_records_the_error(queue):
+    _, (job_id,) = queue.submit([(b"pdf", "a.pdf", "PAN")])
+    queue.claim("w")
+    queue.fail(job_id, "boom")
+
+    job = queue.get(job_id)
+    assert job["status"] == FAILED
+    assert job["error"] == "boom"
+
+
+def test_batch_counts_statuses(queue):
+    batch_id, ids = queue.submit([(b"x", f"{i}.pdf", "PAN") for i in range(3)])
+    queue.claim("w")
+    queue.complete(ids[0], {})
+
+    batch = queue.batch(batch_id)
+    assert batch["counts"] == {DONE: 1, QUEUED: 2}
+    assert batch["finished"] is False
+    assert [job["job_id"] for job in batch["jobs"]] == ids
+    assert queue.batch("missing") is None
+    assert queue.get("missing") is None
+
+
+def test_stale_running_job_is_reclaimed(queue):
+    _, (job_id,) = queue.submit([(b"pdf", "a.pdf", "PAN")])
+    queue.claim("lost")
+    assert queue.claim("w2") is None
+
+    age_heartbeat(queue, job_id, job_queue.JOB_STALE_SECONDS + 1)
+    job = queue.claim("w2")
+
+    assert job["id"] == job_id
+    stored = row(queue, job_id)
+    assert stored["worker"] == "w2"
+    assert stored["attempts"] == 2
+
+
+def test_heartbeat_keeps_a_running_job(queue):
+    _, (job_id,) = queue.submit([(b"pdf", "a.pdf", "PAN")])
+    queue.claim("w")
+    age_heartbeat(queue, job_id, job_queue.JOB_STALE_SECONDS + 1)
+
+    queue.heartbeat(job_id)
+
+    assert queue.claim("w2") is None
+    assert row(queue, job_id)["heartbeat_at"] > time.time() - 5
+
+
+def test_heartbeat_does_not_touch_finished_jobs(queue):
+    _, (job_id,) = queue.submit([(b"pdf", "a.pdf", "PAN")])
+    queue.claim("w")
+    queue.complete(job_id, {})
+    finished = row(queue, job_id)["heartbeat_at"]
+
+    queue.heartbeat(job_id)
+
+    assert row(queue, job_id)["heartbeat_at"] == finished
+
+
+def test_job_lost_too_many_times_fails(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 2)
+    _, (job_id,) = queue.submit([(b"pdf", "a.pdf", "PAN")])
+
+    for _ in range(2):
+        assert queue.claim("w")["id"] == job_id
+        age_heartbeat(queue, job_id, job_queue.JOB_STALE_SECONDS + 1)
+
+    assert queue.claim("w") is None
+    job = queue.get(job_id)
+    assert job["status"] == FAILED
+    assert job["error"] == "Worker lost too many times"
+
+
+@pytest.fixture
+def extraction(monkeypatch):
+    """
+    A stand-in extraction module for run_job; `result` is returned, or
+    raised when it is an exception.
+    """
+    module = types.ModuleType("extraction")
+    module.result = {}
+    module.delay = 0.0
+
+    def extract_document(payload, filename, document_type, on_page=None):
+        time.sleep(module.delay)
+        if isinstance(module.result, Exception):
+            raise module.result
+        return module.result
+
+    module.extract_document = extract_document
+    monkeypatch.setitem(sys.modules, "extraction", module)
+    return module
+
+
+def test_run_job_heartbeats_through_extraction(queue, extraction, monkeypatch):
+    beats = []
+    monkeypatch.setattr(job_worker, "JOB_HEARTBEAT_SECONDS", 0.01)
+    monkeypatch.setattr(queue, "heartbeat", beats.append)
+    extraction.delay = 0.2
+    extraction.result = {"name": "A"}
+    queue.submit([(b"pdf", "a.pdf", "PAN")])
+    job = queue.claim("w")
+
+    job_worker.run_job(queue, job)
+
+    assert len(beats) >= 3
+    assert queue.get(job["id"])["extracted_entities"] == {"name": "A"}
+
+
+def test_run_job_records_extraction_errors(queue, extraction):
+    extraction.result = ValueError("bad pdf")
+    queue.submit([(b"pdf", "a.pdf", "PAN")])
+    job = queue.claim("w")
+
+    job_worker.run_job(queue, job)
+
+    assert queue.get(job["id"])["error"] == "bad pdf"
+
+
+def test_run_job_does_not_fail_a_job_when_complete_fails(queue, extraction, monkeypatch):
+    def complete(job_id, result):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(queue, "complete", complete)
+    queue.submit([(b"pdf", "a.pdf", "PAN")])
+    job = queue.claim("w")
+
+    with pytest.raises(RuntimeError):
+        job_worker.run_job(queue, job)
+    assert queue.get(job["id"])["status"] == RUNNING
@@ -0,0 +1,89 @@
+import pytest
+
+from json_stream import JsonStreamParser, parse
+
+
+def feed_all(parser, chunks):
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser
+
+
+def test_plain_object():
+    assert parse('{"name": "RAM KUMAR", "age": 30}') == ({"name": "RAM KUMAR", "age": 30}, "ok")
+
+
+def test_fenced_object_with_trailing_prose():
+    text = 'Here you go:\n```json\n{"a": [1, 2], "b": "x}"}\n```\nHope this helps.'
+    assert parse(text) == ({"a": [1, 2], "b": "x}"}, "ok")
+
+
+def test_array():
+    assert parse('[{"a": 1}, {"a": 2}]') == ([{"a": 1}, {"a": 2}], "ok")
+
+
+def test_object_split_into_chunks():
+    text = '{"name": "RAM \\"R\\" KUMAR", "ids": {"pan": "ABCDE1234F"}}'
+    parser = feed_all(JsonStreamParser(), [text[i:i + 3] for i in range(0, len(text), 3)])
+    assert parser.result() == ({"name": 'RAM "R" KUMAR', "ids": {"pan": "ABCDE1234F"}}, "ok")
+
+
+def test_garbage_prefix_bracket_before_object():
+    text = 'Note [see below]: {"a": 1}'
+    assert parse(text, expect="{") == ({"a": 1}, "ok")
+    # Without expect the bracket is taken first; the old outermost-{}
+    # parse still recovers the object.
+    assert parse(text) == ({"a": 1}, "repaired")
+
+
+def test_truncated_object_keeps_complete_members():
+    value, status = parse('{"name": "RAM", "pan": "ABCDE12')
+    assert (value, status) == ({"name": "RAM"}, "repaired")
+
+
+def test_truncated_object_is_closed():
+    assert parse('{"name": "RAM", "ids": [1, 2') == ({"name": "RAM", "ids": [1, 2]}, "repaired")
+
+
+def test_malformed_member_is_dropped():
+    assert parse('{"a": 1, "b": nope, "c": 3}') == ({"a": 1, "c": 3}, "repaired")
+
+
+@pytest.mark.parametrize("text", ["", "no json here", "{{{", None])
+def test_garbage_fails(text):
+    assert parse(text) == (None, "failed")
+
+
+def test_has_members_counts_the_last_member_once_its_value_closes():
+    parser = JsonStreamParser("{")
+    parser.feed('{"name": "RAM')
+    assert not parser.has_members(["name"])
+    parser.feed(' KUMAR", "pan": "ABCDE1234F"')
+    assert parser.has_members(["name", "pan"])
+
+    parser.stop()
+    assert parser.result() == ({"name": "RAM KUMAR", "pan": "ABCDE1234F"}, "ok")
+
+
+def test_has_members_waits_for_the_end_of_a_number():
+    parser = JsonStreamParser("{")
+    parser.feed('{"a": "x", "n": 12')
+    assert not parser.has_members(["a", "n"])
+    parser.feed("3\n")
+    assert parser.has_members(["a", "n"])
+    parser.stop()
+    assert parser.result() == ({"a": "x", "n": 123}, "ok")
+
+
+def test_has_members_nested_value():
+    parser = JsonStreamParser("{")
+    parser.feed('{"0": {"name": "A"}, "1": {"name": "B"')
+    assert not parser.has_members(["0", "1"])
+    parser.feed("}")
+    assert parser.has_members(["0", "1"])
+
+
+def test_feed_after_done_is_ignored():
+    parser = feed_all(JsonStreamParser(), ['{"a": 1}', ' {"b": 2}'])
+    assert parser.done
+    assert parser.result() == ({"a": 1}, "ok")
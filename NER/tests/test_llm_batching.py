@@ -0,0 +1,183 @@
+import re
+import time
+import threading
+
+import pytest
+
+import metrics
+import llm_batching
+from llm_batching import Batcher, BatchItem, run_batched, chunk_items
+from llm_client import GeminiError, text_part
+
+
+def item(doc_id, text=" page text" * 4):
+    return BatchItem(
+        intro=f"ID:{doc_id}",
+        parts=[text_part(text)],
+        schema={"name": None},
+        single=[text_part(f"ID:{doc_id}"), text_part(text)],
+    )
+
+
+class FakeGemini:
+    """
+    Stands in for generate_json: answers {"name": <id>} for each document
+    of the request, minus those in `drop`, and records the ids sent.
+    """
+
+    def __init__(self, drop=(), error=None, garbage=False):
+        self.calls = []
+        self.drop = set(drop)
+        self.error = error
+        self.garbage = garbage
+        self.lock = threading.Lock()
+
+    def __call__(self, parts, generation_config=None, keys=None):
+        ids = re.findall(r"ID:(\w+)", "".join(p.get("text", "") for p in parts))
+        with self.lock:
+            self.calls.append(ids)
+        trace = metrics.current_trace()
+        if trace is not None:
+            trace.add_gemini(requests=1, prompt_tokens=100)
+        if self.error:
+            raise self.error
+        if self.garbage:
+            return None
+        if keys == ["name"]:
+            return {"name": ids[0]}
+        return {str(i): {"name": doc_id} for i, doc_id in enumerate(ids)
+                if doc_id not in self.drop}
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    def install(**kwargs):
+        fake = FakeGemini(**kwargs)
+        monkeypatch.setattr(llm_batching, "generate_json", fake)
+        return fake
+    return install
+
+
+def run_documents(batcher, ids, submit=None):
+    """
+    Run one thread per id, each registered with batcher.document() before
+    any of them submits. Returns {id: answer or exception}, {id: Trace}.
+    """
+    submit = set(ids if submit is None else submit)
+    registered = threading.Barrier(len(ids))
+    results, traces = {}, {doc_id: metrics.Trace(doc_id) for doc_id in ids}
+
+    def document(doc_id):
+        with metrics.tracing(traces[doc_id]), batcher.document():
+            registered.wait()
+            if doc_id not in submit:
+                time.sleep(0.3)
+                return
+            try:
+                results[doc_id] = batcher.submit(item(doc_id))
+            except Exception as e:
+                results[doc_id] = e
+
+    threads = [threading.Thread(target=document, args=(doc_id,)) for doc_id in ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results, traces
+
+
+def test_concurrent_documents_share_one_request(gemini):
+    fake = gemini()
+    start = time.monotonic()
+    results, _ = run_documents(Batcher("HEADER", size=4, wait_ms=5000), ["a", "b", "c"])
+
+    assert results == {doc_id: {"name": doc_id} for doc_id in "abc"}
+    assert [sorted(call) for call in fake.calls] == [["a", "b", "c"]]
+    # Sent once everyone was waiting, not after wait_ms.
+    assert time.monotonic() - start < 2
+
+
+def test_batches_never_exceed_size(gemini):
+    fake = gemini()
+    ids = ["a", "b", "c", "d", "e"]
+    results, _ = run_documents(Batcher("HEADER", size=2, wait_ms=5000), ids)
+
+    assert results == {doc_id: {"name": doc_id} for doc_id in ids}
+    assert all(len(call) <= 2 for call in fake.calls)
+    assert sorted(doc_id for call in fake.calls for doc_id in call) == ids
+
+
+def test_uploads_with_their_own_batcher_never_share_a_request(gemini):
+    fake = gemini()
+    uploads = [
+        threading.Thread(target=run_documents, args=(Batcher("HEADER", size=4, wait_ms=300), ids))
+        for ids in (["a", "b"], ["c", "d"])
+    ]
+    for upload in uploads:
+        upload.start()
+    for upload in uploads:
+        upload.join(10)
+
+    assert sorted(map(sorted, fake.calls)) == [["a", "b"], ["c", "d"]]
+
+
+def test_waits_at_most_wait_ms_for_a_document_that_never_submits(gemini):
+    fake = gemini()
+    start = time.monotonic()
+    results, _ = run_documents(Batcher("HEADER", size=4, wait_ms=100), ["a", "b"], submit=["a"])
+    elapsed = time.monotonic() - start
+
+    assert results == {"a": {"name": "a"}}
+    assert fake.calls == [["a"]]
+    assert elapsed < 0.3 + 1
+
+
+def test_document_missing_from_a_batch_is_retried_alone(gemini):
+    fake = gemini(drop=["b"])
+    results, _ = run_documents(Batcher("HEADER", size=4, wait_ms=5000), ["a", "b"])
+
+    assert results == {"a": {"name": "a"}, "b": {"name": "b"}}
+    assert sorted(map(sorted, fake.calls)) == [["a", "b"], ["b"]]
+
+
+def test_request_error_is_raised_to_every_document(gemini):
+    gemini(error=GeminiError("Gemini API error 400"))
+    results, _ = run_documents(Batcher("HEADER", size=4, wait_ms=5000), ["a", "b"])
+
+    assert all(isinstance(result, GeminiError) for result in results.values())
+    assert set(results) == {"a", "b"}
+
+
+def test_unusable_answer_comes_back_as_none(gemini):
+    gemini(garbage=True)
+    results, _ = run_documents(Batcher("HEADER", size=4, wait_ms=5000), ["a", "b"])
+    assert results == {"a": None, "b": None}
+
+
+def test_shared_request_usage_is_split_over_the_documents(gemini):
+    fake = gemini()
+    _, traces = run_documents(Batcher("HEADER", size=4, wait_ms=5000), ["a", "b"])
+
+    assert len(fake.calls) == 1
+    usage = [trace.to_dict()["gemini"] for trace in traces.values()]
+    assert sum(u["requests"] for u in usage) == pytest.approx(1, abs=0.01)
+    assert sum(u["prompt_tokens"] for u in usage) == pytest.approx(100, abs=0.01)
+    assert all(u["requests"] < 1 for u in usage)
+
+
+def test_size_one_sends_each_document_alone(gemini):
+    fake = gemini()
+    results, _ = run_documents(Batcher("HEADER", size=1), ["a", "b"])
+    assert results == {"a": {"name": "a"}, "b": {"name": "b"}}
+    assert sorted(fake.calls) == [["a"], ["b"]]
+
+
+def test_run_batched_and_chunking(gemini):
+    fake = gemini()
+    items = [item(doc_id) for doc_id in "abcde"]
+    assert [list(b) for b in chunk_items(items, size=2)] == [[0, 1], [2, 3], [4]]
+    assert [list(b) for b in chunk_items(items, size=10, max_tokens=1)] == [[0], [1], [2], [3], [4]]
+
+    results = run_batched("HEADER", items, size=2)
+    assert results == [{"name": doc_id} for doc_id in "abcde"]
+    assert sorted(map(sorted, fake.calls)) == [["a", "b"], ["c", "d"], ["e"]]
@@ -0,0 +1,119 @@
+import json
+import time
+import asyncio
+
+import httpx
+import pytest
+
+from llm_client import GeminiClient, GeminiError, text_part
+
+
+def answer(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+class SlowBody(httpx.AsyncByteStream):
+    """
+    Response body sent in pieces, `gap` seconds apart: every read is
+    quick, the whole response is not.
+    """
+
+    def __init__(self, chunks, gap):
+        self.chunks = chunks
+        self.gap = gap
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.gap)
+            yield chunk
+
+
+def make_client(handler, **kwargs):
+    kwargs.setdefault("max_retries", 0)
+    kwargs.setdefault("rate_per_sec", 0)
+    client = GeminiClient(api_url="http://gemini/m:generateContent",
+                          stream_url="http://gemini/m:streamGenerateContent",
+                          api_key=None, **kwargs)
+    client._ensure_loop()
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+@pytest.fixture
+def clients():
+    made = []
+    yield lambda handler, **kwargs: made.append(make_client(handler, **kwargs)) or made[-1]
+    for client in made:
+        client.close()
+
+
+def test_generate_returns_the_answer_text(clients):
+    client = clients(lambda request: httpx.Response(200, json=answer("hi")))
+    assert client.generate([text_part("x")]) == "hi"
+
+
+def test_timeout_bounds_a_slowly_dripping_response(clients):
+    body = json.dumps(answer("late")).encode()
+    pieces = [body[i:i + 8] for i in range(0, len(body), 8)]
+
+    def handler(request):
+        return httpx.Response(200, stream=SlowBody(pieces, 0.05))
+
+    client = clients(handler, timeout=0.2)
+    started = time.perf_counter()
+    with pytest.raises(GeminiError):
+        client.generate([text_part("x")])
+    assert time.perf_counter() - started < 1
+
+
+def test_deadline_bounds_retries(clients, monkeypatch):
+    import llm_client
+
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF_BASE", 0.1)
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        return httpx.Response(503, text="busy")
+
+    client = clients(handler, max_retries=100, deadline=0.5)
+    started = time.perf_counter()
+    with pytest.raises(GeminiError, match="deadline"):
+        client.generate([text_part("x")])
+    assert time.perf_counter() - started < 1.5
+    assert 1 < len(calls) < 100
+
+
+def test_generate_many_applies_the_deadline_per_request(clients):
+    async def handler(request):
+        if b"slow" in request.content:
+            await asyncio.sleep(1)
+        return httpx.Response(200, json=answer("ok"))
+
+    client = clients(handler, deadline=0.3)
+    fast, slow = client.generate_many([[text_part("fast")], [text_part("slow")]])
+    assert fast == "ok"
+    assert isinstance(slow, GeminiError)
+
+
+def sse(*texts):
+    return [f"data: {json.dumps(answer(t))}\n\n".encode() for t in texts]
+
+
+def test_stream_keeps_the_text_read_before_a_timeout(clients):
+    def handler(request):
+        return httpx.Response(200, stream=SlowBody(sse("{\"a\": ", "1", "}"), 0.15))
+
+    client = clients(handler, timeout=0.35)
+    chunks = []
+    text = client.generate_stream([text_part("x")], lambda t: chunks.append(t))
+    assert text == "{\"a\": 1"
+    assert chunks == ["{\"a\": ", "1"]
+
+
+def test_stream_stops_when_asked(clients):
+    def handler(request):
+        return httpx.Response(200, stream=SlowBody(sse("a", "b", "c"), 0.01))
+
+    client = clients(handler)
+    assert client.generate_stream([text_part("x")], lambda t: t == "b") == "ab"
@@ -0,0 +1,259 @@
+import time
+import threading
+from io import BytesIO
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, make_cache_key, pipeline_settings, pipeline_fingerprint
+
+
+RESULT = {"extracted_entities": {"name": "RAM"}, "page_sources": ["ocr", "ocr"]}
+
+
+# ---------------- keying ----------------
+
+def test_key_covers_bytes_type_and_threshold():
+    key = make_cache_key(b"pdf", "PAN", 0.65)
+    assert key == make_cache_key(b"pdf", "PAN", 0.65)
+    assert key != make_cache_key(b"pdf2", "PAN", 0.65)
+    assert key != make_cache_key(b"pdf", "Aadhaar", 0.65)
+    assert key != make_cache_key(b"pdf", "PAN", 0.7)
+
+
+def test_threshold_spelling_does_not_matter():
+    assert make_cache_key(b"pdf", "PAN", 1) == make_cache_key(b"pdf", "PAN", 1.0)
+
+
+def test_key_covers_the_pipeline_fingerprint():
+    key = make_cache_key(b"pdf", "PAN", 0.65)
+    assert key == make_cache_key(b"pdf", "PAN", 0.65, result_cache.PIPELINE_FINGERPRINT)
+    assert key != make_cache_key(b"pdf", "PAN", 0.65, "other")
+
+
+@pytest.mark.parametrize("setting, value", [
+    ("template_ocr", "flip"),
+    ("page_routing", "flip"),
+    ("gemini_model", "gemini-other"),
+    ("dpi", 200),
+    ("adaptive_dpi", "flip"),
+    ("adaptive_low_dpi", 100),
+    ("version", -1),
+])
+def test_fingerprint_changes_with_each_setting(setting, value):
+    settings = pipeline_settings()
+    assert setting in settings
+    changed = dict(settings)
+    changed[setting] = (not settings[setting]) if value == "flip" else value
+    assert pipeline_fingerprint(changed) != pipeline_fingerprint(settings)
+
+
+def test_fingerprint_is_stable():
+    assert pipeline_fingerprint() == result_cache.PIPELINE_FINGERPRINT
+
+
+# ---------------- memory tier ----------------
+
+def test_get_returns_a_fresh_copy():
+    cache = ResultCache(db_path=None)
+    cache.put("k", RESULT)
+    first = cache.get("k")
+    first["extracted_entities"]["name"] = "changed"
+    assert cache.get("k") == RESULT
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2, db_path=None)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["memory_entries"] == 2
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    cache = ResultCache(ttl=10, db_path=None)
+    cache.put("k", 1)
+    now = time.time()
+    monkeypatch.setattr(result_cache.time, "time", lambda: now + 11)
+
+    assert cache.get("k") is None
+    assert cache.stats()["memory_entries"] == 0
+
+
+def test_stats_count_hits_and_misses():
+    cache = ResultCache(db_path=None)
+    cache.get("k")
+    cache.put("k", 1)
+    cache.get("k")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+# ---------------- disk tier ----------------
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    ResultCache(db_path=path).put("k", RESULT)
+
+    cache = ResultCache(db_path=path)
+    assert cache.get("k") == RESULT
+    assert cache.disk_hits == 1
+    assert cache.get("k") == RESULT
+    assert cache.memory_hits == 1
+
+
+def test_disk_tier_evicts_least_recently_used_over_the_cap(tmp_path, monkeypatch):
+    value = "x" * 100
+    size = len('"' + value + '"')
+    cache = ResultCache(max_entries=0, db_path=str(tmp_path / "r.sqlite3"),
+                        db_max_bytes=2 * size)
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(result_cache.time, "time", lambda: next(clock))
+
+    cache.put("a", value)
+    cache.put("b", value)
+    cache.get("a")
+    cache.put("c", value)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == value
+    assert cache.get("c") == value
+    assert cache.stats()["disk_entries"] == 2
+
+
+def test_disk_tier_drops_expired_rows(tmp_path, monkeypatch):
+    cache = ResultCache(ttl=10, db_path=str(tmp_path / "r.sqlite3"))
+    now = time.time()
+    cache.put("old", 1)
+    monkeypatch.setattr(result_cache.time, "time", lambda: now + 11)
+    cache.put("new", 2)
+
+    assert cache.stats()["disk_entries"] == 1
+
+
+def test_clear_empties_both_tiers(tmp_path):
+    cache = ResultCache(db_path=str(tmp_path / "r.sqlite3"))
+    cache.put("k", 1)
+    cache.clear()
+    assert cache.get("k") is None
+    assert cache.stats()["disk_entries"] == 0
+
+
+# ---------------- cached_process_pdf ----------------
+
+class FakePipeline:
+    def __init__(self, result=RESULT, delay=0.0, error=None):
+        self.result = result
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, file_stream, document_type, confidence_threshold, on_page=None):
+        with self.lock:
+            self.calls += 1
+            error, self.error = self.error, None  # fails once
+        time.sleep(self.delay)
+        if error is not None:
+            raise error
+        return dict(self.result)
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    monkeypatch.setattr(result_cache, "result_cache", ResultCache(db_path=None))
+    fake = FakePipeline()
+    monkeypatch.setattr(result_cache, "process_pdf", fake)
+    return fake
+
+
+def run(data=b"pdf", on_page=None):
+    return result_cache.cached_process_pdf(BytesIO(data), "PAN", on_page=on_page)
+
+
+def test_repeat_upload_is_served_from_the_cache(pipeline):
+    assert run() == RESULT
+    pages = []
+    assert run(on_page=lambda done, total: pages.append((done, total))) == RESULT
+    assert pipeline.calls == 1
+    assert pages == [(2, 2)]
+
+
+def test_empty_extractions_are_not_cached(pipeline):
+    pipeline.result = {"extracted_entities": {"name": ""}}
+    run()
+    run()
+    assert pipeline.calls == 2
+
+
+def test_concurrent_identical_uploads_share_one_run(pipeline):
+    pipeline.delay = 0.2
+    results = []
+
+    def upload():
+        results.append(run())
+
+    threads = [threading.Thread(target=upload) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert pipeline.calls == 1
+    assert results == [RESULT] * 5
+    assert len({id(r) for r in results}) == 5
+    assert result_cache._flights == {}
+
+
+def test_different_uploads_run_concurrently(pipeline):
+    pipeline.delay = 0.2
+    threads = [threading.Thread(target=run, args=(bytes([i]),)) for i in range(3)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert pipeline.calls == 3
+    assert time.perf_counter() - started < 0.5
+
+
+def test_uncacheable_result_is_still_shared(pipeline):
+    pipeline.delay = 0.2
+    pipeline.result = {"extracted_entities": {}}
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert pipeline.calls == 1
+
+
+def test_waiters_retry_when_the_shared_run_fails(pipeline):
+    pipeline.delay = 0.2
+    pipeline.error = RuntimeError("gemini down")
+    outcomes = []
+
+    def upload():
+        try:
+            outcomes.append(run())
+        except RuntimeError as e:
+            outcomes.append(str(e))
+
+    threads = [threading.Thread(target=upload) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert outcomes.count("gemini down") == 1
+    assert outcomes.count(RESULT) == 2
+    assert pipeline.calls == 2
+    assert result_cache._flights == {}
@@ -0,0 +1,189 @@
+import pytest
+
+from rule_extract import (
+    extract_fields, luhn_valid, mrz_check_digit, verhoeff_check_digit,
+    verhoeff_valid, FIELD_RULES,
+)
+
+
+def lines(*texts, confidence=0.9):
+    return [{"text": text, "confidence": confidence} for text in texts]
+
+
+def aadhaar(prefix="23456789012"):
+    return prefix + verhoeff_check_digit(prefix)
+
+
+def grouped(digits):
+    return " ".join(digits[i:i + 4] for i in range(0, len(digits), 4))
+
+
+def rule(field, *texts, document_type=""):
+    return FIELD_RULES[field](lines(*texts), document_type)
+
+# ============================================================
+# CHECKSUMS
+# ============================================================
+
+def test_verhoeff_check_digit_round_trips():
+    for prefix in ("23456789012", "99999999999", "50000000000"):
+        assert verhoeff_valid(prefix + verhoeff_check_digit(prefix))
+
+
+def test_verhoeff_rejects_a_changed_digit():
+    number = aadhaar()
+    changed = number[:-1] + str((int(number[-1]) + 1) % 10)
+    assert not verhoeff_valid(changed)
+
+
+def test_luhn():
+    assert luhn_valid("4111111111111111")
+    assert luhn_valid("79927398713")
+    assert not luhn_valid("4111111111111112")
+
+
+def test_mrz_check_digit_icao_example():
+    assert mrz_check_digit("L898902C3") == "6"
+    assert mrz_check_digit("740812") == "2"
+
+# ============================================================
+# ID NUMBERS
+# ============================================================
+
+def test_pan_number():
+    assert rule("pan_number", "Permanent Account Number", "ABCPE1234F") == ("ABCPE1234F", 0.9)
+    # OCR letter/digit swaps are fixed by position, split tokens rejoined.
+    assert rule("pan_number", "ABCPE I234 F")[0] == "ABCPE1234F"
+
+
+@pytest.mark.parametrize("text", [
+    "ABCXE1234F",            # invalid holder type
+    "NUMBERABCPE1234F",      # glued onto a longer token
+    "ABCPE1234FX",
+    "Permanent Account Number Card",
+])
+def test_pan_number_negatives(text):
+    assert rule("pan_number", text) is None
+
+
+def test_aadhaar_number():
+    number = aadhaar()
+    assert rule("aadhaar_number", grouped(number)) == (grouped(number), 0.9)
+    assert rule("aadhaar_number", "Aadhaar No: " + number)[0] == grouped(number)
+
+
+def test_aadhaar_number_reads_ocr_swaps():
+    number = aadhaar()
+    assert rule("aadhaar_number", grouped(number).replace("0", "O"))[0] == grouped(number)
+
+
+def test_aadhaar_number_rejects_vid_tail():
+    # The last 12 digits of this VID pass Verhoeff on their own.
+    number = aadhaar()
+    for prefix in ("1234", "9876"):
+        assert rule("aadhaar_number", "VID: " + grouped(prefix + number)) is None
+        assert rule("aadhaar_number", prefix + number) is None
+
+
+@pytest.mark.parametrize("text", [
+    grouped(aadhaar()[:-1] + str((int(aadhaar()[-1]) + 1) % 10)),  # checksum
+    grouped("1" + aadhaar("3456789012")),                            # leading 1
+    grouped(aadhaar()) + " 12",                                      # longer run
+    "Enrolment No: 1234/56789/01234",
+])
+def test_aadhaar_number_negatives(text):
+    assert rule("aadhaar_number", text) is None
+
+
+def test_ifsc_code():
+    assert rule("ifsc_code", "IFSC: SBIN0001234")[0] == "SBIN0001234"
+    assert rule("ifsc_code", "ifsc hdfc 0 00O123")[0] == "HDFC000O123"
+
+
+@pytest.mark.parametrize("text", ["SBIN1001234", "SBI0001234", "SBIN00012345", "IFSC CODE"])
+def test_ifsc_code_negatives(text):
+    assert rule("ifsc_code", text) is None
+
+
+def test_card_number():
+    assert rule("card_number", "4111 1111 1111 1111")[0] == "4111 1111 1111 1111"
+    assert rule("card_number", "4111 1111 1111 1112") is None
+
+
+def test_passport_number_after_label():
+    assert rule("passport_number", "Passport No.", "J 8369854")[0] == "J8369854"
+    assert rule("passport_number", "Passport No: J8369854")[0] == "J8369854"
+
+
+def test_passport_number_from_mrz():
+    number = "J8369854<"
+    mrz = number + mrz_check_digit(number) + "IND8001014M2501012<<<<<<<<<<<<<<02"
+    assert rule("passport_number", "P<INDKUMAR<<RAM<<<<<<<<<<<<<<<<<<<<<<<", mrz)[0] == "J8369854"
+
+    wrong = number + str((int(mrz_check_digit(number)) + 1) % 10) + "IND8001014M2501012"
+    assert rule("passport_number", wrong) is None
+
+
+def test_passport_number_ignores_unlabelled_numbers():
+    assert rule("passport_number", "File No S 1234567") is None
+    assert rule("passport_number", "Ref: A1234567") is None
+
+
+def test_license_number():
+    assert rule("license_number", "DL No: MH-12 2011 0012345")[0] == "MH-1220110012345"
+    assert rule("license_number", "MH12 1811 0012345") is None
+
+# ============================================================
+# LABELLED FIELDS
+# ============================================================
+
+def test_account_number():
+    assert rule("account_number", "Account No: 1234 5678 9012")[0] == "123456789012"
+    assert rule("account_number", "Account No: 1234") is None
+
+
+def test_dates():
+    assert rule("date_of_birth", "Date of Birth", "1-2-1990")[0] == "01/02/1990"
+    assert rule("expiry_date", "Valid Till: 31/12/2030")[0] == "31/12/2030"
+    assert rule("date_of_birth", "Date of Birth: 32/01/1990") is None
+
+
+def test_single_date_on_a_card_is_the_date_of_birth():
+    assert rule("date_of_birth", "15/08/1985", document_type="PAN Card")[0] == "15/08/1985"
+    assert rule("date_of_birth", "15/08/1985", document_type="Passport") is None
+    assert rule("date_of_birth", "15/08/1985", "01/01/2020", document_type="PAN Card") is None
+
+
+def test_gender():
+    assert rule("gender", "MALE")[0] == "Male"
+    assert rule("gender", "Sex: F")[0] == "Female"
+    assert rule("gender", "Sex: X") is None
+
+
+def test_blood_group_and_nationality():
+    assert rule("blood_group", "Blood Group: O +")[0] == "O+"
+    assert rule("nationality", "Nationality: Indian")[0] == "INDIAN"
+    assert rule("nationality", "Nationality: 1234") is None
+
+
+def test_names():
+    assert rule("name", "Name: RAM KUMAR")[0] == "RAM KUMAR"
+    assert rule("father_name", "Father's Name", "SHYAM KUMAR")[0] == "SHYAM KUMAR"
+    # The father's name is never read as the holder's.
+    assert rule("name", "Father's Name", "SHYAM KUMAR") is None
+    assert rule("name", "Name", "Date of Birth") is None
+
+
+def test_place_of_issue():
+    assert rule("place_of_issue", "Place of Issue: Mumbai")[0] == "MUMBAI"
+    assert rule("place_of_issue", "Place of Issue", "Nationality") is None
+
+# ============================================================
+# ENGINE
+# ============================================================
+
+def test_extract_fields_skips_low_confidence_and_unknown_fields():
+    ocr = lines("ABCPE1234F", "Date of Birth: 15/08/1985")
+    ocr[0]["confidence"] = 0.3
+    found = extract_fields(ocr, "PAN Card", ["pan_number", "date_of_birth", "signature"])
+    assert found == {"date_of_birth": ("15/08/1985", 0.9)}
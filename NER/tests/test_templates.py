@@ -0,0 +1,160 @@
+import io
+
+import fitz
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+import ocr
+import templates
+from templates import CARD_SIZE, TEMPLATES, locate_card, read_card_fields, _clean_value
+
+
+PAN_FIELDS = {
+    "name": "RAM AGYA PRASAD",
+    "father_name": "SHYAM PRASAD",
+    "date_of_birth": "24/01/1991",
+    "pan_number": "CXRPK9829B",
+}
+
+# Every process_pdf result carries these keys, whichever path made it.
+RESULT_KEYS = {
+    "source", "document_type", "document_confidence", "page_sources", "page_dpi",
+    "page_duplicates", "page_routes", "field_sources", "extracted_entities",
+}
+
+
+def card_on_page(page=(2480, 3508), at=(300, 400)):
+    """
+    A blank ID-1 card outline on a white A4 page at 300 DPI.
+    """
+    img = Image.new("L", page, 255)
+    w, h = CARD_SIZE
+    ImageDraw.Draw(img).rectangle([at[0], at[1], at[0] + w, at[1] + h],
+                                  fill=235, outline=20, width=6)
+    return np.asarray(img)
+
+
+def fake_regions(monkeypatch, texts, confidence=0.9):
+    """
+    _read_region answering from `texts` (region -> text): the card's
+    regions are read without a real OCR reader.
+    """
+    def read(card, region):
+        text = texts.get(region, "")
+        return text, confidence if text else 0.0
+
+    monkeypatch.setattr(templates, "_read_region", read)
+
+
+def pan_texts(**overrides):
+    template = TEMPLATES["PAN Card"]
+    texts = {template["anchor"][0]: "INCOME TAX DEPARTMENT GOVT. OF INDIA"}
+    for field, region in template["fields"].items():
+        texts[region] = overrides.get(field, PAN_FIELDS[field])
+    return texts
+
+
+# ---------------- alignment ----------------
+
+def test_locate_card_finds_the_card_on_a_page():
+    card = locate_card(card_on_page())
+    assert card is not None
+    assert card.shape == (CARD_SIZE[1], CARD_SIZE[0])
+
+
+def test_a_card_shaped_image_is_used_as_is():
+    assert locate_card(np.full((638, 1011), 200, np.uint8)) is not None
+
+
+def test_a_plain_page_has_no_card():
+    assert locate_card(np.full((3508, 2480), 255, np.uint8)) is None
+
+
+# ---------------- fields ----------------
+
+def test_read_card_fields(monkeypatch):
+    fake_regions(monkeypatch, pan_texts())
+    read = read_card_fields(card_on_page(), "PAN Card")
+    assert read["fields"] == PAN_FIELDS
+    assert set(read["confidence"]) == set(PAN_FIELDS)
+
+
+def test_card_without_its_anchor_is_not_read(monkeypatch):
+    texts = pan_texts()
+    texts[TEMPLATES["PAN Card"]["anchor"][0]] = "SOMETHING ELSE"
+    fake_regions(monkeypatch, texts)
+    assert read_card_fields(card_on_page(), "PAN Card") is None
+
+
+def test_low_confidence_fields_are_missing(monkeypatch):
+    fake_regions(monkeypatch, pan_texts(), confidence=templates.TEMPLATE_MIN_CONFIDENCE / 2)
+    read = read_card_fields(card_on_page(), "PAN Card")
+    assert read["fields"] == dict.fromkeys(PAN_FIELDS)
+
+
+@pytest.mark.parametrize("field, text, value", [
+    ("name", " ram  agya prasad. ", "RAM AGYA PRASAD"),
+    ("name", "R4M", None),
+    ("name", "AB", None),
+    ("pan_number", "PAN: cxrpk9829b", "CXRPK9829B"),
+    ("pan_number", "CXRPK98298", None),
+    ("date_of_birth", "DOB 24/01/1991", "24/01/1991"),
+    ("gender", "MALE", "Male"),
+    ("gender", "M", None),
+])
+def test_clean_value(field, text, value):
+    assert _clean_value(field, text) == value
+
+
+# ---------------- process_pdf ----------------
+
+class InlinePool:
+    def call(self, fn, *args):
+        return fn(*args)
+
+
+def scanned_pdf(pages=2):
+    doc = fitz.open()
+    img = Image.fromarray(card_on_page((1240, 1754), (100, 150)))
+    for _ in range(pages):
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=_png(img))
+    return doc.tobytes()
+
+
+def _png(img):
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def template_ocr(monkeypatch):
+    monkeypatch.setattr(ocr, "TEMPLATE_OCR", True)
+    monkeypatch.setattr(ocr, "get_ocr_pool", lambda: InlinePool())
+
+
+def test_process_pdf_takes_the_template_path(template_ocr, monkeypatch):
+    fake_regions(monkeypatch, pan_texts())
+    pages = []
+    result = ocr.process_pdf(io.BytesIO(scanned_pdf(pages=2)), "PAN Card",
+                             on_page=lambda done, total: pages.append((done, total)))
+
+    assert set(result) == RESULT_KEYS | {"field_confidence"}
+    assert result["source"] == "template"
+    assert result["page_sources"] == ["template", None]
+    assert result["page_routes"] == ["template", None]
+    assert result["page_duplicates"] == [None, None]
+    assert result["field_sources"] == dict.fromkeys(ocr.ENTITY_SCHEMAS["PAN Card"], "template")
+    assert result["extracted_entities"]["pan_number"] == "CXRPK9829B"
+    assert pages == [(2, 2)]
+
+
+def test_incomplete_card_falls_back_to_the_full_pipeline(template_ocr, monkeypatch):
+    fake_regions(monkeypatch, pan_texts(pan_number="unreadable"))
+    assert ocr.process_pdf_with_template(scanned_pdf(), "PAN Card") is None
+
+
+def test_documents_without_a_template_skip_it(template_ocr):
+    assert ocr.process_pdf_with_template(scanned_pdf(), "Cheque") is None
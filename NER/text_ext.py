@@ -1,17 +1,18 @@
-import os
 import json
 import base64
-import fitz
-import requests
-import tempfile
-from io import BytesIO
-from PIL import Image
+import logging
 from dotenv import load_dotenv
 
+import metrics
+from llm_client import gemini_client, text_part, image_part, GeminiError
+from image_payload import Payload, encode_upload, iter_pdf_payloads
+from llm_batching import BatchItem, run_batched, string_schema
+import json_stream
+from page_hash import PAGE_HASH
+
 load_dotenv()
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_API_URL = os.getenv("GEMINI_API_URL")
+logger = logging.getLogger(__name__)
 
 getDescriptionPrompt = """You are tasked with extracting and classifying the document type from the provided image and outputting only the named entities in strict JSON format. Follow these rules strictly:
 1. Always include the document_type field with an exact and consistent value for the same type of document (e.g., "PAN Card" for all PAN cards).
@@ -124,137 +125,140 @@ Here are examples for different document types to guide your output:
 For every receipt or document, generate the response in the same format and structure, maintaining consistency for the document_type field. Always ensure the JSON format is valid.
 Important: Do NOT include any fields that are not listed in the examples above. Only output keys exactly matching those shown."""
 
-def pdf_to_images(file_stream, max_images=10):
-    image_buffers = []
+# Several pages in one request: each page is classified on its own and
+# answered with the array format above, keyed by its document number.
+BATCH_HEADER = getDescriptionPrompt + """
 
-    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_pdf:
-        temp_pdf.write(file_stream.read())
-        temp_pdf_path = temp_pdf.name
+Several page images follow, each introduced by a line "=== DOCUMENT <n> ===".
+Treat every page as a separate document and answer each one independently.
+"""
 
-    pdf_document = fitz.open(temp_pdf_path)
-    for page_num in range(min(len(pdf_document), max_images)):
-        page = pdf_document[page_num]
-        pix = page.get_pixmap(dpi=300)
+def iter_pdf_images(file_stream, max_images=10):
+    """
+    Yield page payloads (image_payload.Payload) one at a time, rendered
+    straight from the in-memory PDF bytes into the compressed format sent
+    to Gemini. Pages that look the same as an earlier one are skipped
+    (PAGE_HASH).
+    """
+    yield from iter_pdf_payloads(file_stream.read(), max_pages=max_images,
+                                 distinct=PAGE_HASH)
 
-        img_buffer = BytesIO()
-        img_buffer.name = f"page_{page_num + 1}.png"
-        img_buffer.write(pix.tobytes("png"))
-        img_buffer.seek(0)
-        image_buffers.append(img_buffer)
+def pdf_to_images(file_stream, max_images=10):
+    return list(iter_pdf_images(file_stream, max_images))
 
-    pdf_document.close()
-    os.remove(temp_pdf_path)
-    return image_buffers
+def base64_encode_image(image):
+    """
+    Base64 of a Payload as is; any other image file is decoded and
+    compressed first.
+    """
+    if not isinstance(image, Payload):
+        image = encode_upload(image)
+    return base64.b64encode(image.data).decode("utf-8")
 
-def base64_encode_image(image_bytesio):
-    buffered = BytesIO()
-    image = Image.open(image_bytesio)
-    image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+def gemini_image_request(prompt, base64_image, mime_type="image/png"):
+    return [
+        text_part(prompt),
+        image_part(base64_image, mime_type)
+    ]
 
 def call_gemini_api(prompt, base64_image):
-    headers = {
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {"text": prompt},
-                    {
-                        "inline_data": {
-                            "mime_type": "image/png",
-                            "data": base64_image
-                        }
-                    }
-                ]
-            }
-        ]
-    }
+    try:
+        with metrics.stage_timer("gemini_vision"):
+            response_text = gemini_client.generate(
+                gemini_image_request(prompt, base64_image)
+            )
+    except GeminiError as e:
+        logger.warning("Gemini API error: %s", e)
+        return None
 
-    response = requests.post(
-        f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
-        headers=headers,
-        json=payload
-    )
-
-    if response.status_code == 200:
-        candidates = response.json().get("candidates", [])
-        if candidates:
-            print("Raw Gemini Response:", json.dumps(response.json(), indent=2))
-            return candidates[0]["content"]["parts"][0]["text"]
-    else:
-        print("Gemini API Error:", response.text)
-    return None
+    logger.debug("Raw Gemini response: %s", response_text)
+    return response_text or None
 
 def convert_to_strict_json(response_content):
-    try:
-        response_content = response_content.strip()
-        start_idx = response_content.find("[")
-        end_idx = response_content.rfind("]") + 1
-        if start_idx != -1 and end_idx != -1:
-            return json.loads(response_content[start_idx:end_idx])
-        else:
-            print("Error: JSON boundaries not found.")
-            return []
-    except json.JSONDecodeError:
-        print("Error decoding JSON.")
+    parsed, _ = json_stream.parse(response_content)
+    if parsed is None:
+        logger.warning("Could not decode the Gemini response as JSON")
         return []
+    return parsed if isinstance(parsed, list) else [parsed]
+
+# Fields expected per document type. The OCR path (ocr.py) uses the
+# snake_case ENTITY_SCHEMAS for the same document types.
+EXPECTED_FIELDS_BY_TYPE = {
+    "PAN Card": [
+        "Name",
+        "Date of Birth",
+        "Permanent Account Number",
+        "Address"  # include if you want to prefix
+    ],
+    "Aadhaar Card": [
+        "Name",
+        "Aadhaar Number",
+        "Date of Birth",
+        "Gender",
+        "Address"
+    ],
+    "Credit Card": [
+        "Name",
+        "Card Number",
+        "Expiry Date",
+        "Bank Name"
+    ],
+    "Cheque": [
+        "Name",
+        "Account Number",
+        "Bank Name",
+        "IFSC Code",
+        "Cheque Number",
+        "Amount"
+    ],
+    "Driving License": [
+        "Name",
+        "License Number",
+        "Date of Birth",
+        "Address",
+        "Issue Date",
+        "Expiry Date",
+        "Blood Group"
+    ],
+    "Passport": [
+        "Name",
+        "Passport Number",
+        "Date of Birth",
+        "Address",
+        "Gender",
+        "Nationality",
+        "Issue Date",
+        "Expiry Date",
+        "Place of Issue"
+    ]
+}
+
+# Structured-output schema of one page's answer: the array format of
+# getDescriptionPrompt, limited to the known document types and fields.
+PAGE_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "document_type": {
+                "type": "STRING",
+                "format": "enum",
+                "enum": list(EXPECTED_FIELDS_BY_TYPE),
+            },
+            "named_entities": string_schema(dict.fromkeys(
+                field for fields in EXPECTED_FIELDS_BY_TYPE.values() for field in fields
+            )),
+        },
+        "required": ["document_type", "named_entities"],
+        "propertyOrdering": ["document_type", "named_entities"],
+    },
+}
+# Each page names only the fields of its own type.
+PAGE_RESPONSE_SCHEMA["items"]["properties"]["named_entities"].pop("required")
 
 def normalize_json_response(parsed_response):
     normalized = []
 
-    # Fields expected per document type
-    expected_fields_by_type = {
-        "PAN Card": [
-            "Name",
-            "Date of Birth",
-            "Permanent Account Number",
-            "Address"  # include if you want to prefix
-        ],
-        "Aadhaar Card": [
-            "Name",
-            "Aadhaar Number",
-            "Date of Birth",
-            "Gender",
-            "Address"
-        ],
-        "Credit Card": [
-            "Name",
-            "Card Number",
-            "Expiry Date",
-            "Bank Name"
-        ],
-        "Cheque": [
-            "Name",
-            "Account Number",
-            "Bank Name",
-            "IFSC Code",
-            "Cheque Number",
-            "Amount"
-        ],
-        "Driving License": [
-            "Name",
-            "License Number",
-            "Date of Birth",
-            "Address",
-            "Issue Date",
-            "Expiry Date",
-            "Blood Group"
-        ],
-        "Passport": [
-            "Name",
-            "Passport Number",
-            "Date of Birth",
-            "Address",
-            "Gender",
-            "Nationality",
-            "Issue Date",
-            "Expiry Date",
-            "Place of Issue"
-        ]
-    }
-
     for entry in parsed_response:
         document_type = entry.get("document_type", "")
         named_entities = entry.get("named_entities", {})
@@ -264,8 +268,8 @@ def normalize_json_response(parsed_response):
 
         # Filter only expected fields
         filtered_entities = {}
-        if document_type in expected_fields_by_type:
-            allowed_keys = expected_fields_by_type[document_type]
+        if document_type in EXPECTED_FIELDS_BY_TYPE:
+            allowed_keys = EXPECTED_FIELDS_BY_TYPE[document_type]
             for key in allowed_keys:
                 if key in named_entities:
                     # Prefix Address with document type
@@ -294,31 +298,46 @@ def process_file_with_gemini(file_stream, filename, json_output_path=None):
     images = []
     
     if extension == "pdf":
-        print("Detected PDF file. Converting pages to images...")
-        images = pdf_to_images(file_stream)
+        logger.info("%s: PDF, converting pages to images", filename)
+        images = iter_pdf_images(file_stream)
 
     elif extension in ["jpg", "jpeg", "png"]:
-        print("Detected image file. Preparing for Gemini API...")
-    
-        image = Image.open(file_stream).convert("RGB")
-        img_buffer = BytesIO()
-        image.save(img_buffer, format="PNG")
-        img_buffer.seek(0)
-        images = [img_buffer]
+        logger.info("%s: image file", filename)
+        with metrics.stage_timer("image_encode"):
+            images = [encode_upload(file_stream)]
 
     else:
-        print("Unsupported file format. Please upload PDF, JPG, JPEG, or PNG.")
+        logger.warning("%s: unsupported file format, expected PDF, JPG, JPEG or PNG",
+                       filename)
         return []
 
-    for idx, image_io in enumerate(images):
-        print(f"Processing image {idx + 1}/{len(images)}")
-
-        base64_image = base64_encode_image(image_io)
-        raw_response = call_gemini_api(getDescriptionPrompt, base64_image)
-        if not raw_response:
+    # Pages are encoded as they render (only the base64 payload is kept),
+    # then packed LLM_BATCH_SIZE to a Gemini request.
+    items = []
+    for index, payload in enumerate(images):
+        base64_image = base64_encode_image(payload)
+        items.append(BatchItem(
+            intro=f"Page image {index + 1}:",
+            parts=[image_part(base64_image, payload.mime_type)],
+            schema=None,
+            single=gemini_image_request(getDescriptionPrompt, base64_image,
+                                        payload.mime_type),
+            json_schema=PAGE_RESPONSE_SCHEMA,
+        ))
+    logger.info("%s: processing %d image(s)", filename, len(items))
+    with metrics.stage_timer("gemini_vision"):
+        parsed_responses = run_batched(BATCH_HEADER, items)
+
+    for idx, parsed in enumerate(parsed_responses):
+        if isinstance(parsed, Exception):
+            logger.warning("%s: Gemini API error on image %d: %s",
+                           filename, idx + 1, parsed)
+            continue
+        if not parsed:
             continue
 
-        parsed = convert_to_strict_json(raw_response)
+        if isinstance(parsed, dict):
+            parsed = [parsed]
         normalized = normalize_json_response(parsed)
 
         for entry in normalized:
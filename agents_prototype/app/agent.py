@@ -6,6 +6,10 @@ from google.adk.apps.app import App
 # Import the CLASS
 from .sub_agents.document_ingestion_agent.agent import DocumentIngestionAgent
 from .sub_agents.document_ingestion_agent.tool import pdf_to_images
+from .sub_agents.preprocessing_agent.tool import run_preprocessing
+from .sub_agents.ocr_execution_agent.tool import execute_ocr_pipeline
+from .sub_agents.router_agent.tool import process_document_routing
+from .stage_agent import ToolStageAgent
 
 load_dotenv()
 
@@ -15,10 +19,39 @@ document_ingestion_agent = DocumentIngestionAgent(
     pdf_to_images_tool=pdf_to_images,
 )
 
-# Compose pipeline
+# Per-page stages: each tool fans the pages of the document out over the
+# shared page workers (app/page_fanout.py) and collects them in order.
+preprocessing_stage = ToolStageAgent(
+    name="PreprocessingStage",
+    description="Deskews every page in the page store.",
+    tool=run_preprocessing,
+)
+
+ocr_stage = ToolStageAgent(
+    name="OCRStage",
+    description="Runs EasyOCR on every page and scores page/document confidence.",
+    tool=execute_ocr_pipeline,
+)
+
+# Merges the per-page OCR results and routes the document on confidence.
+routing_stage = ToolStageAgent(
+    name="RoutingStage",
+    description="Returns the OCR text, refined by Gemini when confidence is low.",
+    tool=process_document_routing,
+    output_key="final_result",
+)
+
+# Compose pipeline: ingestion -> preprocessing -> OCR -> routing, with no
+# model turn between stages; stage wall times land in
+# state["stage_timings"].
 document_pipeline_agent = SequentialAgent(
     name="document_pipeline_agent",
-    sub_agents=[document_ingestion_agent],
+    sub_agents=[
+        document_ingestion_agent,
+        preprocessing_stage,
+        ocr_stage,
+        routing_stage,
+    ],
 )
 
 # Root agent
@@ -0,0 +1,12 @@
+# Makes the NER service modules (../NER) importable from the agent tools,
+# so shared engines such as deskew.py have a single implementation.
+import os
+import sys
+
+NER_DIR = os.getenv(
+    "NER_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "NER")),
+)
+
+if NER_DIR not in sys.path:
+    sys.path.append(NER_DIR)
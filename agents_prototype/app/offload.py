@@ -0,0 +1,41 @@
+# Runs the blocking part of the agent tools (rendering, deskew, OCR) off
+# the event loop, on one thread pool shared by every session of the
+# process, so a document being OCR'd does not stall the other sessions
+# on the same Runner. Threads rather than processes: the pages live in
+# this process's page store, and pdfium, OpenCV and torch release the
+# GIL while they work.
+import os
+import asyncio
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# Tool calls running at once across sessions (0 = run them on the event
+# loop thread, blocking it, as before).
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", min(8, (os.cpu_count() or 1) + 2)))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_tool_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, TOOL_WORKERS),
+                thread_name_prefix="tool",
+            )
+        return _executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """
+    await fn(*args, **kwargs) run on the shared tool pool, in a copy of
+    the caller's context.
+    """
+    if TOOL_WORKERS <= 0:
+        return fn(*args, **kwargs)
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(get_tool_executor(), call)
@@ -0,0 +1,35 @@
+# Per-page fan-out for the pipeline tools: preprocessing and OCR run the
+# pages of a document side by side on one shared thread pool (OpenCV
+# and torch release the GIL while they work).
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Pages processed at once, across every document in this process
+# (1 = one page after another).
+PAGE_WORKERS = int(os.getenv("PAGE_WORKERS", min(4, os.cpu_count() or 1)))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_page_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, PAGE_WORKERS),
+                thread_name_prefix="page",
+            )
+        return _executor
+
+
+def map_pages(fn, pages):
+    """
+    [fn(page) for page in pages], run across the page workers; results
+    come back in page order.
+    """
+    pages = list(pages)
+    if PAGE_WORKERS <= 1 or len(pages) <= 1:
+        return [fn(page) for page in pages]
+    return list(get_page_executor().map(fn, pages))
@@ -0,0 +1,164 @@
+# In-process store for the page bitmaps passed between the agent tools.
+#
+# Session state only carries handles (and small metadata); the pixels
+# stay here, in memory up to PAGE_STORE_MEMORY_MB and in memory-mapped
+# spill files beyond that, so tools neither base64 pages into state nor
+# write and re-read PNGs between stages.
+import os
+import uuid
+import atexit
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# Page bytes held in memory; pages stored past it go to spill files.
+PAGE_STORE_MEMORY_MB = int(os.getenv("PAGE_STORE_MEMORY_MB", 512))
+
+# Where spill files are created (a private directory under it, removed
+# at exit). Defaults to the system temp dir.
+PAGE_STORE_SPILL_DIR = os.getenv("PAGE_STORE_SPILL_DIR") or None
+
+
+class _Entry:
+    __slots__ = ("array", "owner", "meta", "path")
+
+    def __init__(self, array, owner, meta, path=None):
+        self.array = array
+        self.owner = owner
+        self.meta = meta
+        self.path = path
+
+
+class PageStore:
+    """
+    Page bitmaps (uint8 NumPy arrays) under string handles.
+
+    put() keeps the array it is given - no copy - while the memory budget
+    allows, else copies it into a memory-mapped spill file; get() returns
+    the array (a view of the spill file for spilled pages). Thread-safe.
+    """
+
+    def __init__(self, memory_bytes=PAGE_STORE_MEMORY_MB * 1024 * 1024,
+                 spill_dir=PAGE_STORE_SPILL_DIR):
+        self.memory_bytes = memory_bytes
+        self._spill_parent = spill_dir
+        self._spill_dir = None
+        self._pages = {}
+        self._in_memory = 0
+        self._spilled = 0
+        self._lock = threading.Lock()
+
+    def _spill_path(self, handle):
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="page-store-", dir=self._spill_parent)
+        return os.path.join(self._spill_dir, f"{handle}.npy")
+
+    def put(self, array, meta=None, owner=None):
+        """
+        Store a page and return its handle. owner is whatever must stay
+        alive for array to be valid (e.g. the bitmap it views). meta is a
+        small dict returned by meta().
+        """
+        handle = uuid.uuid4().hex
+        meta = dict(meta or {})
+        meta.update({"width": array.shape[1], "height": array.shape[0],
+                     "mode": "L" if array.ndim == 2 else "RGB"})
+
+        with self._lock:
+            if self._in_memory + array.nbytes <= self.memory_bytes:
+                self._pages[handle] = _Entry(array, owner, meta)
+                self._in_memory += array.nbytes
+                return handle
+            path = self._spill_path(handle)
+
+        # Copied outside the lock: the spill file is private to this page.
+        spilled = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=array.shape)
+        spilled[...] = array
+        spilled.flush()
+        with self._lock:
+            self._pages[handle] = _Entry(spilled, None, meta, path)
+            self._spilled += array.nbytes
+        return handle
+
+    def _entry(self, handle):
+        with self._lock:
+            entry = self._pages.get(handle)
+        if entry is None:
+            raise KeyError(f"No page with handle {handle!r} in the page store")
+        return entry
+
+    def get(self, handle):
+        return self._entry(handle).array
+
+    def meta(self, handle):
+        return dict(self._entry(handle).meta)
+
+    def replace(self, handle, array, owner=None):
+        """
+        Store array under a new handle with handle's metadata and drop the
+        old page, unless array is that page itself (nothing to do).
+        Returns the handle to use from now on.
+        """
+        entry = self._entry(handle)
+        if array is entry.array:
+            return handle
+        new_handle = self.put(array, entry.meta, owner)
+        self.delete(handle)
+        return new_handle
+
+    def delete(self, handle):
+        with self._lock:
+            entry = self._pages.pop(handle, None)
+            if entry is None:
+                return
+            if entry.path is None:
+                self._in_memory -= entry.array.nbytes
+            else:
+                self._spilled -= entry.array.nbytes
+        if entry.path is not None:
+            # Unlinking a mapped file is fine on POSIX; the mapping goes
+            # when the last view of it does.
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def release(self, handles):
+        for handle in handles:
+            self.delete(handle)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pages": len(self._pages),
+                "memory_bytes": self._in_memory,
+                "spilled_pages": sum(1 for e in self._pages.values() if e.path),
+                "spilled_bytes": self._spilled,
+            }
+
+    def close(self):
+        with self._lock:
+            self._pages.clear()
+            self._in_memory = self._spilled = 0
+            spill_dir, self._spill_dir = self._spill_dir, None
+        if spill_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_page_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PageStore()
+            atexit.register(_store.close)
+        return _store
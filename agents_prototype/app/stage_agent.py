@@ -0,0 +1,65 @@
+# Deterministic pipeline stages: agents that run one tool directly, with
+# no model turn in between, and time it into state["stage_timings"].
+import time
+import inspect
+from typing import AsyncGenerator, Callable, Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.tools import ToolContext
+from google.genai import types as genai_types
+
+
+def record_stage(tool_context: ToolContext, stage: str, seconds: float):
+    """
+    Add a stage's wall time to state["stage_timings"] ({stage: seconds}).
+    """
+    timings = dict(tool_context.state.get("stage_timings") or {})
+    timings[stage] = round(timings.get(stage, 0.0) + seconds, 4)
+    tool_context.state["stage_timings"] = timings
+
+
+def stage_event(agent: BaseAgent, ctx: InvocationContext, text: str,
+                tool_context: ToolContext) -> Event:
+    """
+    Text event of a stage, carrying the state changes its tool made so
+    the session service persists them.
+    """
+    return Event(
+        author=agent.name,
+        invocation_id=ctx.invocation_id,
+        branch=ctx.branch,
+        content=genai_types.Content(role="model", parts=[genai_types.Part(text=text)]),
+        actions=tool_context.actions,
+    )
+
+
+class ToolStageAgent(BaseAgent):
+    """
+    Runs tool(tool_context=...) once per invocation (awaited when it is
+    an async tool) and reports its result as text; with output_key the
+    result is also stored in state, as LlmAgent's output_key does.
+    """
+
+    tool: Callable
+    output_key: Optional[str] = None
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        tool_ctx = ToolContext(ctx)
+
+        start = time.perf_counter()
+        try:
+            result = self.tool(tool_context=tool_ctx)
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as e:
+            result = f"{self.name} failed: {e}"
+        record_stage(tool_ctx, self.name, time.perf_counter() - start)
+
+        if self.output_key:
+            tool_ctx.state[self.output_key] = result
+
+        yield stage_event(self, ctx, str(result), tool_ctx)
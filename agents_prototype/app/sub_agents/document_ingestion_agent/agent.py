@@ -1,7 +1,11 @@
-from typing import AsyncGenerator
+import time
+from typing import AsyncGenerator, Callable
 from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
 from google.adk.events import Event
-from google.adk.invocation_context import InvocationContext
+from google.adk.tools import ToolContext
+
+from ...stage_agent import record_stage, stage_event
 
 
 import logging
@@ -14,52 +18,61 @@ class DocumentIngestionAgent(BaseAgent):
     Custom agent that ingests a PDF and converts it into images.
     """
 
+    pdf_to_images_tool: Callable
+
     def __init__(self, name: str, pdf_to_images_tool):
         super().__init__(
             name=name,
             sub_agents=[],      # no sub-agents, only tools
+            pdf_to_images_tool=pdf_to_images_tool,
         )
-        self.pdf_to_images_tool = pdf_to_images_tool
 
     async def _run_async_impl(
         self, ctx: InvocationContext
     ) -> AsyncGenerator[Event, None]:
 
         logger.info(f"[{self.name}] Starting PDF ingestion")
+        tool_ctx = ToolContext(ctx)
 
         # --------------------------------------------------
         # 1. Read input from session state
         # --------------------------------------------------
         file_path = ctx.session.state.get("file_path")
         if not file_path:
-            yield Event.text(
-                author=self.name,
-                text="❌ No file_path found in session state. Aborting.",
+            yield stage_event(
+                self, ctx,
+                "❌ No file_path found in session state. Aborting.",
+                tool_ctx,
             )
             return
 
-        yield Event.text(
-            author=self.name,
-            text=f"📄 Ingesting PDF at path: {file_path}",
-        )
-
         # --------------------------------------------------
         # 2. Call the TOOL explicitly
         # --------------------------------------------------
-        tool_ctx = ctx.tool_context
-
+        start = time.perf_counter()
         result = await self.pdf_to_images_tool(
             file_path=file_path,
             tool_context=tool_ctx,
         )
+        record_stage(tool_ctx, self.name, time.perf_counter() - start)
+
+        if isinstance(result, dict) and "error" in result:
+            yield stage_event(
+                self, ctx,
+                f"❌ Ingestion of {file_path} failed: {result['error']}",
+                tool_ctx,
+            )
+            return
 
         # --------------------------------------------------
         # 3. Read tool state (NOT model-visible)
         # --------------------------------------------------
-        images = tool_ctx.state.get("images", [])
+        # Page handles into the page store (app/page_store.py); the
+        # pixels themselves never enter session state.
+        images = tool_ctx.state.get("pages", [])
 
-        ctx.session.state["num_pages"] = len(images)
-        ctx.session.state["image_metadata"] = [
+        tool_ctx.state["num_pages"] = len(images)
+        tool_ctx.state["image_metadata"] = [
             {
                 "page_index": img["page_index"],
                 "width": img["width"],
@@ -72,13 +85,13 @@ class DocumentIngestionAgent(BaseAgent):
         # --------------------------------------------------
         # 4. Emit final report event
         # --------------------------------------------------
-        yield Event.text(
-            author=self.name,
-            text=(
-                f"✅ Successfully ingested {len(images)} pages.\n"
-                "Image data stored internally in session state.\n"
-                "one done"
+        yield stage_event(
+            self, ctx,
+            (
+                f"✅ Successfully ingested {len(images)} pages of {file_path}.\n"
+                "Page handles stored in session state."
             ),
+            tool_ctx,
         )
 
         logger.info(f"[{self.name}] Ingestion complete")
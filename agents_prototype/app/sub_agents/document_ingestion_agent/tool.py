@@ -1,22 +1,62 @@
 import os
-import base64
-from io import BytesIO
-from PIL import Image
 import pypdfium2 as pdfium
 from google.adk.tools import ToolContext
 
+from ...page_store import get_page_store
+from ...offload import run_blocking
 
-def pdf_to_images(
+
+def iter_pdf_pages(pdf, dpi: int = 300, max_pages: int = 20):
+    """
+    Lazily render pages of an open PdfDocument as grayscale bitmaps (all
+    OCR reads), one at a time, releasing each page after use.
+    """
+    for idx in range(min(len(pdf), max_pages)):
+        page = pdf[idx]
+        try:
+            yield idx, page.render(scale=dpi / 72, grayscale=True)
+        finally:
+            page.close()
+
+
+def render_pdf(file_path: str, dpi: int = 300, max_pages: int = 20):
+    """
+    Render a PDF into the page store; returns one dict per page. Pages
+    already stored are released again if rendering fails.
+    """
+    store = get_page_store()
+    results = []
+
+    try:
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            for idx, bitmap in iter_pdf_pages(pdf, dpi=dpi, max_pages=max_pages):
+                # The store keeps the bitmap alive and its buffer as is.
+                handle = store.put(bitmap.to_numpy(), {"page_index": idx}, owner=bitmap)
+                results.append({"page_index": idx, "handle": handle, **store.meta(handle)})
+        finally:
+            pdf.close()
+    except Exception:
+        store.release(page["handle"] for page in results)
+        raise
+
+    return results
+
+
+async def pdf_to_images(
     file_path: str,
     tool_context: ToolContext,
     dpi: int = 300,
     max_pages: int = 20,
 ):
     """
-    Convert a PDF into images and RETURN them in a serializable form.
+    Render a PDF into the page store (app/page_store.py) and RETURN a
+    handle and the size of every page. The pixels stay in the store;
+    only the handles go into session state. Rendering runs on the shared
+    tool pool (app/offload.py), not on the event loop.
 
     Returns:
-        List[dict]: Each dict represents one page image.
+        List[dict]: Each dict describes one page image.
     """
 
     if not os.path.exists(file_path):
@@ -24,37 +64,13 @@ def pdf_to_images(
             "error": f"File not found at '{file_path}'"
         }
 
-    results = []
-
     try:
-        pdf = pdfium.PdfDocument(file_path)
-        page_count = min(len(pdf), max_pages)
-        scale = dpi / 72
-
-        for idx in range(page_count):
-            page = pdf[idx]
-            bitmap = page.render(scale=scale)
-            image = bitmap.to_pil().convert("RGB")
-
-            buffer = BytesIO()
-            image.save(buffer, format="PNG")
-            buffer.seek(0)
-
-            image_b64 = base64.b64encode(buffer.read()).decode("utf-8")
-
-            results.append({
-                "page_index": idx,
-                "width": image.width,
-                "height": image.height,
-                "mode": image.mode,
-                "image_base64": image_b64,
-            })
-
-        tool_context.state["images"] = results
-
-        return results
-
+        results = await run_blocking(render_pdf, file_path, dpi, max_pages)
     except Exception as e:
         return {
             "error": str(e)
         }
+
+    tool_context.state["pages"] = results
+
+    return results
@@ -1,56 +1,61 @@
-import easyocr
-import os
-
-# Initialize EasyOCR once (English only)
-reader = easyocr.Reader(["en"], gpu=False)
-
-
 from google.adk.tools import ToolContext
 
-def execute_ocr_pipeline(tool_context: ToolContext):
+from ... import ner_shared  # noqa: F401  (puts NER/ on sys.path)
+from models import get_reader  # one lazily-built EasyOCR reader per process
+from ...page_store import get_page_store
+from ...page_fanout import map_pages
+from ...offload import run_blocking
+
+def ocr_page(page):
     """
-    Retrieves 'preprocessed_image_paths' from state, runs EasyOCR on each,
-    computes confidence scores, and stores 'ocr_results' in state.
+    EasyOCR of one page in the page store, released from the store once
+    read (or failed). Returns {page_index, content, page_confidence}, or
+    None when the page is gone.
     """
-    image_paths = tool_context.state.get("preprocessed_image_paths", [])
-    if not image_paths:
-        return "No image paths found in state['preprocessed_image_paths']."
-
-    pipeline_results = {
-        "pages": [],
-        "doc_confidence": 0.0
-    }
+    store = get_page_store()
+    try:
+        img_np = store.get(page["handle"])
+    except KeyError:
+        return None
 
-    import cv2 
+    try:
+        # detail=1 returns (bbox, text, confidence)
+        raw_output = get_reader().readtext(img_np, detail=1, paragraph=False)
+    finally:
+        del img_np
+        store.delete(page["handle"])
+
+    lines = [
+        {"text": text.strip(), "confidence": round(float(conf), 3)}
+        for _, text, conf in raw_output
+    ]
 
-    for idx, path in enumerate(image_paths):
-        if not os.path.exists(path):
-            continue
+    return {
+        "page_index": page["page_index"],
+        "content": lines,
+        "page_confidence": compute_page_confidence(lines)
+    }
 
-        # Load image (grayscale)
-        img_np = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-        if img_np is None:
-            continue
 
-        # Run EasyOCR
-        # detail=1 returns (bbox, text, confidence)
-        raw_output = reader.readtext(img_np, detail=1, paragraph=False)
-        
-        lines = []
-        for _, text, conf in raw_output:
-            lines.append({
-                "text": text.strip(),
-                "confidence": round(float(conf), 3)
-            })
-
-        # Page Stats
-        page_conf = compute_page_confidence(lines)
-        
-        pipeline_results["pages"].append({
-            "page_index": idx,
-            "content": lines,
-            "page_confidence": page_conf
-        })
+async def execute_ocr_pipeline(tool_context: ToolContext):
+    """
+    Retrieves the 'preprocessed_pages' handles from state, runs EasyOCR on
+    the pages in the page store (in parallel, see app/page_fanout.py, off
+    the event loop), computes confidence scores, and stores 'ocr_results'
+    in state. Every page leaves the store with this stage, read or not.
+    """
+    pages = tool_context.state.get("preprocessed_pages", [])
+    if not pages:
+        return "No pages found in state['preprocessed_pages']."
+
+    try:
+        pipeline_results = {
+            "pages": [page for page in await run_blocking(map_pages, ocr_page, pages) if page],
+            "doc_confidence": 0.0
+        }
+    finally:
+        # Pages left behind when a readtext failed are dropped here.
+        get_page_store().release(page["handle"] for page in pages)
 
     # Document Stats
     pipeline_results["doc_confidence"] = compute_document_confidence(pipeline_results["pages"])
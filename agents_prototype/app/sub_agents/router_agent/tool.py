@@ -19,10 +19,11 @@ gemini_model = genai.GenerativeModel(
 from google.adk.tools import ToolContext
 import json
 
-def process_document_routing(tool_context: ToolContext):
+async def process_document_routing(tool_context: ToolContext):
     """
     Decides whether to return raw OCR or refine with Gemini based on confidence.
-    Reads 'ocr_results' from state.
+    Reads 'ocr_results' from state and stores the route taken ("ocr" or
+    "gemini") in state['route'].
     """
     try:
         ocr_results = tool_context.state["ocr_results"]
@@ -45,33 +46,40 @@ def process_document_routing(tool_context: ToolContext):
     except Exception as e:
         return f"Error accessing doc_confidence: {e}"
     
+    pages = ocr_results.get("pages", []) if isinstance(ocr_results, dict) else ocr_results.pages
+    combined_text = merge_page_text(pages)
+
     # Logic: High confidence -> Return valid raw text
     if doc_confidence >= 0.70:
-        pages = ocr_results.get("pages", []) if isinstance(ocr_results, dict) else ocr_results.pages
-        combined_text = "\n".join(
-            line["text"] 
-            for page in pages
-            for line in (page["content"] if isinstance(page, dict) else page.content)
-            if (line["text"] if isinstance(line, dict) else line.text)
-        )
+        tool_context.state["route"] = "ocr"
         return f"High confidence ({doc_confidence}). Returning raw OCR text.\n\nTEXT:\n{combined_text[:500]}..."
 
     # Logic: Low confidence -> Gemini Refinement
     else:
-        pages = ocr_results.get("pages", []) if isinstance(ocr_results, dict) else ocr_results.pages
-        combined_text = "\n".join(
-            line["text"]
-            for page in pages
-            for line in (page["content"] if isinstance(page, dict) else page.content)
-            if (line["text"] if isinstance(line, dict) else line.text)
-        )
-        
+        tool_context.state["route"] = "gemini"
         # Call Gemini (internal helper)
-        refined_output = _call_gemini_refinement(combined_text)
+        refined_output = await _call_gemini_refinement(combined_text)
         return f"Low confidence ({doc_confidence}). Text refined by Gemini.\n\nOUTPUT:\n{refined_output}"
 
 
-def _call_gemini_refinement(raw_text):
+def merge_page_text(pages):
+    """
+    OCR text of the whole document. Pages are OCR'd in parallel, so they
+    are put back in page order here.
+    """
+    def field(item, name):
+        return item[name] if isinstance(item, dict) else getattr(item, name)
+
+    ordered = sorted(pages, key=lambda page: field(page, "page_index"))
+    return "\n".join(
+        field(line, "text")
+        for page in ordered
+        for line in field(page, "content")
+        if field(line, "text")
+    )
+
+
+async def _call_gemini_refinement(raw_text):
     prompt = f"""
     You are an AI document understanding engine.
     The OCR confidence is LOW. Clean and structured the following text:
@@ -81,7 +89,8 @@ def _call_gemini_refinement(raw_text):
     """
     
     try:
-        response = gemini_model.generate_content(prompt)
+        # Async client call: other sessions keep running while it waits.
+        response = await gemini_model.generate_content_async(prompt)
         return response.text
     except Exception as e:
         return f"Gemini Error: {e}"
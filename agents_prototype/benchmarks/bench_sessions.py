@@ -0,0 +1,153 @@
+# Concurrent sessions on one Runner: throughput and event-loop stalls with
+# the blocking tool work offloaded (app/offload.py) or run on the loop.
+#
+#   python benchmarks/bench_sessions.py [--sessions 1 4 8] [--pages 2] \
+#       [--modes offload inline] [--fake-ocr 0.3] [--ocr-confidence 0.9] \
+#       [--gemini-latency 1.0] [--out report.json]
+#
+# Every session runs the full pipeline (app/agent.py) on its own
+# synthetic PDF (NER/benchmarks/synthetic.py) through
+# InMemorySessionService. A heartbeat task on the event loop records how
+# late it wakes up: with the tools blocking the loop, one session's OCR
+# holds up every other session.
+#
+# --fake-ocr replaces EasyOCR with a reader that blocks for that many
+# seconds per page (like a real forward pass, without the GIL), so the
+# benchmark runs without the OCR weights; --ocr-confidence below 0.70
+# sends documents to the Gemini refinement, answered after
+# --gemini-latency seconds instead of by the API.
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENTS_DIR)
+
+from google.adk.runners import Runner  # noqa: E402
+from google.adk.sessions.in_memory_session_service import InMemorySessionService  # noqa: E402
+
+from app import ner_shared  # noqa: E402
+from app import offload  # noqa: E402
+from app.agent import app  # noqa: E402
+from run_batch import STAGES, process_pdf, percentile  # noqa: E402
+
+sys.path.insert(0, os.path.join(ner_shared.NER_DIR, "benchmarks"))
+from synthetic import LAYOUTS, make_document  # noqa: E402
+
+# Offload pool size as configured; "inline" runs set it to 0.
+DEFAULT_TOOL_WORKERS = offload.TOOL_WORKERS
+
+
+class BlockingReader:
+    """
+    Stands in for easyocr.Reader: blocks like a forward pass would.
+    """
+
+    def __init__(self, seconds, confidence):
+        self.seconds = seconds
+        self.confidence = confidence
+
+    def readtext(self, img, **kwargs):
+        time.sleep(self.seconds)
+        return [([[0, 0], [1, 0], [1, 1], [0, 1]], "Name RAM KUMAR", self.confidence)]
+
+
+class SlowGeminiModel:
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def generate_content_async(self, prompt):
+        await asyncio.sleep(self.latency)
+        return type("Response", (), {"text": "{}"})()
+
+
+def install_fakes(args):
+    if args.fake_ocr is not None:
+        import models
+        models._reader = BlockingReader(args.fake_ocr, args.ocr_confidence)
+    if args.gemini_latency is not None:
+        from app.sub_agents.router_agent import tool as router_tool
+        router_tool.gemini_model = SlowGeminiModel(args.gemini_latency)
+
+
+def write_corpus(directory, count, pages):
+    types = list(LAYOUTS)
+    paths = []
+    for n in range(count):
+        data, _ = make_document(types[n % len(types)], seed=n, skew=2.0, noise=8.0, pages=pages)
+        path = os.path.join(directory, f"doc_{n:03d}.pdf")
+        with open(path, "wb") as f:
+            f.write(data)
+        paths.append(path)
+    return paths
+
+
+async def heartbeat(lags, interval=0.01):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run_level(paths, mode):
+    offload.TOOL_WORKERS = 0 if mode == "inline" else max(1, DEFAULT_TOOL_WORKERS)
+
+    session_service = InMemorySessionService()
+    runner = Runner(app=app, session_service=session_service)
+
+    lags = []
+    beat = asyncio.create_task(heartbeat(lags))
+    start = time.perf_counter()
+    rows = await asyncio.gather(*(process_pdf(runner, session_service, p) for p in paths))
+    wall = time.perf_counter() - start
+    beat.cancel()
+
+    return {
+        "mode": mode,
+        "sessions": len(paths),
+        "wall_seconds": round(wall, 3),
+        "documents_per_second": round(len(paths) / wall, 3),
+        "session_seconds_mean": round(sum(r["seconds"] for r in rows) / len(rows), 3),
+        "loop_lag_max": round(max(lags, default=0.0), 3),
+        "loop_lag_p95": round(percentile(lags, 0.95), 3),
+        "stages": {
+            stage: round(sum(r["stage_timings"].get(stage, 0.0) for r in rows) / len(rows), 3)
+            for stage in STAGES
+        },
+    }
+
+
+async def main(args):
+    install_fakes(args)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-sessions-") as directory:
+        paths = write_corpus(directory, max(args.sessions), args.pages)
+        for sessions in args.sessions:
+            for mode in args.modes:
+                row = await run_level(paths[:sessions], mode)
+                results.append(row)
+                print(json.dumps(row), flush=True)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent agent sessions benchmark")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--pages", type=int, default=2)
+    parser.add_argument("--modes", nargs="+", default=["offload", "inline"],
+                        choices=["offload", "inline"])
+    parser.add_argument("--fake-ocr", type=float,
+                        help="seconds per page of a blocking stand-in for EasyOCR")
+    parser.add_argument("--ocr-confidence", type=float, default=0.9)
+    parser.add_argument("--gemini-latency", type=float,
+                        help="answer the Gemini refinement after this many seconds")
+    parser.add_argument("--out", help="write the JSON report here")
+    asyncio.run(main(parser.parse_args()))
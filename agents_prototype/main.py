@@ -35,6 +35,7 @@ async def main():
     session = await session_service.create_session(
         app_name="app",
         user_id="terminal_user",
+        state={"file_path": file_path},  # read by DocumentIngestionAgent
     )
 
     # ------------------------------------------------------------------
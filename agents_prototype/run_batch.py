@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from google.adk.runners import Runner
+from google.adk.sessions.in_memory_session_service import InMemorySessionService
+from google.genai import types as genai_types
+
+from app.agent import app  # App(root_agent=...)
+
+# Load environment variables
+load_dotenv()
+
+STAGES = ["DocumentIngestionAgent", "PreprocessingStage", "OCRStage", "RoutingStage"]
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def process_pdf(runner, session_service, file_path):
+    """
+    Run the pipeline on one PDF in its own session. Returns the report
+    row: stage timings, page count, routing result and wall time.
+    """
+    session = await session_service.create_session(
+        app_name="app",
+        user_id="batch_runner",
+        state={"file_path": file_path},
+    )
+    message = genai_types.Content(
+        role="user",
+        parts=[genai_types.Part.from_text(text=f"Process {file_path}")],
+    )
+
+    start = time.perf_counter()
+    async for _ in runner.run_async(
+        new_message=message,
+        session_id=session.id,
+        user_id="batch_runner",
+    ):
+        pass
+    elapsed = time.perf_counter() - start
+
+    session = await session_service.get_session(
+        app_name="app", user_id="batch_runner", session_id=session.id
+    )
+    state = session.state
+    return {
+        "file": os.path.basename(file_path),
+        "pages": state.get("num_pages", 0),
+        "seconds": round(elapsed, 3),
+        "stage_timings": state.get("stage_timings", {}),
+        "route": state.get("route"),
+    }
+
+
+def summarize(rows, wall):
+    summary = {
+        "documents": len(rows),
+        "pages": sum(r["pages"] for r in rows),
+        "wall_seconds": round(wall, 3),
+        "documents_per_second": round(len(rows) / wall, 3) if wall else None,
+        "stages": {},
+    }
+    for stage in STAGES:
+        values = [r["stage_timings"][stage] for r in rows if stage in r["stage_timings"]]
+        summary["stages"][stage] = {
+            "mean": round(sum(values) / len(values), 3) if values else 0.0,
+            "p95": round(percentile(values, 0.95), 3),
+            "total": round(sum(values), 3),
+        }
+    return summary
+
+
+async def main(args):
+    paths = sorted(glob.glob(os.path.join(args.directory, "*.pdf")))
+    if not paths:
+        print(f"❌ No PDFs found in '{args.directory}'.")
+        return
+
+    session_service = InMemorySessionService()
+    runner = Runner(app=app, session_service=session_service)
+    limit = asyncio.Semaphore(args.concurrency)
+    rows = []
+
+    async def run_one(path):
+        async with limit:
+            try:
+                row = await process_pdf(runner, session_service, path)
+            except Exception as e:
+                row = {"file": os.path.basename(path), "pages": 0, "seconds": 0.0,
+                       "stage_timings": {}, "error": str(e)}
+        rows.append(row)
+        print(json.dumps(row), flush=True)
+
+    print(f"🚀 Processing {len(paths)} PDFs, {args.concurrency} at a time\n")
+    start = time.perf_counter()
+    await asyncio.gather(*(run_one(path) for path in paths))
+    summary = summarize(rows, time.perf_counter() - start)
+
+    print(json.dumps(summary, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"summary": summary, "documents": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the document pipeline over a directory of PDFs"
+    )
+    parser.add_argument("directory", help="directory of PDFs")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="documents (sessions) in flight at once")
+    parser.add_argument("--out", help="write the JSON report here")
+    asyncio.run(main(parser.parse_args()))
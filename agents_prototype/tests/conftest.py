@@ -0,0 +1,5 @@
+# The tests import the agent package as `app`, from this project's root.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+import contextvars
+
+from app import offload
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def test_run_blocking_runs_off_the_event_loop_thread():
+    async def main():
+        loop_thread = threading.get_ident()
+        worker_thread = await offload.run_blocking(threading.get_ident)
+        return loop_thread, worker_thread
+
+    loop_thread, worker_thread = asyncio.run(main())
+    assert loop_thread != worker_thread
+
+
+def test_run_blocking_keeps_the_callers_context():
+    async def main():
+        request_id.set("abc")
+        return await offload.run_blocking(request_id.get)
+
+    assert asyncio.run(main()) == "abc"
+
+
+def test_blocking_calls_overlap():
+    barrier = threading.Barrier(2, timeout=5)
+
+    async def main():
+        await asyncio.gather(offload.run_blocking(barrier.wait),
+                             offload.run_blocking(barrier.wait))
+
+    asyncio.run(main())
+
+
+def test_no_workers_runs_inline(monkeypatch):
+    monkeypatch.setattr(offload, "TOOL_WORKERS", 0)
+
+    async def main():
+        return threading.get_ident(), await offload.run_blocking(threading.get_ident)
+
+    loop_thread, worker_thread = asyncio.run(main())
+    assert loop_thread == worker_thread
@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.page_store import PageStore
+
+
+def page(height=10, width=20, value=7, channels=None):
+    shape = (height, width) if channels is None else (height, width, channels)
+    return np.full(shape, value, np.uint8)
+
+
+def test_put_keeps_the_array_without_copying():
+    store = PageStore(memory_bytes=1 << 20)
+    array = page()
+    handle = store.put(array, {"page": 1})
+
+    assert store.get(handle) is array
+    assert store.meta(handle) == {"page": 1, "width": 20, "height": 10, "mode": "L"}
+    assert store.stats()["memory_bytes"] == array.nbytes
+
+
+def test_rgb_pages_are_marked_rgb():
+    store = PageStore()
+    assert store.meta(store.put(page(channels=3)))["mode"] == "RGB"
+
+
+def test_pages_over_the_budget_spill_to_disk(tmp_path):
+    store = PageStore(memory_bytes=300, spill_dir=str(tmp_path))
+    kept = store.put(page(value=1))
+    spilled = store.put(page(value=2))
+
+    assert isinstance(store.get(spilled), np.memmap)
+    assert (store.get(spilled) == 2).all()
+    stats = store.stats()
+    assert (stats["pages"], stats["spilled_pages"], stats["spilled_bytes"]) == (2, 1, 200)
+    assert store.get(kept) is not None
+    store.close()
+
+
+def test_delete_frees_memory_and_removes_spill_files(tmp_path):
+    store = PageStore(memory_bytes=200, spill_dir=str(tmp_path))
+    kept = store.put(page())
+    spilled = store.put(page())
+    path = store._pages[spilled].path
+    assert os.path.exists(path)
+
+    store.release([kept, spilled, "unknown"])
+
+    assert not os.path.exists(path)
+    assert store.stats() == {"pages": 0, "memory_bytes": 0,
+                             "spilled_pages": 0, "spilled_bytes": 0}
+    with pytest.raises(KeyError):
+        store.get(kept)
+
+
+def test_replace_moves_the_metadata_to_a_new_handle():
+    store = PageStore()
+    handle = store.put(page(), {"page": 3})
+
+    assert store.replace(handle, store.get(handle)) == handle
+
+    new_handle = store.replace(handle, page(value=9))
+    assert new_handle != handle
+    assert store.meta(new_handle)["page"] == 3
+    assert (store.get(new_handle) == 9).all()
+    with pytest.raises(KeyError):
+        store.get(handle)
+
+
+def test_close_removes_the_spill_directory(tmp_path):
+    store = PageStore(memory_bytes=0, spill_dir=str(tmp_path))
+    store.put(page())
+    spill_dir = store._spill_dir
+    assert os.path.isdir(spill_dir)
+
+    store.close()
+
+    assert not os.path.exists(spill_dir)
+    assert store.stats()["pages"] == 0